@@ -0,0 +1,210 @@
+import base64
+import binascii
+import hashlib
+import io
+import re
+import warnings
+from urllib.parse import unquote_to_bytes
+from gridfs import GridFSBucket
+from .config import AVATAR_CONFIG
+from .database import database
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional; originals are served instead
+    Image = None
+
+# data:image/<type>[;param=value]*[;base64],<payload> (RFC 2397)
+_DATA_URL = re.compile(
+    r"^data:(image/[\w.+-]+)((?:;[\w.+-]+=[^;,]*)*)(;base64)?,(.*)$",
+    re.DOTALL | re.IGNORECASE,
+)
+
+
+# Raster formats only: an SVG (or anything a browser might sniff as HTML)
+# served from our origin could run script. Values are Pillow format names.
+ALLOWED_TYPES = {
+    "image/png": "PNG",
+    "image/jpeg": "JPEG",
+    "image/gif": "GIF",
+    "image/webp": "WEBP",
+}
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+class AvatarTooLarge(InvalidAvatar):
+    pass
+
+
+# Returns (content_type, bytes) for an inline image data URL, None for
+# anything that is not a data: URL. A data: URL that cannot be decoded is
+# rejected rather than passed through, so it is never stored inline.
+def parse_data_url(value):
+    if not (value or "")[:5].lower() == "data:":
+        return None
+    match = _DATA_URL.match(value)
+    if not match:
+        raise InvalidAvatar("Profile image must be an image data URL")
+    content_type, _, is_base64, payload = match.groups()
+    content_type = content_type.lower()
+    if content_type not in ALLOWED_TYPES:
+        raise InvalidAvatar("Profile image must be a PNG, JPEG, GIF or WebP image")
+    if is_base64:
+        try:
+            # Line-wrapped base64 (MIME style) is common in pasted data URLs
+            data = base64.b64decode(re.sub(r"\s+", "", payload), validate=True)
+        except (binascii.Error, ValueError):
+            raise InvalidAvatar("Profile image data is not valid base64")
+    else:
+        data = unquote_to_bytes(payload)
+    if len(data) > AVATAR_CONFIG["MAX_BYTES"]:
+        raise AvatarTooLarge("Profile image is too large")
+    check_image(content_type, data)
+    return content_type, data
+
+
+# Reads only the image header, which must match the declared type. Pillow's
+# own bomb guard warns rather than fails below twice its pixel limit, so
+# that warning is raised as well.
+def check_image(content_type, data):
+    if Image is None:
+        return
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+                image_format = image.format
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise InvalidAvatar("Profile image dimensions are too large")
+    except (OSError, ValueError):
+        raise InvalidAvatar("Profile image data is not a readable image")
+    if image_format != ALLOWED_TYPES[content_type]:
+        raise InvalidAvatar("Profile image data does not match its type")
+    limit = AVATAR_CONFIG["MAX_DIMENSION"]
+    if width > limit or height > limit:
+        raise InvalidAvatar(f"Profile image must be at most {limit}x{limit} pixels")
+
+
+# Returns the hash if value is one of our own avatar URLs (clients echo back
+# the profile_image they were given when saving other profile fields)
+def parse_avatar_url(value):
+    prefix = f"{AVATAR_CONFIG['PUBLIC_URL']}/api/avatars/"
+    if not (value or "").startswith(prefix):
+        return None
+    avatar_hash = value[len(prefix):].split("?", 1)[0]
+    return avatar_hash if re.fullmatch(r"[0-9a-f]{64}", avatar_hash) else None
+
+
+def avatar_url(avatar_hash, size=None):
+    url = f"{AVATAR_CONFIG['PUBLIC_URL']}/api/avatars/{avatar_hash}"
+    return f"{url}?size={size}" if size else url
+
+
+# What clients see as profile_image: a short store URL for stored avatars,
+# or the legacy value (preset image URL) for users not yet migrated
+def user_avatar(user, size=None):
+    if not user:
+        return None
+    if user.get("avatar_hash"):
+        return avatar_url(user["avatar_hash"], size)
+    return user.get("profile_image")
+
+
+def _thumbnail(data, size):
+    image = Image.open(io.BytesIO(data))
+    image = image.convert("RGBA")
+    # Centre-crop to a square before scaling
+    side = min(image.size)
+    left = (image.width - side) // 2
+    top = (image.height - side) // 2
+    image = image.crop((left, top, left + side, top + side)).resize((size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+# Content-addressed avatars in GridFS. The file name is the SHA-256 of the
+# original bytes (thumbnails append _<size>), so identical uploads share
+# storage and every URL is immutable.
+class AvatarStore:
+    def __init__(self, db=None):
+        self._db = db
+        self._bucket = None
+        # filename -> (bytes, metadata) when running without MongoDB
+        self._files = None
+
+    def use_memory(self):
+        if self._files is None:
+            self._files = {}
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = GridFSBucket(self._db if self._db is not None else database.connect(),
+                                        bucket_name=AVATAR_CONFIG["BUCKET"])
+        return self._bucket
+
+    def _exists(self, filename):
+        if self._files is not None:
+            return filename in self._files
+        for _ in self.bucket.find({"filename": filename}).limit(1):
+            return True
+        return False
+
+    def _upload(self, filename, data, metadata):
+        if self._files is not None:
+            self._files[filename] = (data, metadata)
+            return
+        self.bucket.upload_from_stream(filename, data, metadata=metadata)
+
+    def _download(self, filename):
+        if self._files is not None:
+            return self._files.get(filename)
+        for grid_out in self.bucket.find({"filename": filename}).limit(1):
+            return grid_out.read(), grid_out.metadata
+        return None
+
+    def save(self, content_type, data):
+        avatar_hash = hashlib.sha256(data).hexdigest()
+        if self._exists(avatar_hash):
+            return avatar_hash
+
+        if Image is not None:
+            for size in AVATAR_CONFIG["THUMBNAIL_SIZES"]:
+                try:
+                    thumbnail = _thumbnail(data, size)
+                except (OSError, ValueError, Image.DecompressionBombError):
+                    break
+                self._upload(
+                    f"{avatar_hash}_{size}",
+                    thumbnail,
+                    {"content_type": "image/png", "hash": avatar_hash, "size": size},
+                )
+
+        # The original goes last: its presence marks the set as complete
+        self._upload(avatar_hash, data, {"content_type": content_type, "hash": avatar_hash})
+        return avatar_hash
+
+    # Returns (bytes, content_type) or None
+    def load(self, avatar_hash, size=None):
+        names = [avatar_hash]
+        if size in AVATAR_CONFIG["THUMBNAIL_SIZES"]:
+            names.insert(0, f"{avatar_hash}_{size}")
+
+        for name in names:
+            found = self._download(name)
+            if found is not None:
+                data, metadata = found
+                content_type = (metadata or {}).get("content_type")
+                # Stored before the allowlist: never served as a renderable type
+                if content_type not in ALLOWED_TYPES:
+                    content_type = "application/octet-stream"
+                return data, content_type
+        return None
+
+
+avatar_store = AvatarStore()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from pymongo.errors import PyMongoError
+from .config import COMPACTION_CONFIG
+from .metrics import message_compaction_batch_duration, messages_compacted
+from .repositories import repositories
+
+logger = logging.getLogger(__name__)
+
+
+# Deleting a message only flags the deleting side, so a message both
+# participants deleted lingers as a sync tombstone that every inbox query has
+# to skip. Once its retention window has passed, this sweep moves it out of
+# the hot collection in batches, throttled to MAX_PER_SECOND so it never
+# competes with request traffic for long.
+class MessageCompactor:
+    def __init__(self):
+        self._task = None
+        self.running = False
+        self.runs = 0
+        self.batches = 0
+        self.compacted = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_run_compacted = 0
+
+    @staticmethod
+    def cutoff():
+        return datetime.utcnow() - timedelta(hours=COMPACTION_CONFIG["RETENTION_HOURS"])
+
+    # Tokens from before the retention window may predate a deletion whose
+    # tombstone has since been compacted away
+    def token_expired(self, changed_after):
+        return COMPACTION_CONFIG["ENABLED"] and changed_after < self.cutoff()
+
+    def start(self):
+        if self._task is None and COMPACTION_CONFIG["ENABLED"]:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                # Keep sweeping on later intervals whatever went wrong here
+                self.failures += 1
+                logger.exception("Message compaction sweep failed")
+            await asyncio.sleep(COMPACTION_CONFIG["INTERVAL_SECONDS"])
+
+    # One sweep until nothing older than the cutoff is left
+    async def run_once(self):
+        mode = COMPACTION_CONFIG["MODE"]
+        archive = COMPACTION_CONFIG["ARCHIVE_COLLECTION"] if mode == "archive" else None
+        batch_size = COMPACTION_CONFIG["BATCH_SIZE"]
+        cutoff = self.cutoff()
+        compacted = 0
+
+        self.running = True
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    count = await repositories.ensure().messages.compact(cutoff, batch_size, archive)
+                except PyMongoError as e:
+                    message_compaction_batch_duration.observe(time.perf_counter() - start, "failure")
+                    logger.warning("Message compaction batch failed: %s", e)
+                    self.failures += 1
+                    break
+                elapsed = time.perf_counter() - start
+                message_compaction_batch_duration.observe(elapsed, "success")
+
+                self.batches += 1
+                self.compacted += count
+                compacted += count
+                if count:
+                    messages_compacted.inc(mode, amount=count)
+                if count < batch_size:
+                    break
+                # Sleep off whatever the batch finished early by
+                await asyncio.sleep(max(0, count / COMPACTION_CONFIG["MAX_PER_SECOND"] - elapsed))
+        finally:
+            self.running = False
+            self.runs += 1
+            self.last_run_at = datetime.utcnow()
+            self.last_run_compacted = compacted
+        return compacted
+
+    def stats(self):
+        return {
+            "enabled": COMPACTION_CONFIG["ENABLED"],
+            "mode": COMPACTION_CONFIG["MODE"],
+            "running": self.running,
+            "runs": self.runs,
+            "batches": self.batches,
+            "compacted": self.compacted,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_run_compacted": self.last_run_compacted,
+        }
+
+
+message_compactor = MessageCompactor()
@@ -8,10 +8,175 @@ EMAIL_CONFIG = {
     "SMTP_PORT": int(os.getenv("SMTP_PORT", "587")),
     "EMAIL_ADDRESS": os.getenv("EMAIL_ADDRESS", "your-email@example.com"),
     "EMAIL_PASSWORD": os.getenv("EMAIL_PASSWORD", "app-password"),
+    "USE_TLS": os.getenv("SMTP_USE_TLS", "true").lower() == "true",
+    "TIMEOUT_SECONDS": int(os.getenv("SMTP_TIMEOUT_SECONDS", "30")),
+}
+
+MAIL_QUEUE_CONFIG = {
+    "WORKERS": int(os.getenv("MAIL_WORKERS", "2")),
+    "MAX_SIZE": int(os.getenv("MAIL_QUEUE_MAX_SIZE", "10000")),
+    "MAX_ATTEMPTS": int(os.getenv("MAIL_MAX_ATTEMPTS", "5")),
+    "BACKOFF_SECONDS": float(os.getenv("MAIL_BACKOFF_SECONDS", "2")),
+    # Pooled SMTP connections are closed after this long without mail
+    "IDLE_SECONDS": int(os.getenv("MAIL_IDLE_SECONDS", "30")),
+    "DEAD_LETTER_COLLECTION": os.getenv("MAIL_DEAD_LETTER_COLLECTION", "mail_dead_letters"),
 }
 
 OTP_CONFIG = {
     "LENGTH": int(os.getenv("OTP_LENGTH", "6")),
     "EXPIRY_MINUTES": int(os.getenv("OTP_EXPIRY_MINUTES", "5")),
     "MAX_ATTEMPTS": int(os.getenv("OTP_MAX_ATTEMPTS", "3")),
+    # "memory" is per worker; "mongo" is shared by every worker
+    "STORE": os.getenv("OTP_STORE", "memory"),
+    "SWEEP_SECONDS": int(os.getenv("OTP_SWEEP_SECONDS", "30")),
+    "COLLECTION": os.getenv("OTP_COLLECTION", "otps"),
+}
+
+MONGO_CONFIG = {
+    "URL": os.getenv("MONGODB_URL"),
+    "DB_NAME": os.getenv("DB_NAME", "sparkai"),
+    "MAX_POOL_SIZE": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "MIN_POOL_SIZE": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "MAX_IDLE_TIME_MS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+    "SERVER_SELECTION_TIMEOUT_MS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "WAIT_QUEUE_TIMEOUT_MS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0")),
+    # Threads that run blocking pymongo calls off the event loop (0 = run inline)
+    "EXECUTOR_WORKERS": int(os.getenv("MONGO_EXECUTOR_WORKERS", "32")),
+    "RUN_MIGRATIONS": os.getenv("MONGO_RUN_MIGRATIONS", "true").lower() == "true",
+}
+
+CACHE_CONFIG = {
+    "AVATAR_MAX_ENTRIES": int(os.getenv("AVATAR_CACHE_MAX_ENTRIES", "1024")),
+    "AVATAR_TTL_SECONDS": int(os.getenv("AVATAR_CACHE_TTL_SECONDS", "300")),
+    "USER_MAX_ENTRIES": int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+    "USER_TTL_SECONDS": int(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+    # Verified JWTs; each entry lives until its token's exp claim
+    "TOKEN_MAX_ENTRIES": int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000")),
+}
+
+PAGINATION_CONFIG = {
+    "DEFAULT_LIMIT": int(os.getenv("PAGE_DEFAULT_LIMIT", "50")),
+    "MAX_LIMIT": int(os.getenv("PAGE_MAX_LIMIT", "200")),
+    # Keep returning the whole list when a client sends neither limit nor cursor
+    "LEGACY_UNPAGINATED": os.getenv("PAGE_LEGACY_UNPAGINATED", "true").lower() == "true",
+}
+
+SEARCH_CONFIG = {
+    "MAX_QUERY_LENGTH": int(os.getenv("SEARCH_MAX_QUERY_LENGTH", "200")),
+    # Ranked results page by offset; deeper pages are not served
+    "MAX_RESULTS": int(os.getenv("SEARCH_MAX_RESULTS", "1000")),
+}
+
+SYNC_CONFIG = {
+    # Tokens never advance past now minus this window, so writes that commit
+    # slightly out of timestamp order are still picked up by the next sync
+    "SAFETY_WINDOW_MS": int(os.getenv("SYNC_SAFETY_WINDOW_MS", "2000")),
+    "MAX_CHANGES": int(os.getenv("SYNC_MAX_CHANGES", "1000")),
+}
+
+COMPACTION_CONFIG = {
+    # Messages deleted by both participants are removed from `messages` by a
+    # background sweep (see app/compaction.py)
+    "ENABLED": os.getenv("MESSAGE_COMPACTION_ENABLED", "true").lower() == "true",
+    # "archive" copies them to ARCHIVE_COLLECTION first; "delete" drops them
+    "MODE": os.getenv("MESSAGE_COMPACTION_MODE", "archive"),
+    "ARCHIVE_COLLECTION": os.getenv("MESSAGE_ARCHIVE_COLLECTION", "messages_archive"),
+    # Deletions stay visible to delta sync for this long; older sync tokens
+    # are rejected, since they may have missed a compacted tombstone
+    "RETENTION_HOURS": int(os.getenv("MESSAGE_COMPACTION_RETENTION_HOURS", "168")),
+    "INTERVAL_SECONDS": int(os.getenv("MESSAGE_COMPACTION_INTERVAL_SECONDS", "3600")),
+    "BATCH_SIZE": int(os.getenv("MESSAGE_COMPACTION_BATCH_SIZE", "500")),
+    "MAX_PER_SECOND": int(os.getenv("MESSAGE_COMPACTION_MAX_PER_SECOND", "2000")),
+}
+
+REALTIME_CONFIG = {
+    # "local" fans out inside this worker only; "mongo" relays through a
+    # capped collection so every worker sees every event
+    "BROKER": os.getenv("REALTIME_BROKER", "local"),
+    "QUEUE_SIZE": int(os.getenv("REALTIME_QUEUE_SIZE", "100")),
+    "HEARTBEAT_SECONDS": int(os.getenv("REALTIME_HEARTBEAT_SECONDS", "30")),
+    "EVENTS_COLLECTION": os.getenv("REALTIME_EVENTS_COLLECTION", "realtime_events"),
+    "EVENTS_COLLECTION_BYTES": int(os.getenv("REALTIME_EVENTS_COLLECTION_BYTES", str(16 * 1024 * 1024))),
+}
+
+PASSWORD_CONFIG = {
+    "BCRYPT_ROUNDS": int(os.getenv("BCRYPT_ROUNDS", "12")),
+    # bcrypt releases the GIL, so threads scale across cores; "process" is
+    # available for hashing backends that do not
+    "POOL": os.getenv("PASSWORD_HASH_POOL", "thread"),
+    "WORKERS": int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))),
+}
+
+
+def _rate(name, default):
+    # "<burst>/<seconds>": up to <burst> calls, refilled evenly over <seconds>
+    burst, seconds = os.getenv(name, default).split("/")
+    return {"CAPACITY": int(burst), "PERIOD_SECONDS": float(seconds)}
+
+
+RATE_LIMIT_CONFIG = {
+    "ENABLED": os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+    # "memory" keeps buckets per worker; "mongo" shares them across workers
+    "BACKEND": os.getenv("RATE_LIMIT_BACKEND", "memory"),
+    "COLLECTION": os.getenv("RATE_LIMIT_COLLECTION", "rate_limits"),
+    "MAX_KEYS": int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")),
+    "TRUST_FORWARDED_FOR": os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true",
+    "SCOPES": {
+        "login": {"ip": _rate("RATE_LIMIT_LOGIN_IP", "20/60"), "email": _rate("RATE_LIMIT_LOGIN_EMAIL", "5/60")},
+        "register": {"ip": _rate("RATE_LIMIT_REGISTER_IP", "10/600"), "email": _rate("RATE_LIMIT_REGISTER_EMAIL", "3/600")},
+        "resend_otp": {"ip": _rate("RATE_LIMIT_RESEND_OTP_IP", "10/600"), "email": _rate("RATE_LIMIT_RESEND_OTP_EMAIL", "3/600")},
+        "forgot_password": {"ip": _rate("RATE_LIMIT_FORGOT_PASSWORD_IP", "10/600"), "email": _rate("RATE_LIMIT_FORGOT_PASSWORD_EMAIL", "3/600")},
+    },
+}
+
+SPARK_ID_CONFIG = {
+    # IDs reserved from the shared counter per round trip, per worker
+    "BLOCK_SIZE": int(os.getenv("SPARK_ID_BLOCK_SIZE", "100")),
+    "MAX_ATTEMPTS": int(os.getenv("SPARK_ID_MAX_ATTEMPTS", "10")),
+}
+
+AVATAR_CONFIG = {
+    "BUCKET": os.getenv("AVATAR_BUCKET", "avatars"),
+    "THUMBNAIL_SIZES": [int(size) for size in os.getenv("AVATAR_THUMBNAIL_SIZES", "64,256").split(",")],
+    "MESSAGE_SIZE": int(os.getenv("AVATAR_MESSAGE_SIZE", "64")),
+    "PROFILE_SIZE": int(os.getenv("AVATAR_PROFILE_SIZE", "256")),
+    "MAX_BYTES": int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024))),
+    # Larger images are refused before any pixels are decoded: a few KB of
+    # compressed PNG can expand to gigabytes
+    "MAX_DIMENSION": int(os.getenv("AVATAR_MAX_DIMENSION", "4096")),
+    # Preset image URLs are kept on the user document, so they stay short
+    "MAX_URL_LENGTH": int(os.getenv("AVATAR_MAX_URL_LENGTH", "2048")),
+    # Prefix for avatar URLs handed to clients
+    "PUBLIC_URL": os.getenv("PUBLIC_API_URL", "http://localhost:8000"),
+}
+
+REPOSITORY_CONFIG = {
+    # "mongo" for the shared database; "memory" keeps all data in this
+    # process (nothing persists), for tests and benchmarks. Run "memory" with
+    # the OTP store, rate limiter and realtime broker on their local backends.
+    "BACKEND": os.getenv("REPOSITORY_BACKEND", "mongo"),
+}
+
+ETAG_CONFIG = {
+    # Conditional GETs on per-user resources (see app/versioning.py)
+    "ENABLED": os.getenv("ETAG_ENABLED", "true").lower() == "true",
+    "COLLECTION": os.getenv("ETAG_COLLECTION", "resource_versions"),
+    # Change to invalidate every ETag handed out so far, e.g. when a deploy
+    # changes how a resource is rendered
+    "EPOCH": os.getenv("ETAG_EPOCH", "1"),
+}
+
+METRICS_CONFIG = {
+    # Prometheus text exposition at /metrics (see app/metrics.py)
+    "ENABLED": os.getenv("METRICS_ENABLED", "true").lower() == "true",
+    # Histogram bucket upper bounds, in seconds
+    "BUCKETS": [float(b) for b in os.getenv(
+        "METRICS_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10"
+    ).split(",")],
+}
+
+FAST_JSON_CONFIG = {
+    # List endpoints encode projected documents with orjson directly,
+    # skipping per-item Pydantic models and response_model validation
+    "ENABLED": os.getenv("FAST_JSON", "false").lower() == "true",
 }
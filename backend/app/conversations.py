@@ -0,0 +1,84 @@
+from datetime import datetime
+from pymongo import UpdateOne
+
+# One summary document per (owner, peer): the owner's view of a thread, with
+# the last message they can still see and how many they haven't read.
+# Maintained on every send and delete so the inbox is one small query.
+
+
+def pair_key(a, b):
+    return "|".join(sorted((a, b)))
+
+
+def conversation_id(owner, peer):
+    return f"{owner}:{peer}"
+
+
+def message_preview(msg):
+    return {
+        "id": msg["id"],
+        "sender_id": msg["sender_id"],
+        "content": msg["content"],
+        "bot_type": msg["bot_type"],
+        "timestamp": msg["timestamp"],
+    }
+
+
+# Pipeline update so out-of-order sends never move last_message backwards.
+# Values are wrapped in $literal: message content may start with "$".
+def _view_update(owner, peer, peer_name, msg, unread_increment):
+    is_newer = {"$gt": [msg["timestamp"], {"$ifNull": ["$last_timestamp", datetime.min]}]}
+    return UpdateOne(
+        {"owner": owner, "peer": peer},
+        [{"$set": {
+            "id": conversation_id(owner, peer),
+            "peer_name": {"$literal": peer_name},
+            "last_message": {"$cond": [is_newer, {"$literal": message_preview(msg)}, "$last_message"]},
+            "last_timestamp": {"$cond": [is_newer, msg["timestamp"], "$last_timestamp"]},
+            "unread": {"$add": [{"$ifNull": ["$unread", 0]}, unread_increment]},
+        }}],
+        upsert=True,
+    )
+
+
+async def record_message(db, msg):
+    await db.conversations.bulk_write([
+        _view_update(msg["sender_id"], msg["receiver_id"], msg["receiver_name"], msg, 0),
+        _view_update(msg["receiver_id"], msg["sender_id"], msg["sender_name"], msg, 1),
+    ], ordered=False)
+
+
+def visible_to(owner):
+    return {
+        "$or": [
+            {"sender_id": owner, "sender_deleted": {"$ne": True}},
+            {"receiver_id": owner, "receiver_deleted": {"$ne": True}},
+        ]
+    }
+
+
+# After a delete, point the owner's view at the newest message they can still
+# see in the thread, or drop the view if nothing is left
+async def refresh_view(db, owner, peer):
+    latest = await db.messages.find(
+        {"pair": pair_key(owner, peer), **visible_to(owner)},
+        sort=[("timestamp", -1), ("id", -1)],
+        limit=1,
+    )
+    if not latest:
+        await db.conversations.delete_one({"owner": owner, "peer": peer})
+        return
+
+    msg = latest[0]
+    await db.conversations.update_one(
+        {"owner": owner, "peer": peer},
+        {"$set": {"last_message": message_preview(msg), "last_timestamp": msg["timestamp"]}},
+    )
+
+
+async def mark_read(db, owner, peer):
+    result = await db.conversations.update_one(
+        {"owner": owner, "peer": peer},
+        {"$set": {"unread": 0}},
+    )
+    return result.matched_count > 0
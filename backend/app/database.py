@@ -0,0 +1,244 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pymongo import MongoClient, monitoring
+from .config import MONGO_CONFIG, METRICS_CONFIG
+from .metrics import CommandTimingListener
+
+
+# Running connection pool counters, keyed by server address
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        key = f"{address[0]}:{address[1]}"
+        if key not in self._pools:
+            self._pools[key] = {
+                "open": 0,
+                "checked_out": 0,
+                "waiting": 0,
+                "created_total": 0,
+                "closed_total": 0,
+                "checkout_failed_total": 0,
+                "cleared_total": 0,
+            }
+        return self._pools[key]
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared_total"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] += 1
+            pool["created_total"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open"] = max(pool["open"] - 1, 0)
+            pool["closed_total"] += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address)["waiting"] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] = max(pool["waiting"] - 1, 0)
+            pool["checkout_failed_total"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] = max(pool["waiting"] - 1, 0)
+            pool["checked_out"] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] = max(pool["checked_out"] - 1, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+
+# Awaitable facade over a pymongo collection; every call goes through the
+# bounded executor so slow queries never stall the event loop
+class AsyncCollection:
+    def __init__(self, collection, runner):
+        self.collection = collection
+        self.name = collection.name
+        self._run = runner
+
+    async def find(self, filter=None, projection=None, sort=None, limit=0, skip=0):
+        def fetch():
+            cursor = self.collection.find(filter, projection)
+            if sort:
+                cursor = cursor.sort(sort)
+            if skip:
+                cursor = cursor.skip(skip)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
+
+        return await self._run(fetch)
+
+    async def aggregate(self, pipeline, **kwargs):
+        return await self._run(lambda: list(self.collection.aggregate(pipeline, **kwargs)))
+
+    async def find_one(self, *args, **kwargs):
+        return await self._run(self.collection.find_one, *args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await self._run(self.collection.find_one_and_update, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return await self._run(self.collection.insert_one, *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        return await self._run(self.collection.insert_many, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self._run(self.collection.update_one, *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        return await self._run(self.collection.update_many, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await self._run(self.collection.delete_one, *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return await self._run(self.collection.delete_many, *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._run(self.collection.count_documents, *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return await self._run(self.collection.bulk_write, *args, **kwargs)
+
+
+class AsyncDatabase:
+    def __init__(self, db, runner):
+        self.db = db
+        self._run = runner
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = AsyncCollection(self.db[name], self._run)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+# Single MongoClient shared by every request in this process
+class Database:
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.async_db = None
+        self.executor = None
+        self.pool_listener = PoolStatsListener()
+        self.command_listener = CommandTimingListener()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def connect(self):
+        if self.db is not None:
+            return self.db
+
+        with self._lock:
+            if self.db is None:
+                options = {
+                    "maxPoolSize": MONGO_CONFIG["MAX_POOL_SIZE"],
+                    "minPoolSize": MONGO_CONFIG["MIN_POOL_SIZE"],
+                    "maxIdleTimeMS": MONGO_CONFIG["MAX_IDLE_TIME_MS"],
+                    "serverSelectionTimeoutMS": MONGO_CONFIG["SERVER_SELECTION_TIMEOUT_MS"],
+                    "event_listeners": [self.pool_listener],
+                }
+                if METRICS_CONFIG["ENABLED"]:
+                    options["event_listeners"].append(self.command_listener)
+                if MONGO_CONFIG["WAIT_QUEUE_TIMEOUT_MS"] > 0:
+                    options["waitQueueTimeoutMS"] = MONGO_CONFIG["WAIT_QUEUE_TIMEOUT_MS"]
+
+                if MONGO_CONFIG["EXECUTOR_WORKERS"] > 0:
+                    self.executor = ThreadPoolExecutor(
+                        max_workers=MONGO_CONFIG["EXECUTOR_WORKERS"],
+                        thread_name_prefix="mongo",
+                    )
+
+                self.client = MongoClient(MONGO_CONFIG["URL"], **options)
+                self.async_db = AsyncDatabase(self.client[MONGO_CONFIG["DB_NAME"]], self.run)
+                self.db = self.client[MONGO_CONFIG["DB_NAME"]]
+        return self.db
+
+    def get_async_db(self):
+        self.connect()
+        return self.async_db
+
+    async def run(self, fn, *args, **kwargs):
+        # Blocking work (pymongo, SMTP) is pushed onto the bounded executor
+        if self.executor is None:
+            return fn(*args, **kwargs)
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+
+    def close(self):
+        with self._lock:
+            if self.client is not None:
+                self.client.close()
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            self.client = None
+            self.db = None
+            self.async_db = None
+            self.executor = None
+
+    def pool_stats(self):
+        return {
+            "max_pool_size": MONGO_CONFIG["MAX_POOL_SIZE"],
+            "min_pool_size": MONGO_CONFIG["MIN_POOL_SIZE"],
+            "max_idle_time_ms": MONGO_CONFIG["MAX_IDLE_TIME_MS"],
+            "server_selection_timeout_ms": MONGO_CONFIG["SERVER_SELECTION_TIMEOUT_MS"],
+            "connected": self.client is not None,
+            "pools": self.pool_listener.snapshot(),
+        }
+
+    def executor_stats(self):
+        return {
+            "workers": MONGO_CONFIG["EXECUTOR_WORKERS"],
+            "in_flight": self._in_flight,
+            "queued": self.executor._work_queue.qsize() if self.executor is not None else 0,
+        }
+
+
+database = Database()
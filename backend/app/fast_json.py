@@ -0,0 +1,27 @@
+from fastapi.responses import Response
+from .config import FAST_JSON_CONFIG
+
+try:
+    import orjson
+except ImportError:  # the fast path is opt-in; without orjson it stays off
+    orjson = None
+
+
+def fast_json_enabled():
+    return FAST_JSON_CONFIG["ENABLED"] and orjson is not None
+
+
+# Returning a Response from a route bypasses response_model, so the documents
+# must already have exactly the public fields (see the *_PROJECTION constants
+# in app/repositories)
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+
+def fast_list_response(items, paginated, next_cursor=None, headers=None):
+    if not paginated:
+        return FastJSONResponse(items, headers=headers)
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor}, headers=headers)
@@ -0,0 +1,217 @@
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from .config import EMAIL_CONFIG, MAIL_QUEUE_CONFIG
+from .metrics import smtp_send_duration
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+# The envelope must be ASCII unless the server speaks SMTPUTF8, which is not
+# negotiated: internationalised domains are IDNA-encoded, and a non-ASCII
+# local part is refused before it can reach a worker
+def envelope_address(address):
+    local, at, domain = address.strip().rpartition("@")
+    if not at or not local or not domain:
+        raise ValueError(f"Invalid email address: {address!r}")
+    if not local.isascii():
+        raise ValueError(f"Non-ASCII local part: {address!r}")
+    try:
+        domain = domain.encode("idna").decode("ascii")
+    except UnicodeError:
+        raise ValueError(f"Invalid email domain: {address!r}")
+    return f"{local}@{domain}"
+
+
+# Outbound mail drained by background workers. Each worker keeps one
+# authenticated SMTP connection open and reuses it for every message; failed
+# sends are retried with exponential backoff, then recorded as dead letters.
+class MailQueue:
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=MAIL_QUEUE_CONFIG["MAX_SIZE"])
+        self._workers = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self.dead_letters = None
+        self.recent_dead_letters = deque(maxlen=100)
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.rejected = 0
+        self.connections_opened = 0
+
+    def start(self, db=None):
+        with self._lock:
+            if self._workers:
+                return
+            if db is not None:
+                self.dead_letters = db[MAIL_QUEUE_CONFIG["DEAD_LETTER_COLLECTION"]]
+            for i in range(MAIL_QUEUE_CONFIG["WORKERS"]):
+                worker = threading.Thread(target=self._work, name=f"mail-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout=10):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(_STOP)
+        for worker in workers:
+            worker.join(timeout)
+
+    def enqueue(self, to_address, message):
+        try:
+            to_address = envelope_address(to_address)
+        except ValueError:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        if not self._workers:
+            self.start()
+
+        job = {"to": to_address, "message": message, "attempts": 0, "queued_at": time.time()}
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            return False
+
+        with self._lock:
+            self._pending += 1
+        return True
+
+    def wait_idle(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "pending": self._pending,
+            "workers": sum(worker.is_alive() for worker in self._workers),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "rejected": self.rejected,
+            "connections_opened": self.connections_opened,
+        }
+
+    def _connect(self):
+        server = smtplib.SMTP(
+            EMAIL_CONFIG["SMTP_SERVER"],
+            EMAIL_CONFIG["SMTP_PORT"],
+            timeout=EMAIL_CONFIG["TIMEOUT_SECONDS"],
+        )
+        if EMAIL_CONFIG["USE_TLS"]:
+            server.starttls()
+        if EMAIL_CONFIG["EMAIL_PASSWORD"]:
+            server.login(EMAIL_CONFIG["EMAIL_ADDRESS"], EMAIL_CONFIG["EMAIL_PASSWORD"])
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _send(self, server, job):
+        # A pooled connection may have been dropped by the server while idle;
+        # reconnect once before treating the send as failed
+        for attempt in range(2):
+            if server is None:
+                server = self._connect()
+            try:
+                server.sendmail(EMAIL_CONFIG["EMAIL_ADDRESS"], job["to"], job["message"])
+                return server
+            except smtplib.SMTPServerDisconnected:
+                server = None
+                if attempt:
+                    raise
+        return server
+
+    def _work(self):
+        server = None
+        while True:
+            try:
+                job = self._queue.get(timeout=MAIL_QUEUE_CONFIG["IDLE_SECONDS"])
+            except queue.Empty:
+                self._close(server)
+                server = None
+                continue
+
+            if job is _STOP:
+                self._close(server)
+                return
+
+            job["attempts"] += 1
+            start = time.perf_counter()
+            try:
+                server = self._send(server, job)
+            except (smtplib.SMTPException, OSError) as e:
+                smtp_send_duration.observe(time.perf_counter() - start, "failure")
+                self._close(server)
+                server = None
+                self._failed(job, e)
+                continue
+            except Exception as e:
+                # Not a delivery problem (e.g. an unencodable message): a
+                # retry would fail the same way, and the worker must survive
+                smtp_send_duration.observe(time.perf_counter() - start, "failure")
+                self._close(server)
+                server = None
+                self._failed(job, e, retryable=False)
+                continue
+            smtp_send_duration.observe(time.perf_counter() - start, "success")
+
+            with self._lock:
+                self.sent += 1
+                self._finish()
+
+    def _failed(self, job, error, retryable=True):
+        if retryable and job["attempts"] < MAIL_QUEUE_CONFIG["MAX_ATTEMPTS"]:
+            delay = MAIL_QUEUE_CONFIG["BACKOFF_SECONDS"] * 2 ** (job["attempts"] - 1)
+            with self._lock:
+                self.retried += 1
+            retry = threading.Timer(delay, self._queue.put, args=(job,))
+            retry.daemon = True
+            retry.start()
+            return
+
+        logger.error("Giving up on email to %s after %d attempts: %s", job["to"], job["attempts"], error)
+        record = {
+            "to": job["to"],
+            "attempts": job["attempts"],
+            "error": str(error),
+            "failed_at": datetime.utcnow(),
+        }
+        self.recent_dead_letters.append(record)
+        if self.dead_letters is not None:
+            try:
+                self.dead_letters.insert_one({**record, "message": job["message"]})
+            except Exception:
+                logger.exception("Error recording dead letter for %s", job["to"])
+
+        with self._lock:
+            self.dead += 1
+            self._finish()
+
+    # Caller holds self._lock
+    def _finish(self):
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.notify_all()
+
+
+mail_queue = MailQueue()
@@ -1,31 +1,82 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.websockets import WebSocketState
 from pydantic import BaseModel
 from typing import Optional
-from pymongo import MongoClient
+from contextlib import asynccontextmanager
 from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
+import hashlib
+import time
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import jwt
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 from .otp_service import otp_service
+from .mail_queue import envelope_address, mail_queue
+from .passwords import password_hasher
+from .rate_limit import rate_limiter
+from .spark_ids import is_spark_id_conflict
+from .fast_json import fast_json_enabled, fast_list_response
+from .versioning import NotModified, etag_headers, etag_matches, resource_versions
+from .conversations import pair_key
+from .avatar_store import AvatarTooLarge, InvalidAvatar, avatar_store, parse_avatar_url, parse_data_url, user_avatar
+from .database import database
+from .repositories import repositories
+from .migrations import run_migrations
+from .compaction import message_compactor
+from .config import MONGO_CONFIG, CACHE_CONFIG, SYNC_CONFIG, REALTIME_CONFIG, SPARK_ID_CONFIG, AVATAR_CONFIG, ETAG_CONFIG, METRICS_CONFIG, REPOSITORY_CONFIG, SEARCH_CONFIG
+from .realtime import hub
+from .metrics import MetricsMiddleware, registry as metrics_registry
+from .cache import MISSING, TTLCache
+from .pagination import (
+    decode_offset_cursor,
+    decode_sync_token,
+    encode_sync_token,
+    is_paginated,
+    page_limit,
+    split_offset_page,
+    split_page,
+)
 from uuid import uuid4
-from typing import List
+from typing import List, Union
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB setup
-MONGODB_URL = os.getenv("MONGODB_URL")
-DB_NAME = os.getenv("DB_NAME", "sparkai")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 480))
 
+# Application lifespan: open the shared MongoDB client once per process
+# (nothing to open when the repositories are in memory)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = None
+    if REPOSITORY_CONFIG["BACKEND"] == "mongo":
+        db = database.connect()
+        if MONGO_CONFIG["RUN_MIGRATIONS"]:
+            await database.run(run_migrations, db)
+    repositories.configure()
+    otp_service.configure(db)
+    rate_limiter.configure(db)
+    password_hasher.start()
+    await hub.start(db)
+    message_compactor.start()
+    try:
+        yield
+    finally:
+        await message_compactor.stop()
+        await hub.stop()
+        password_hasher.stop()
+        otp_service.shutdown()
+        database.close()
+
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -36,8 +87,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency and in-flight counts for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Avatars by spark_id, shared by all requests in this worker
+avatar_cache = TTLCache(CACHE_CONFIG["AVATAR_MAX_ENTRIES"], CACHE_CONFIG["AVATAR_TTL_SECONDS"])
+
+# Authenticated users keyed by token subject (email). Entries are lean: only
+# the identity fields below, never friends, avatars or password hashes.
+user_cache = TTLCache(CACHE_CONFIG["USER_MAX_ENTRIES"], CACHE_CONFIG["USER_TTL_SECONDS"])
+AUTH_USER_PROJECTION = {
+    "email": 1,
+    "spark_id": 1,
+    "username": 1,
+    "full_name": 1,
+    "is_verified": 1,
+    "disabled": 1,
+}
+
+def invalidate_user(email):
+    user_cache.pop(email)
+
+# Verified tokens keyed by SHA-256 of the token, mapped to their subject
+token_cache = TTLCache(CACHE_CONFIG["TOKEN_MAX_ENTRIES"], ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Models
@@ -107,21 +181,22 @@ class TodoResponse(BaseModel):
     completed: bool
     created_at: datetime
 
-# MongoDB connection
-def get_db():
-    client = MongoClient(MONGODB_URL)
-    db = client[DB_NAME]
-    try:
-        yield db
-    finally:
-        client.close()
+class TodoPage(BaseModel):
+    items: List[TodoResponse]
+    next_cursor: Optional[str] = None
+
+# Data access for every route (see app/repositories); the Mongo backend
+# shares the pooled client and runs its calls off the event loop
+def get_repos():
+    return repositories.ensure()
 
 # Password hashing
-def verify_password(plain_password, hashed_password):
-    return plain_password == hashed_password
+# Returns (verified, replacement_hash); see app/passwords.py
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return password
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 # JWT functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -134,38 +209,89 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
+# Full HMAC verification only on the first sight of a token
+def decode_access_token(token: str):
+    key = hashlib.sha256(token.encode()).hexdigest()
+    email = token_cache.get(key)
+    if email is not MISSING:
+        return email
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    email = payload.get("sub")
+    expires_in = payload.get("exp", 0) - time.time()
+    if email is not None and expires_in > 0:
+        token_cache.set(key, email, ttl=expires_in)
+    return email
+
+async def authenticate_token(token: str, repos):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
+        email: str = decode_access_token(token)
         if email is None:
             raise credentials_exception
         token_data = TokenData(email=email)
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = db.users.find_one({"email": token_data.email})
-    if user is None:
-        raise credentials_exception
+    user = user_cache.get(token_data.email)
+    if user is MISSING:
+        user = await repos.users.find_by_email(token_data.email, AUTH_USER_PROJECTION)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(token_data.email, user)
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme), repos = Depends(get_repos)):
+    return await authenticate_token(token, repos)
+
+# Conditional GET: answers If-None-Match from the version counter alone,
+# before the route touches the data collections. Resolves to the ETag (or
+# None when disabled) so routes returning a Response can attach it.
+def conditional_get(resource):
+    async def check(
+        request: Request,
+        response: Response,
+        current_user: dict = Depends(get_current_user),
+        repos = Depends(get_repos)
+    ):
+        if not ETAG_CONFIG["ENABLED"]:
+            return None
+        etag = await resource_versions.etag(repos, current_user["spark_id"], resource, request.url.query)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise NotModified(etag)
+        response.headers.update(etag_headers(etag))
+        return etag
+    return check
+
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(exc.etag))
+
 # Routes
 @app.post("/api/auth/login", response_model=Token)
-async def login_for_access_token(login_data: LoginRequest, db = Depends(get_db)):
-    user = db.users.find_one({"email": login_data.email})
+async def login_for_access_token(login_data: LoginRequest, request: Request, repos = Depends(get_repos)):
+    await rate_limiter.check("login", request, login_data.email)
+    user = await repos.users.find_by_email(login_data.email)
+
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await verify_password(login_data.password, user.get("password"))
 
-    if not user or not verify_password(login_data.password, user.get("password")):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Upgrade legacy plaintext passwords and outdated cost factors in place
+    if new_hash:
+        await repos.users.update(user["email"], {"password": new_hash})
+
     if not user.get("is_verified", True):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -178,26 +304,38 @@ async def login_for_access_token(login_data: LoginRequest, db = Depends(get_db))
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-import random
-
-# ... (existing imports)
-
-# Helper to generate unique Spark ID
-def generate_spark_id(db):
-    while True:
-        # Generate SPK + 6 random digits
-        random_digits = ''.join([str(random.randint(0, 9)) for _ in range(6)])
-        spark_id = f"SPK{random_digits}"
-        
-        # Check if it exists
-        if not db.users.find_one({"spark_id": spark_id}):
+# Helper to store a user with a unique Spark ID. The allocator never repeats
+# an ID; retries only cover clashes with legacy randomly generated IDs,
+# which the unique index on spark_id reports as DuplicateKeyError.
+async def with_new_spark_id(repos, write):
+    for _ in range(SPARK_ID_CONFIG["MAX_ATTEMPTS"]):
+        spark_id = await repos.users.allocate_spark_id()
+        try:
+            await write(spark_id)
             return spark_id
+        except DuplicateKeyError as e:
+            if not is_spark_id_conflict(e):
+                raise
+
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Could not allocate a Spark ID",
+    )
 
 @app.post("/api/auth/register")
-async def register_user(signup_data: SignUpRequest, db = Depends(get_db)):
+async def register_user(signup_data: SignUpRequest, request: Request, repos = Depends(get_repos)):
+    await rate_limiter.check("register", request, signup_data.email)
+    # The OTP could never be delivered, so do not create the account
+    try:
+        envelope_address(signup_data.email)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid email address",
+        )
     try:
-        existing_user = db.users.find_one({"email": signup_data.email})
-        hashed_password = get_password_hash(signup_data.password)
+        existing_user = await repos.users.find_by_email(signup_data.email)
+        hashed_password = await get_password_hash(signup_data.password)
 
         if existing_user:
             if existing_user.get("is_verified", True):
@@ -206,33 +344,32 @@ async def register_user(signup_data: SignUpRequest, db = Depends(get_db)):
                     detail="Email already registered",
                 )
             
-            # If re-registering unverified user, ensure they have a spark_id
-            spark_id = existing_user.get("spark_id")
-            if not spark_id:
-                spark_id = generate_spark_id(db)
-
-            try:
-                db.users.update_one(
-                    {"email": signup_data.email},
+            async def update_user(spark_id):
+                await repos.users.update(
+                    signup_data.email,
                     {
-                        "$set": {
-                            "username": signup_data.username,
-                            "password": hashed_password,
-                            "spark_id": spark_id,
-                            "is_verified": False,
-                            "updated_at": datetime.utcnow(),
-                        }
+                        "username": signup_data.username,
+                        "password": hashed_password,
+                        "spark_id": spark_id,
+                        "is_verified": False,
+                        "updated_at": datetime.utcnow(),
                     },
                 )
+
+            try:
+                # If re-registering unverified user, ensure they have a spark_id
+                if existing_user.get("spark_id"):
+                    await update_user(existing_user["spark_id"])
+                else:
+                    await with_new_spark_id(repos, update_user)
             except DuplicateKeyError:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Username not available. Please choose a different one.",
                 )
         else:
-            spark_id = generate_spark_id(db)
-            try:
-                db.users.insert_one(
+            async def insert_user(spark_id):
+                await repos.users.insert(
                     {
                         "username": signup_data.username,
                         "email": signup_data.email,
@@ -244,13 +381,16 @@ async def register_user(signup_data: SignUpRequest, db = Depends(get_db)):
                         "created_at": datetime.utcnow(),
                     }
                 )
+
+            try:
+                await with_new_spark_id(repos, insert_user)
             except DuplicateKeyError:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Username not available. Please choose a different one.",
                 )
 
-        otp_result = otp_service.create_otp(signup_data.email)
+        otp_result = await database.run(otp_service.create_otp, signup_data.email)
         if not otp_result["success"]:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -266,9 +406,28 @@ async def register_user(signup_data: SignUpRequest, db = Depends(get_db)):
             )
         raise
 
+# Inline data URLs go to the avatar store and the user keeps only the hash.
+# Returns the fields to set and the field names to unset on the user.
+async def profile_image_update(value):
+    avatar_hash = parse_avatar_url(value)
+    if avatar_hash is None:
+        try:
+            parsed = parse_data_url(value)
+        except AvatarTooLarge as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+        except InvalidAvatar as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if parsed is None:
+            # A preset image URL, kept as is
+            if len(value) > AVATAR_CONFIG["MAX_URL_LENGTH"]:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Profile image URL is too long")
+            return {"profile_image": value}, ("avatar_hash",)
+        avatar_hash = await database.run(avatar_store.save, *parsed)
+    return {"avatar_hash": avatar_hash}, ("profile_image",)
+
 @app.post("/api/auth/verify-otp")
-async def verify_user_otp(payload: VerifyOTPRequest, db = Depends(get_db)):
-    user = db.users.find_one({"email": payload.email})
+async def verify_user_otp(payload: VerifyOTPRequest, repos = Depends(get_repos)):
+    user = await repos.users.find_by_email(payload.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -278,7 +437,7 @@ async def verify_user_otp(payload: VerifyOTPRequest, db = Depends(get_db)):
     # LOGIC FIX: Only check OTP if user is NOT verified.
     # If they are already verified, we assume this is a profile update request.
     if not user.get("is_verified"):
-        otp_result = otp_service.verify_otp(payload.email, payload.otp)
+        otp_result = await database.run(otp_service.verify_otp, payload.email, payload.otp)
         if not otp_result["success"]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -300,18 +459,24 @@ async def verify_user_otp(payload: VerifyOTPRequest, db = Depends(get_db)):
     if payload.subject: user_update["subject"] = payload.subject
     if payload.theme_color: user_update["theme_color"] = payload.theme_color
     if payload.theme_mode: user_update["theme_mode"] = payload.theme_mode
-    if payload.profile_image: user_update["profile_image"] = payload.profile_image
-
-    db.users.update_one(
-        {"email": payload.email},
-        {"$set": user_update}
-    )
+    unset_fields = ()
+    if payload.profile_image:
+        image_fields, unset_fields = await profile_image_update(payload.profile_image)
+        user_update.update(image_fields)
+
+    await repos.users.update(payload.email, user_update, unset_fields)
+    invalidate_user(payload.email)
+    await resource_versions.bump(repos, user.get("spark_id"), "me")
+    if payload.profile_image:
+        avatar_cache.pop(user.get("spark_id"))
+        await resource_versions.bump_followers(repos, user.get("spark_id"))
 
     return {"message": "OTP verified and user details saved successfully"}
 
 @app.post("/api/auth/resend-otp")
-async def resend_user_otp(payload: ResendOTPRequest, db = Depends(get_db)):
-    user = db.users.find_one({"email": payload.email})
+async def resend_user_otp(payload: ResendOTPRequest, request: Request, repos = Depends(get_repos)):
+    await rate_limiter.check("resend_otp", request, payload.email)
+    user = await repos.users.find_by_email(payload.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -324,7 +489,7 @@ async def resend_user_otp(payload: ResendOTPRequest, db = Depends(get_db)):
             detail="Email already verified",
         )
 
-    otp_result = otp_service.resend_otp(payload.email)
+    otp_result = await database.run(otp_service.resend_otp, payload.email)
     if not otp_result["success"]:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -334,8 +499,9 @@ async def resend_user_otp(payload: ResendOTPRequest, db = Depends(get_db)):
     return {"message": "Email resent successfully"}
 
 @app.post("/api/auth/forgot-password")
-async def forgot_password(payload: ForgotPasswordRequest, db = Depends(get_db)):
-    user = db.users.find_one({"email": payload.email})
+async def forgot_password(payload: ForgotPasswordRequest, request: Request, repos = Depends(get_repos)):
+    await rate_limiter.check("forgot_password", request, payload.email)
+    user = await repos.users.find_by_email(payload.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -348,7 +514,7 @@ async def forgot_password(payload: ForgotPasswordRequest, db = Depends(get_db)):
             detail="Email not verified. Please complete registration first.",
         )
 
-    otp_result = otp_service.create_otp(payload.email)
+    otp_result = await database.run(otp_service.create_otp, payload.email)
     if not otp_result["success"]:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -358,15 +524,15 @@ async def forgot_password(payload: ForgotPasswordRequest, db = Depends(get_db)):
     return {"message": "Password reset OTP sent to your email"}
 
 @app.post("/api/auth/verify-reset-otp")
-async def verify_reset_otp(payload: VerifyResetOTPRequest, db = Depends(get_db)):
-    user = db.users.find_one({"email": payload.email})
+async def verify_reset_otp(payload: VerifyResetOTPRequest, repos = Depends(get_repos)):
+    user = await repos.users.find_by_email(payload.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
 
-    otp_result = otp_service.verify_otp(payload.email, payload.otp)
+    otp_result = await database.run(otp_service.verify_otp, payload.email, payload.otp)
     if not otp_result["success"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -376,8 +542,8 @@ async def verify_reset_otp(payload: VerifyResetOTPRequest, db = Depends(get_db))
     return {"message": "OTP verified successfully"}
 
 @app.post("/api/auth/reset-password")
-async def reset_password(payload: ResetPasswordRequest, db = Depends(get_db)):
-    user = db.users.find_one({"email": payload.email})
+async def reset_password(payload: ResetPasswordRequest, repos = Depends(get_repos)):
+    user = await repos.users.find_by_email(payload.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -385,18 +551,12 @@ async def reset_password(payload: ResetPasswordRequest, db = Depends(get_db)):
         )
 
     # Hash the new password
-    hashed_password = get_password_hash(payload.new_password)
+    hashed_password = await get_password_hash(payload.new_password)
     
     # Update password in database
-    db.users.update_one(
-        {"email": payload.email},
-        {
-            "$set": {
-                "password": hashed_password,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
+    await repos.users.update(payload.email, {"password": hashed_password, "updated_at": datetime.utcnow()})
+    invalidate_user(payload.email)
+    await resource_versions.bump(repos, user.get("spark_id"), "me")
 
     return {"message": "Password reset successfully"}
 
@@ -413,18 +573,26 @@ class UserUpdate(BaseModel):
 # ... (existing code)
 
 @app.get("/api/users/me")
-async def read_users_me(current_user: dict = Depends(get_current_user)):
-    user_data = dict(current_user)
+async def read_users_me(
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos),
+    etag: Optional[str] = Depends(conditional_get("me"))
+):
+    # The cached auth document is lean; the profile needs the full one
+    user_data = await repos.users.find_by_email(current_user["email"], {"password": 0, "hashed_password": 0})
+    if user_data is None:
+        raise HTTPException(status_code=404, detail="User not found")
     user_data['_id'] = str(user_data['_id'])
     user_data.pop('password', None)
     user_data.pop('hashed_password', None)
+    user_data['profile_image'] = user_avatar(user_data, AVATAR_CONFIG["PROFILE_SIZE"])
     return user_data
 
 @app.put("/api/users/me")
 async def update_user_me(
     user_update: UserUpdate,
     current_user: dict = Depends(get_current_user),
-    db = Depends(get_db)
+    repos = Depends(get_repos)
 ):
     update_data = {k: v for k, v in user_update.dict().items() if v is not None}
     
@@ -433,16 +601,62 @@ async def update_user_me(
 
     update_data["updated_at"] = datetime.utcnow()
 
-    db.users.update_one(
-        {"email": current_user["email"]},
-        {"$set": update_data}
-    )
+    unset_fields = ()
+    if "profile_image" in update_data:
+        image_fields, unset_fields = await profile_image_update(update_data.pop("profile_image"))
+        update_data.update(image_fields)
+
+    await repos.users.update(current_user["email"], update_data, unset_fields)
+    invalidate_user(current_user["email"])
+    avatar_cache.pop(current_user.get("spark_id"))
+    await resource_versions.bump(repos, current_user["spark_id"], "me")
+    if unset_fields:
+        await resource_versions.bump_followers(repos, current_user["spark_id"])
 
     return {"message": "Profile updated successfully"}
 
-@app.get("/api/todos", response_model=List[TodoResponse])
-async def get_todos(current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    todos_cursor = db.todos.find({"user_email": current_user["email"]}).sort("created_at", -1)
+class ChatCountResponse(BaseModel):
+    chat_count: int
+
+# Atomic server-side increment; `by` lets clients batch several replies
+@app.post("/api/users/me/chat-count/increment", response_model=ChatCountResponse)
+async def increment_chat_count(
+    by: int = Query(1, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    chat_count = await repos.users.increment(
+        current_user["email"], "chat_count", by, {"updated_at": datetime.utcnow()}
+    )
+    if chat_count is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    await resource_versions.bump(repos, current_user["spark_id"], "me")
+    return ChatCountResponse(chat_count=chat_count)
+
+@app.get("/api/todos", response_model=Union[List[TodoResponse], TodoPage])
+async def get_todos(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos),
+    etag: Optional[str] = Depends(conditional_get("todos"))
+):
+    paginated = is_paginated(limit, cursor)
+    if paginated:
+        limit = page_limit(limit)
+
+    todos_cursor = await repos.todos.list(
+        current_user["email"],
+        limit=limit + 1 if paginated else 0,
+        cursor=cursor,
+    )
+    next_cursor = None
+    if paginated:
+        todos_cursor, next_cursor = split_page(todos_cursor, limit, "created_at")
+
+    if fast_json_enabled():
+        return fast_list_response(todos_cursor, paginated, next_cursor, etag and etag_headers(etag))
+
     todos = []
     for todo in todos_cursor:
         todos.append(TodoResponse(
@@ -451,10 +665,12 @@ async def get_todos(current_user: dict = Depends(get_current_user), db = Depends
             completed=todo["completed"],
             created_at=todo["created_at"]
         ))
-    return todos
+    if not paginated:
+        return todos
+    return TodoPage(items=todos, next_cursor=next_cursor)
 
 @app.post("/api/todos", response_model=TodoResponse)
-async def create_todo(todo: TodoCreate, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
+async def create_todo(todo: TodoCreate, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
     new_todo = {
         "id": str(uuid4()),
         "user_email": current_user["email"],
@@ -462,18 +678,16 @@ async def create_todo(todo: TodoCreate, current_user: dict = Depends(get_current
         "completed": False,
         "created_at": datetime.utcnow()
     }
-    db.todos.insert_one(new_todo)
+    await repos.todos.insert(new_todo)
+    await resource_versions.bump(repos, current_user["spark_id"], "todos")
     return TodoResponse(**new_todo)
 
 @app.put("/api/todos/{todo_id}", response_model=TodoResponse)
-async def update_todo(todo_id: str, todo_update: TodoUpdate, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    result = db.todos.find_one_and_update(
-        {"id": todo_id, "user_email": current_user["email"]},
-        {"$set": {"completed": todo_update.completed}},
-        return_document=True
-    )
+async def update_todo(todo_id: str, todo_update: TodoUpdate, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
+    result = await repos.todos.set_completed(current_user["email"], todo_id, todo_update.completed)
     if not result:
         raise HTTPException(status_code=404, detail="Todo not found")
+    await resource_versions.bump(repos, current_user["spark_id"], "todos")
     return TodoResponse(
         id=result["id"],
         text=result["text"],
@@ -482,10 +696,10 @@ async def update_todo(todo_id: str, todo_update: TodoUpdate, current_user: dict
     )
 
 @app.delete("/api/todos/{todo_id}")
-async def delete_todo(todo_id: str, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    result = db.todos.delete_one({"id": todo_id, "user_email": current_user["email"]})
-    if result.deleted_count == 0:
+async def delete_todo(todo_id: str, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
+    if not await repos.todos.delete(current_user["email"], todo_id):
         raise HTTPException(status_code=404, detail="Todo not found")
+    await resource_versions.bump(repos, current_user["spark_id"], "todos")
     return {"message": "Todo deleted"}
 
 # Saves Models
@@ -499,10 +713,35 @@ class SaveResponse(BaseModel):
     bot_type: str
     created_at: datetime
 
+class SavePage(BaseModel):
+    items: List[SaveResponse]
+    next_cursor: Optional[str] = None
+
 # Saves Endpoints
-@app.get("/api/saves", response_model=List[SaveResponse])
-async def get_saves(current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    saves_cursor = db.saves.find({"user_email": current_user["email"]}).sort("created_at", -1)
+@app.get("/api/saves", response_model=Union[List[SaveResponse], SavePage])
+async def get_saves(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos),
+    etag: Optional[str] = Depends(conditional_get("saves"))
+):
+    paginated = is_paginated(limit, cursor)
+    if paginated:
+        limit = page_limit(limit)
+
+    saves_cursor = await repos.saves.list(
+        current_user["email"],
+        limit=limit + 1 if paginated else 0,
+        cursor=cursor,
+    )
+    next_cursor = None
+    if paginated:
+        saves_cursor, next_cursor = split_page(saves_cursor, limit, "created_at")
+
+    if fast_json_enabled():
+        return fast_list_response(saves_cursor, paginated, next_cursor, etag and etag_headers(etag))
+
     saves = []
     for save in saves_cursor:
         saves.append(SaveResponse(
@@ -511,10 +750,29 @@ async def get_saves(current_user: dict = Depends(get_current_user), db = Depends
             bot_type=save.get("bot_type", "chat"),
             created_at=save["created_at"]
         ))
-    return saves
+    if not paginated:
+        return saves
+    return SavePage(items=saves, next_cursor=next_cursor)
+
+# Ranked by relevance, so pages are addressed by offset rather than keyset
+@app.get("/api/saves/search", response_model=SavePage)
+async def search_saves(
+    q: str = Query(..., min_length=1, max_length=SEARCH_CONFIG["MAX_QUERY_LENGTH"]),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    limit = page_limit(limit)
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    saves = []
+    if offset < SEARCH_CONFIG["MAX_RESULTS"]:
+        saves = await repos.saves.search(current_user["email"], q, limit + 1, offset)
+    saves, next_cursor = split_offset_page(saves, limit, offset)
+    return SavePage(items=[SaveResponse(**save) for save in saves], next_cursor=next_cursor)
 
 @app.post("/api/saves", response_model=SaveResponse)
-async def create_save(save: SaveCreate, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
+async def create_save(save: SaveCreate, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
     new_save = {
         "id": str(uuid4()),
         "user_email": current_user["email"],
@@ -522,14 +780,15 @@ async def create_save(save: SaveCreate, current_user: dict = Depends(get_current
         "bot_type": save.bot_type,
         "created_at": datetime.utcnow()
     }
-    db.saves.insert_one(new_save)
+    await repos.saves.insert(new_save)
+    await resource_versions.bump(repos, current_user["spark_id"], "saves")
     return SaveResponse(**new_save)
 
 @app.delete("/api/saves/{save_id}")
-async def delete_save(save_id: str, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    result = db.saves.delete_one({"id": save_id, "user_email": current_user["email"]})
-    if result.deleted_count == 0:
+async def delete_save(save_id: str, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
+    if not await repos.saves.delete(current_user["email"], save_id):
         raise HTTPException(status_code=404, detail="Save not found")
+    await resource_versions.bump(repos, current_user["spark_id"], "saves")
     return {"message": "Save deleted"}
 
 # Friend Models
@@ -541,59 +800,94 @@ class FriendResponse(BaseModel):
     name: str
     spark_id: str
     email: str
+    avatar: Optional[str] = None
+
+class FriendPage(BaseModel):
+    items: List[FriendResponse]
+    next_cursor: Optional[str] = None
+
+# Only what a friend list entry shows, resolved fresh on every read
+FRIEND_PROFILE_PROJECTION = {
+    "spark_id": 1,
+    "username": 1,
+    "full_name": 1,
+    "email": 1,
+    "profile_image": 1,
+    "avatar_hash": 1,
+}
+
+def to_friend_dict(profile):
+    return {
+        "id": str(profile["_id"]),
+        "name": profile.get("username") or profile.get("full_name") or "Unknown",
+        "spark_id": profile["spark_id"],
+        "email": profile["email"],
+        "avatar": user_avatar(profile, AVATAR_CONFIG["MESSAGE_SIZE"]),
+    }
+
+def to_friend_response(profile):
+    return FriendResponse(**to_friend_dict(profile))
 
 # Friend Endpoints
 @app.post("/api/friends", response_model=FriendResponse)
-async def add_friend(friend_req: AddFriendRequest, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
+async def add_friend(friend_req: AddFriendRequest, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
     # Find the friend by spark_id
-    friend = db.users.find_one({"spark_id": friend_req.spark_id})
+    friend = await repos.users.find_by_spark_id(friend_req.spark_id, FRIEND_PROFILE_PROJECTION)
     if not friend:
         raise HTTPException(status_code=404, detail="User not found with this ID")
     
     if friend["email"] == current_user["email"]:
         raise HTTPException(status_code=400, detail="You cannot add yourself as a friend")
 
-    # Check if already friends
-    current_user_friends = current_user.get("friends", [])
+    # The unique (owner, friend_spark_id) index rejects duplicates
+    owner = current_user["spark_id"]
+    try:
+        await repos.friends.add({
+            "id": f"{owner}:{friend['spark_id']}",
+            "owner": owner,
+            "friend_spark_id": friend["spark_id"],
+            "created_at": datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User is already in your friends list")
+    await resource_versions.bump(repos, owner, "friends")
     
-    # Check if already in list
-    for f in current_user_friends:
-        if f["spark_id"] == friend_req.spark_id:
-            raise HTTPException(status_code=400, detail="User is already in your friends list")
-
-    new_friend_data = {
-        "user_id": str(friend["_id"]),
-        "spark_id": friend["spark_id"],
-        "name": friend.get("username") or friend.get("full_name") or "Unknown",
-        "email": friend["email"]
-    }
+    return to_friend_response(friend)
 
-    # Add to current user's friend list
-    db.users.update_one(
-        {"email": current_user["email"]},
-        {"$push": {"friends": new_friend_data}}
-    )
-    
-    return FriendResponse(
-        id=new_friend_data["user_id"],
-        name=new_friend_data["name"],
-        spark_id=new_friend_data["spark_id"],
-        email=new_friend_data["email"]
+@app.get("/api/friends", response_model=Union[List[FriendResponse], FriendPage])
+async def get_friends(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos),
+    etag: Optional[str] = Depends(conditional_get("friends"))
+):
+    paginated = is_paginated(limit, cursor)
+    if paginated:
+        limit = page_limit(limit)
+
+    friendships = await repos.friends.list(
+        current_user["spark_id"],
+        limit=limit + 1 if paginated else 0,
+        cursor=cursor,
     )
+    next_cursor = None
+    if paginated:
+        friendships, next_cursor = split_page(friendships, limit, "created_at")
 
-@app.get("/api/friends", response_model=List[FriendResponse])
-async def get_friends(current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    # Refresh user data to get latest friends
-    user = db.users.find_one({"email": current_user["email"]})
-    friends_data = user.get("friends", [])
-    return [
-        FriendResponse(
-            id=f["user_id"],
-            name=f["name"],
-            spark_id=f["spark_id"],
-            email=f["email"]
-        ) for f in friends_data
-    ]
+    # Current names and avatars for the whole page in one query
+    friend_ids = [f["friend_spark_id"] for f in friendships]
+    profiles = await repos.users.find_by_spark_ids(friend_ids, FRIEND_PROFILE_PROJECTION)
+    profiles = {profile["spark_id"]: profile for profile in profiles}
+
+    if fast_json_enabled():
+        friends = [to_friend_dict(profiles[spark_id]) for spark_id in friend_ids if spark_id in profiles]
+        return fast_list_response(friends, paginated, next_cursor, etag and etag_headers(etag))
+
+    friends = [to_friend_response(profiles[spark_id]) for spark_id in friend_ids if spark_id in profiles]
+    if not paginated:
+        return friends
+    return FriendPage(items=friends, next_cursor=next_cursor)
 
 # Message Models
 class MessageCreate(BaseModel):
@@ -613,11 +907,88 @@ class MessageResponse(BaseModel):
     bot_type: str
     timestamp: datetime
 
+class MessagePage(BaseModel):
+    items: List[MessageResponse]
+    next_cursor: Optional[str] = None
+
+class MessagePreview(BaseModel):
+    id: str
+    sender_id: str
+    content: str
+    bot_type: str
+    timestamp: datetime
+
+class ConversationResponse(BaseModel):
+    peer_id: str
+    peer_name: str
+    peer_avatar: Optional[str] = None
+    last_message: MessagePreview
+    last_timestamp: datetime
+    unread: int
+
+class ConversationPage(BaseModel):
+    items: List[ConversationResponse]
+    next_cursor: Optional[str] = None
+
+class MessageSyncResponse(BaseModel):
+    messages: List[MessageResponse]
+    deleted: List[str]
+    sync_token: str
+    has_more: bool = False
+
+# Avatar lookup: cached per worker, misses fetched with a single $in query
+async def resolve_avatars(repos, spark_ids):
+    avatars = {}
+    missing = []
+    for spark_id in spark_ids:
+        avatar = avatar_cache.get(spark_id)
+        if avatar is MISSING:
+            missing.append(spark_id)
+        else:
+            avatars[spark_id] = avatar
+
+    if missing:
+        users = await repos.users.find_by_spark_ids(
+            missing,
+            {"_id": 0, "spark_id": 1, "profile_image": 1, "avatar_hash": 1},
+        )
+        found = {user["spark_id"]: user_avatar(user, AVATAR_CONFIG["MESSAGE_SIZE"]) for user in users}
+        for spark_id in missing:
+            avatars[spark_id] = found.get(spark_id)
+            avatar_cache.set(spark_id, avatars[spark_id])
+
+    return avatars
+
+# Resolve every participant's avatar in one batched lookup
+async def resolve_message_avatars(repos, messages):
+    participants = set()
+    for msg in messages:
+        participants.add(msg["sender_id"])
+        participants.add(msg["receiver_id"])
+    return await resolve_avatars(repos, participants)
+
+def to_message_response(msg, avatars):
+    return MessageResponse(
+        id=msg["id"],
+        sender_id=msg["sender_id"],
+        sender_name=msg["sender_name"],
+        sender_avatar=avatars.get(msg["sender_id"]),
+        receiver_id=msg["receiver_id"],
+        receiver_name=msg["receiver_name"],
+        receiver_avatar=avatars.get(msg["receiver_id"]),
+        content=msg["content"],
+        bot_type=msg["bot_type"],
+        timestamp=msg["timestamp"]
+    )
+
 # Message Endpoints
 @app.post("/api/messages", response_model=MessageResponse)
-async def send_message(message: MessageCreate, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
+async def send_message(message: MessageCreate, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
     # Find receiver
-    receiver = db.users.find_one({"spark_id": message.receiver_spark_id})
+    receiver = await repos.users.find_by_spark_id(
+        message.receiver_spark_id,
+        {"spark_id": 1, "username": 1, "full_name": 1, "profile_image": 1, "avatar_hash": 1},
+    )
     if not receiver:
         raise HTTPException(status_code=404, detail="Receiver not found")
 
@@ -631,86 +1002,311 @@ async def send_message(message: MessageCreate, current_user: dict = Depends(get_
         "bot_type": message.bot_type,
         "timestamp": datetime.utcnow()
     }
+    new_message["updated_at"] = new_message["timestamp"]
+    new_message["pair"] = pair_key(new_message["sender_id"], new_message["receiver_id"])
     
-    db.messages.insert_one(new_message)
+    await repos.messages.insert(new_message)
     
     # Return response with avatars (fetched from current state)
-    return MessageResponse(
+    sender_avatars = await resolve_avatars(repos, [new_message["sender_id"]])
+    response = MessageResponse(
         **new_message,
-        sender_avatar=current_user.get("profile_image"),
-        receiver_avatar=receiver.get("profile_image")
+        sender_avatar=sender_avatars.get(new_message["sender_id"]),
+        receiver_avatar=user_avatar(receiver, AVATAR_CONFIG["MESSAGE_SIZE"])
+    )
+    await hub.publish(
+        [new_message["sender_id"], new_message["receiver_id"]],
+        {"type": "message.created", "message": jsonable_encoder(response)},
     )
+    return response
 
-@app.get("/api/messages", response_model=List[MessageResponse])
-async def get_messages(current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    user_spark_id = current_user["spark_id"]
-    
-    # Fetch messages where current user is sender OR receiver
+@app.get("/api/messages", response_model=Union[List[MessageResponse], MessagePage])
+async def get_messages(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    # Messages where the current user is sender OR receiver
     # AND the message is NOT deleted by them
-    messages_cursor = db.messages.find({
-        "$or": [
-            {
-                "sender_id": user_spark_id,
-                "sender_deleted": {"$ne": True}
-            },
-            {
-                "receiver_id": user_spark_id,
-                "receiver_deleted": {"$ne": True}
-            }
-        ]
-    }).sort("timestamp", -1)
+    paginated = is_paginated(limit, cursor)
+    if paginated:
+        limit = page_limit(limit)
+
+    messages_cursor = await repos.messages.list_visible(
+        current_user["spark_id"],
+        limit=limit + 1 if paginated else 0,
+        cursor=cursor,
+    )
+    next_cursor = None
+    if paginated:
+        messages_cursor, next_cursor = split_page(messages_cursor, limit, "timestamp")
     
+    avatars = await resolve_message_avatars(repos, messages_cursor)
+
+    if fast_json_enabled():
+        for msg in messages_cursor:
+            msg["sender_avatar"] = avatars.get(msg["sender_id"])
+            msg["receiver_avatar"] = avatars.get(msg["receiver_id"])
+        return fast_list_response(messages_cursor, paginated, next_cursor)
+
+    messages = [to_message_response(msg, avatars) for msg in messages_cursor]
+    if not paginated:
+        return messages
+    return MessagePage(items=messages, next_cursor=next_cursor)
+
+# Only messages the current user can still see; same offset paging as saves
+@app.get("/api/messages/search", response_model=MessagePage)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=SEARCH_CONFIG["MAX_QUERY_LENGTH"]),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    limit = page_limit(limit)
+    offset = decode_offset_cursor(cursor) if cursor else 0
     messages = []
-    # Cache for user profiles to avoid repeated DB lookups
-    user_cache = {}
-
-    def get_user_avatar(spark_id):
-        if spark_id in user_cache:
-            return user_cache[spark_id]
-        
-        user = db.users.find_one({"spark_id": spark_id})
-        avatar = user.get("profile_image") if user else None
-        user_cache[spark_id] = avatar
-        return avatar
-
-    for msg in messages_cursor:
-        messages.append(MessageResponse(
-            id=msg["id"],
-            sender_id=msg["sender_id"],
-            sender_name=msg["sender_name"],
-            sender_avatar=get_user_avatar(msg["sender_id"]),
-            receiver_id=msg["receiver_id"],
-            receiver_name=msg["receiver_name"],
-            receiver_avatar=get_user_avatar(msg["receiver_id"]),
-            content=msg["content"],
-            bot_type=msg["bot_type"],
-            timestamp=msg["timestamp"]
-        ))
-    return messages
+    if offset < SEARCH_CONFIG["MAX_RESULTS"]:
+        messages = await repos.messages.search(current_user["spark_id"], q, limit + 1, offset)
+    messages, next_cursor = split_offset_page(messages, limit, offset)
+    avatars = await resolve_message_avatars(repos, messages)
+    return MessagePage(
+        items=[to_message_response(msg, avatars) for msg in messages],
+        next_cursor=next_cursor,
+    )
+
+@app.get("/api/messages/sync", response_model=MessageSyncResponse)
+async def sync_messages(
+    since: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    user_spark_id = current_user["spark_id"]
+    started_at = datetime.utcnow()
+
+    # Everything that changed for this participant after the token, or on
+    # first sync every message still visible to them
+    changed_after, origin = decode_sync_token(since) if since else (None, started_at)
+    if message_compactor.token_expired(origin):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Sync token expired; sync again without a token",
+        )
+    changes = await repos.messages.changes(user_spark_id, changed_after, SYNC_CONFIG["MAX_CHANGES"] + 1)
+    if changed_after is None:
+        changed_after = (datetime.min, "")
+    has_more = len(changes) > SYNC_CONFIG["MAX_CHANGES"]
+    changes = changes[:SYNC_CONFIG["MAX_CHANGES"]]
+
+    visible = []
+    deleted = []
+    for msg in changes:
+        side = "sender" if msg["sender_id"] == user_spark_id else "receiver"
+        if msg.get(f"{side}_deleted"):
+            deleted.append(msg["id"])
+        else:
+            visible.append(msg)
+
+    # A truncated batch resumes after its last change, id included so ties
+    # on updated_at are not skipped, and keeps its origin so paging through
+    # old history never expires; a complete one is up to date as of the
+    # query, minus the safety window
+    if has_more:
+        last = changes[-1]
+        position = (last.get("updated_at", last["timestamp"]), last["id"])
+    else:
+        position = (started_at - timedelta(milliseconds=SYNC_CONFIG["SAFETY_WINDOW_MS"]), "")
+    position = max(position, changed_after)
+    if not has_more:
+        origin = position[0]
+
+    avatars = await resolve_message_avatars(repos, visible)
+    return MessageSyncResponse(
+        messages=[to_message_response(msg, avatars) for msg in visible],
+        deleted=deleted,
+        sync_token=encode_sync_token(position, origin),
+        has_more=has_more,
+    )
 
 @app.delete("/api/messages/{message_id}")
-async def delete_message(message_id: str, current_user: dict = Depends(get_current_user), db = Depends(get_db)):
-    message = db.messages.find_one({"id": message_id})
+async def delete_message(message_id: str, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
+    message = await repos.messages.find(message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
 
     user_spark_id = current_user["spark_id"]
     
-    update_field = None
     if message["sender_id"] == user_spark_id:
-        update_field = "sender_deleted"
+        side = "sender"
     elif message["receiver_id"] == user_spark_id:
-        update_field = "receiver_deleted"
+        side = "receiver"
     else:
         raise HTTPException(status_code=403, detail="Not authorized to delete this message")
 
-    db.messages.update_one(
-        {"id": message_id},
-        {"$set": {update_field: True}}
-    )
+    # Also points this user's conversation summary at what is left
+    await repos.messages.mark_deleted(message, side, datetime.utcnow())
+    # Deletion is per side: only the deleting user's other sessions care
+    await hub.publish([user_spark_id], {"type": "message.deleted", "id": message_id})
     
     return {"message": "Message deleted"}
 
+# Inbox: one summary per thread, newest first
+@app.get("/api/conversations", response_model=ConversationPage)
+async def get_conversations(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    limit = page_limit(limit)
+    views = await repos.messages.conversations(current_user["spark_id"], limit=limit + 1, cursor=cursor)
+    views, next_cursor = split_page(views, limit, "last_timestamp")
+    avatars = await resolve_avatars(repos, {view["peer"] for view in views})
+
+    return ConversationPage(
+        items=[
+            ConversationResponse(
+                peer_id=view["peer"],
+                peer_name=view["peer_name"],
+                peer_avatar=avatars.get(view["peer"]),
+                last_message=MessagePreview(**view["last_message"]),
+                last_timestamp=view["last_timestamp"],
+                unread=view.get("unread", 0),
+            )
+            for view in views
+        ],
+        next_cursor=next_cursor,
+    )
+
+# One thread, read through the (pair, timestamp) index
+@app.get("/api/conversations/{spark_id}/messages", response_model=MessagePage)
+async def get_conversation_messages(
+    spark_id: str,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    repos = Depends(get_repos)
+):
+    limit = page_limit(limit)
+    messages = await repos.messages.list_thread(current_user["spark_id"], spark_id, limit=limit + 1, cursor=cursor)
+    messages, next_cursor = split_page(messages, limit, "timestamp")
+    avatars = await resolve_message_avatars(repos, messages)
+    return MessagePage(
+        items=[to_message_response(msg, avatars) for msg in messages],
+        next_cursor=next_cursor,
+    )
+
+@app.post("/api/conversations/{spark_id}/read")
+async def mark_conversation_read(spark_id: str, current_user: dict = Depends(get_current_user), repos = Depends(get_repos)):
+    if not await repos.messages.mark_read(current_user["spark_id"], spark_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"message": "Conversation marked as read"}
+
+# Push channel: browsers cannot set headers on a WebSocket, so the same JWT
+# used for Authorization: Bearer is passed as ?token=
+@app.websocket("/api/ws")
+async def message_stream(websocket: WebSocket, token: str = Query(...), repos = Depends(get_repos)):
+    try:
+        user = await authenticate_token(token, repos)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    spark_id = user["spark_id"]
+    queue = hub.subscribe(spark_id)
+
+    # Clients never need to send anything; reading only detects disconnects
+    async def drain_client():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    reader = asyncio.create_task(drain_client())
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, reader},
+                timeout=REALTIME_CONFIG["HEARTBEAT_SECONDS"],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            # An event can land in the same wakeup as the reader finishing;
+            # it is still sent if the socket is open rather than dropped
+            if getter.done():
+                event = getter.result()
+            else:
+                getter.cancel()
+                event = None if reader in done else {"type": "ping"}
+            if event is not None and websocket.client_state == WebSocketState.CONNECTED:
+                await websocket.send_json(event)
+            if reader in done:
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        hub.unsubscribe(spark_id, queue)
+
+# Avatars are content-addressed, so a URL's bytes never change
+@app.get("/api/avatars/{avatar_hash}")
+async def get_avatar(avatar_hash: str, request: Request, size: Optional[int] = None):
+    etag = f'"{avatar_hash}-{size or "original"}"'
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        # Served from the API origin: never sniffed, never run as a document
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "default-src 'none'; sandbox",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    avatar = await database.run(avatar_store.load, avatar_hash, size)
+    if avatar is None:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    data, content_type = avatar
+    return Response(content=data, media_type=content_type, headers=cache_headers)
+
+# Prometheus scrape target. Counters and histograms accumulate in-process;
+# the gauges below are read fresh on every scrape.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    if not METRICS_CONFIG["ENABLED"]:
+        raise HTTPException(status_code=404, detail="Not Found")
+    pool = database.pool_stats()["pools"]
+    executor = database.executor_stats()
+    mail = mail_queue.stats()
+    otp_size = await database.run(otp_service.store.size)
+    compaction = message_compactor.stats()
+
+    def per_pool(field):
+        return [({"address": address}, stats[field]) for address, stats in pool.items()]
+
+    gauges = [
+        ("mongodb_pool_open_connections", "Open connections per server pool", per_pool("open")),
+        ("mongodb_pool_checked_out_connections", "Connections currently checked out", per_pool("checked_out")),
+        ("mongodb_pool_waiting", "Operations waiting for a connection", per_pool("waiting")),
+        ("mongodb_pool_checkout_failed", "Connection checkouts that failed", per_pool("checkout_failed_total")),
+        ("mongodb_executor_in_flight", "Blocking calls running or queued on the Mongo executor", [({}, executor["in_flight"])]),
+        ("mongodb_executor_queued", "Blocking calls waiting for an executor thread", [({}, executor["queued"])]),
+        ("mail_queue_pending", "Emails queued or being retried", [({}, mail["pending"])]),
+        ("mail_queue_sent", "Emails sent since startup", [({}, mail["sent"])]),
+        ("mail_queue_dead", "Emails given up on since startup", [({}, mail["dead"])]),
+        ("otp_store_size", "Outstanding OTP records", [({"backend": type(otp_service.store).__name__}, otp_size)]),
+        ("realtime_connections", "Open realtime WebSocket connections", [({}, hub.stats()["connections"])]),
+        ("message_compaction_running", "1 while a message compaction sweep is in progress", [({}, int(compaction["running"]))]),
+        ("message_compaction_last_run_messages", "Messages removed by the last compaction sweep", [({}, compaction["last_run_compacted"])]),
+        ("message_compaction_failures", "Compaction sweeps or batches that failed since startup", [({}, compaction["failures"])]),
+    ]
+    return PlainTextResponse(
+        metrics_registry.render(gauges),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the SparkAI API"}
@@ -0,0 +1,415 @@
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from .config import OTP_CONFIG, RATE_LIMIT_CONFIG
+from .avatar_store import AvatarStore, InvalidAvatar, parse_data_url
+
+# Applied versions are recorded here, one document per migration
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+
+# Every migration must be idempotent: two workers starting at the same time
+# may both run it before either records it as applied.
+def _v1_core_indexes(db):
+    db.users.create_index([("email", ASCENDING)], unique=True, name="email_unique")
+    db.users.create_index(
+        [("spark_id", ASCENDING)],
+        unique=True,
+        name="spark_id_unique",
+        partialFilterExpression={"spark_id": {"$type": "string"}},
+    )
+
+    for collection in (db.todos, db.saves):
+        collection.create_index(
+            [("user_email", ASCENDING), ("created_at", DESCENDING)],
+            name="user_email_created_at",
+        )
+        collection.create_index([("id", ASCENDING)], unique=True, name="id_unique")
+
+    db.messages.create_index(
+        [("sender_id", ASCENDING), ("timestamp", DESCENDING)],
+        name="sender_id_timestamp",
+    )
+    db.messages.create_index(
+        [("receiver_id", ASCENDING), ("timestamp", DESCENDING)],
+        name="receiver_id_timestamp",
+    )
+    db.messages.create_index([("id", ASCENDING)], unique=True, name="id_unique")
+
+
+# Keyset pagination sorts on (sort key desc, id desc); the v2 indexes cover
+# that order and supersede the v1 list indexes, which are dropped.
+def _v2_keyset_indexes(db):
+    for collection in (db.todos, db.saves):
+        collection.create_index(
+            [("user_email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="user_email_created_at_id",
+        )
+        _drop_index_if_exists(collection, "user_email_created_at")
+
+    for field in ("sender_id", "receiver_id"):
+        db.messages.create_index(
+            [(field, ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+            name=f"{field}_timestamp_id",
+        )
+        _drop_index_if_exists(db.messages, f"{field}_timestamp")
+
+
+# Delta sync reads a participant's messages by change time. Older messages
+# get updated_at backfilled from their send timestamp.
+def _v3_message_sync(db):
+    db.messages.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": "$timestamp"}}],
+    )
+    for field in ("sender_id", "receiver_id"):
+        db.messages.create_index(
+            [(field, ASCENDING), ("updated_at", ASCENDING)],
+            name=f"{field}_updated_at",
+        )
+
+
+# Mongo-backed OTPs expire through a TTL index on their expiry time
+def _v4_otp_ttl(db):
+    db[OTP_CONFIG["COLLECTION"]].create_index(
+        [("expiry", ASCENDING)],
+        expireAfterSeconds=0,
+        name="expiry_ttl",
+    )
+
+
+# Shared rate-limit buckets disappear once they would have refilled
+def _v5_rate_limit_ttl(db):
+    db[RATE_LIMIT_CONFIG["COLLECTION"]].create_index(
+        [("expires_at", ASCENDING)],
+        expireAfterSeconds=0,
+        name="expires_at_ttl",
+    )
+
+
+# Inline data-URL profile images move to the content-addressed avatar store;
+# the user document keeps only the hash
+def _v6_avatar_store(db):
+    store = AvatarStore(db)
+    users = db.users.find(
+        {"profile_image": {"$regex": "^data:", "$options": "i"}},
+        {"_id": 1, "profile_image": 1},
+    )
+    for user in users:
+        try:
+            parsed = parse_data_url(user["profile_image"])
+        except InvalidAvatar:
+            # Too large, undecodable or not a raster image: left for the user to replace
+            continue
+        db.users.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"avatar_hash": store.save(*parsed)}, "$unset": {"profile_image": ""}},
+        )
+
+
+# Per-thread message reads and the conversations summary collection. Existing
+# threads are summarised from the messages they already have (unread 0).
+def _v7_conversations(db):
+    db.messages.update_many(
+        {"pair": {"$exists": False}},
+        [{"$set": {"pair": {"$cond": [
+            {"$lt": ["$sender_id", "$receiver_id"]},
+            {"$concat": ["$sender_id", "|", "$receiver_id"]},
+            {"$concat": ["$receiver_id", "|", "$sender_id"]},
+        ]}}}],
+    )
+    db.messages.create_index(
+        [("pair", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+        name="pair_timestamp_id",
+    )
+    db.conversations.create_index(
+        [("owner", ASCENDING), ("peer", ASCENDING)],
+        unique=True,
+        name="owner_peer_unique",
+    )
+    db.conversations.create_index(
+        [("owner", ASCENDING), ("last_timestamp", DESCENDING), ("id", DESCENDING)],
+        name="owner_last_timestamp_id",
+    )
+
+    views = [
+        {"owner": "$sender_id", "peer": "$receiver_id", "peer_name": "$receiver_name", "deleted": "$sender_deleted"},
+        {"owner": "$receiver_id", "peer": "$sender_id", "peer_name": "$sender_name", "deleted": "$receiver_deleted"},
+    ]
+    # The $sort and $group span every message; before MongoDB 6.0 they fail
+    # past 100 MB unless allowed to spill to disk
+    db.messages.aggregate([
+        {"$project": {
+            "views": views,
+            "preview": {
+                "id": "$id",
+                "sender_id": "$sender_id",
+                "content": "$content",
+                "bot_type": "$bot_type",
+                "timestamp": "$timestamp",
+            },
+        }},
+        {"$unwind": "$views"},
+        {"$match": {"views.deleted": {"$ne": True}}},
+        {"$sort": {"preview.timestamp": -1}},
+        {"$group": {
+            "_id": {"owner": "$views.owner", "peer": "$views.peer"},
+            "peer_name": {"$first": "$views.peer_name"},
+            "last_message": {"$first": "$preview"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "owner": "$_id.owner",
+            "peer": "$_id.peer",
+            "id": {"$concat": ["$_id.owner", ":", "$_id.peer"]},
+            "peer_name": 1,
+            "last_message": 1,
+            "last_timestamp": "$last_message.timestamp",
+            "unread": {"$literal": 0},
+        }},
+        {"$merge": {
+            "into": "conversations",
+            "on": ["owner", "peer"],
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }},
+    ], allowDiskUse=True)
+
+
+# Friend lists move from the embedded users.friends snapshots to their own
+# collection; the old arrays are left in place but no longer read or written
+def _v8_friendships(db):
+    db.friendships.create_index(
+        [("owner", ASCENDING), ("friend_spark_id", ASCENDING)],
+        unique=True,
+        name="owner_friend_unique",
+    )
+    db.friendships.create_index(
+        [("owner", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+        name="owner_created_at_id",
+    )
+    db.users.aggregate([
+        {"$match": {"spark_id": {"$type": "string"}, "friends.0": {"$exists": True}}},
+        {"$unwind": "$friends"},
+        {"$project": {
+            "_id": 0,
+            "id": {"$concat": ["$spark_id", ":", "$friends.spark_id"]},
+            "owner": "$spark_id",
+            "friend_spark_id": "$friends.spark_id",
+            "created_at": {"$ifNull": ["$updated_at", "$$NOW"]},
+        }},
+        {"$merge": {
+            "into": "friendships",
+            "on": ["owner", "friend_spark_id"],
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }},
+    ])
+
+
+# Reverse lookup for invalidating followers' friend list ETags when a
+# user's avatar changes
+def _v9_friendships_by_friend(db):
+    db.friendships.create_index("friend_spark_id", name="friend_spark_id")
+
+
+# Full-text search. Saves are searched per user, so their text index is
+# prefixed by user_email; messages are matched on content and then filtered
+# to the participant (a text index cannot be prefixed by an $or).
+def _v10_text_search(db):
+    db.saves.create_index(
+        [("user_email", ASCENDING), ("content", TEXT)],
+        name="user_email_content_text",
+    )
+    db.messages.create_index([("content", TEXT)], name="content_text")
+
+
+# Compaction sweeps messages deleted by both sides, oldest deletion first.
+# The partial index only holds those, so it stays as small as the backlog.
+def _v11_message_compaction(db):
+    db.messages.create_index(
+        [("updated_at", ASCENDING)],
+        name="fully_deleted_updated_at",
+        partialFilterExpression={"sender_deleted": True, "receiver_deleted": True},
+    )
+
+
+# Delta sync resumes from an (updated_at, id) position, so ties on updated_at
+# are broken by id inside the index instead of by an in-memory sort
+def _v12_message_sync_keyset(db):
+    for field in ("sender_id", "receiver_id"):
+        db.messages.create_index(
+            [(field, ASCENDING), ("updated_at", ASCENDING), ("id", ASCENDING)],
+            name=f"{field}_updated_at_id",
+        )
+        _drop_index_if_exists(db.messages, f"{field}_updated_at")
+
+
+# v6 skipped data URLs with media type parameters, line-wrapped base64 or
+# percent-encoded payloads; the parser now handles them, so sweep again
+def _v13_avatar_store_retry(db):
+    _v6_avatar_store(db)
+
+
+# Message search moves to per-participant entries (see search_entry in
+# app/repositories/messages.py) so the text index can be prefixed by owner;
+# the content-only index made every search scan all users' matches.
+def _v14_message_search_entries(db):
+    db.message_search.create_index(
+        [("owner", ASCENDING), ("id", ASCENDING)],
+        unique=True,
+        name="owner_id_unique",
+    )
+    db.message_search.create_index(
+        [("owner", ASCENDING), ("content", TEXT)],
+        name="owner_content_text",
+    )
+    db.messages.aggregate([
+        {"$project": {
+            "entries": [
+                {"owner": "$sender_id", "deleted": "$sender_deleted"},
+                {"owner": "$receiver_id", "deleted": "$receiver_deleted"},
+            ],
+            "id": 1,
+            "content": 1,
+            "timestamp": 1,
+        }},
+        {"$unwind": "$entries"},
+        {"$match": {"entries.deleted": {"$ne": True}}},
+        {"$project": {
+            "_id": 0,
+            "owner": "$entries.owner",
+            "id": 1,
+            "content": 1,
+            "timestamp": 1,
+        }},
+        {"$merge": {
+            "into": "message_search",
+            "on": ["owner", "id"],
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }},
+    ], allowDiskUse=True)
+    _drop_index_if_exists(db.messages, "content_text")
+
+
+def _drop_index_if_exists(collection, name):
+    if name in collection.index_information():
+        try:
+            collection.drop_index(name)
+        except OperationFailure:
+            # Dropped concurrently by another worker
+            pass
+
+
+MIGRATIONS = [
+    (1, "Core lookup and list indexes", _v1_core_indexes),
+    (2, "Keyset pagination indexes", _v2_keyset_indexes),
+    (3, "Message delta sync indexes", _v3_message_sync),
+    (4, "OTP expiry TTL index", _v4_otp_ttl),
+    (5, "Rate limit bucket TTL index", _v5_rate_limit_ttl),
+    (6, "Move inline avatars to the avatar store", _v6_avatar_store),
+    (7, "Conversation summaries", _v7_conversations),
+    (8, "Friendships collection", _v8_friendships),
+    (9, "Friendships reverse index", _v9_friendships_by_friend),
+    (10, "Text search indexes", _v10_text_search),
+    (11, "Message compaction index", _v11_message_compaction),
+    (12, "Message delta sync keyset indexes", _v12_message_sync_keyset),
+    (13, "Move inline avatars v6 could not parse", _v13_avatar_store_retry),
+    (14, "Per-participant message search entries", _v14_message_search_entries),
+]
+
+
+def applied_versions(db):
+    return {doc["_id"] for doc in db[MIGRATIONS_COLLECTION].find({}, {"_id": 1})}
+
+
+def run_migrations(db):
+    applied = applied_versions(db)
+    ran = []
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+
+        migrate(db)
+        try:
+            db[MIGRATIONS_COLLECTION].insert_one({
+                "_id": version,
+                "description": description,
+                "applied_at": datetime.utcnow(),
+            })
+        except DuplicateKeyError:
+            # Another worker recorded it first
+            pass
+        ran.append(version)
+
+    return ran
+
+
+def migration_status(db):
+    applied = {doc["_id"]: doc for doc in db[MIGRATIONS_COLLECTION].find()}
+    return [
+        {
+            "version": version,
+            "description": description,
+            "applied_at": applied[version]["applied_at"] if version in applied else None,
+        }
+        for version, description, _ in MIGRATIONS
+    ]
+
+
+# The hot list/lookup queries issued by main.py, checked with explain()
+def _explain_queries(db):
+    sample = db.users.find_one({"spark_id": {"$exists": True}}, {"email": 1, "spark_id": 1}) or {}
+    email = sample.get("email", "explain@example.com")
+    spark_id = sample.get("spark_id", "SPK000000")
+
+    return [
+        ("users by email", db.users, {"email": email}, None),
+        ("users by spark_id", db.users, {"spark_id": spark_id}, None),
+        ("todos list", db.todos, {"user_email": email}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+        ("saves list", db.saves, {"user_email": email}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+        ("messages inbox", db.messages, {
+            "$or": [
+                {"sender_id": spark_id, "sender_deleted": {"$ne": True}},
+                {"receiver_id": spark_id, "receiver_deleted": {"$ne": True}},
+            ]
+        }, [("timestamp", DESCENDING), ("id", DESCENDING)]),
+        ("conversations list", db.conversations, {"owner": spark_id},
+         [("last_timestamp", DESCENDING), ("id", DESCENDING)]),
+        ("conversation thread", db.messages, {"pair": f"{spark_id}|SPK999999"},
+         [("timestamp", DESCENDING), ("id", DESCENDING)]),
+        ("message search", db.message_search, {"owner": spark_id, "$text": {"$search": "hello"}}, None),
+    ]
+
+
+def _plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def explain_checks(db):
+    report = []
+    for name, collection, query, sort in _explain_queries(db):
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = _plan_stages(winning_plan)
+        report.append({
+            "query": name,
+            "collection": collection.name,
+            "stages": stages,
+            "collection_scan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages,
+        })
+    return report
@@ -1,21 +1,33 @@
-import smtplib
+import hmac
+import logging
 import random
 import string
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from .config import EMAIL_CONFIG, OTP_CONFIG
+from .otp_store import MemoryOTPStore, MongoOTPStore
+from .mail_queue import mail_queue
+
+logger = logging.getLogger(__name__)
 
 
 class OTPService:
     def __init__(self):
-        self.smtp_server = EMAIL_CONFIG["SMTP_SERVER"]
-        self.smtp_port = EMAIL_CONFIG["SMTP_PORT"]
         self.email_address = EMAIL_CONFIG["EMAIL_ADDRESS"]
-        self.email_password = EMAIL_CONFIG["EMAIL_PASSWORD"]
-        self.otp_storage = {}
+        self.store = MemoryOTPStore()
         self.test_mode = False
 
+    def configure(self, db):
+        if OTP_CONFIG["STORE"] == "mongo":
+            self.store = MongoOTPStore(db)
+        self.store.start()
+        mail_queue.start(db)
+
+    def shutdown(self):
+        mail_queue.stop()
+        self.store.stop()
+
     def generate_otp(self, length=None):
         if length is None:
             length = OTP_CONFIG["LENGTH"]
@@ -23,11 +35,12 @@ class OTPService:
 
     def send_otp_email(self, email, otp):
         if self.test_mode:
-            print(f"\n{'=' * 50}")
-            print(f"🔐 OTP FOR {email}")
-            print(f"📧 Your verification code is: {otp}")
-            print(f"⏰ Expires in {OTP_CONFIG['EXPIRY_MINUTES']} minutes")
-            print(f"{'=' * 50}\n")
+            # Warning level so the code shows up under a default log config;
+            # test mode must never be on in production anyway
+            logger.warning(
+                "Test mode OTP for %s: %s (expires in %s minutes)",
+                email, otp, OTP_CONFIG["EXPIRY_MINUTES"],
+            )
             return True
 
         try:
@@ -51,53 +64,42 @@ class OTPService:
 
             msg.attach(MIMEText(body, "html"))
 
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_address, self.email_password)
-            server.sendmail(self.email_address, email, msg.as_string())
-            server.quit()
+            # Delivery happens on the mail queue's pooled SMTP connections
+            return mail_queue.enqueue(email, msg.as_string())
 
-            return True
-
-        except Exception as e:
-            print(f"Error sending email: {e}")
+        except Exception:
+            logger.exception("Error queueing email to %s", email)
             return False
 
     def create_otp(self, email):
         otp = self.generate_otp()
-        expiry_time = datetime.now() + timedelta(minutes=OTP_CONFIG["EXPIRY_MINUTES"])
+        expiry_time = datetime.utcnow() + timedelta(minutes=OTP_CONFIG["EXPIRY_MINUTES"])
 
-        self.otp_storage[email] = {
-            "otp": otp,
-            "expiry": expiry_time,
-            "attempts": 0,
-        }
+        self.store.put(email, otp, expiry_time)
 
         if self.send_otp_email(email, otp):
             return {"success": True, "message": "OTP sent successfully"}
         return {"success": False, "message": "Failed to send OTP"}
 
     def verify_otp(self, email, otp):
-        if email not in self.otp_storage:
+        stored_data = self.store.get(email)
+        if stored_data is None:
             return {"success": False, "message": "No OTP found for this email"}
 
-        stored_data = self.otp_storage[email]
-
-        if datetime.now() > stored_data["expiry"]:
-            del self.otp_storage[email]
+        if datetime.utcnow() > stored_data["expiry"]:
+            self.store.delete(email)
             return {"success": False, "message": "OTP has expired"}
 
-        if stored_data["attempts"] >= OTP_CONFIG["MAX_ATTEMPTS"]:
-            del self.otp_storage[email]
+        stored_data = self.store.register_attempt(email, OTP_CONFIG["MAX_ATTEMPTS"])
+        if stored_data is None:
+            self.store.delete(email)
             return {
                 "success": False,
                 "message": "Too many attempts. Please request a new OTP",
             }
 
-        stored_data["attempts"] += 1
-
-        if stored_data["otp"] == otp:
-            del self.otp_storage[email]
+        if hmac.compare_digest(stored_data["otp"].encode(), otp.encode()):
+            self.store.delete(email)
             return {"success": True, "message": "OTP verified successfully"}
 
         return {"success": False, "message": "Invalid OTP"}
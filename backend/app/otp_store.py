@@ -0,0 +1,123 @@
+import heapq
+import threading
+from datetime import datetime
+from pymongo import ReturnDocument
+from .config import OTP_CONFIG
+
+
+# Pending OTPs keyed by email. Records are dicts with otp, expiry (UTC) and
+# attempts; register_attempt must be atomic so parallel guesses are counted.
+class OTPStore:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def put(self, email, otp, expiry):
+        raise NotImplementedError
+
+    def get(self, email):
+        raise NotImplementedError
+
+    def register_attempt(self, email, max_attempts):
+        raise NotImplementedError
+
+    def delete(self, email):
+        raise NotImplementedError
+
+    def size(self):
+        raise NotImplementedError
+
+
+# Process-local store. An expiry heap lets a background sweeper drop abandoned
+# OTPs without scanning the whole dict.
+class MemoryOTPStore(OTPStore):
+    def __init__(self):
+        self._records = {}
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sweeper = None
+
+    def start(self):
+        if self._sweeper is None:
+            self._stopped.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="otp-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sweeper = None
+
+    def put(self, email, otp, expiry):
+        with self._lock:
+            self._records[email] = {"otp": otp, "expiry": expiry, "attempts": 0}
+            heapq.heappush(self._expiry_heap, (expiry, email))
+
+    def get(self, email):
+        with self._lock:
+            record = self._records.get(email)
+            return dict(record) if record else None
+
+    def register_attempt(self, email, max_attempts):
+        with self._lock:
+            record = self._records.get(email)
+            if record is None or record["attempts"] >= max_attempts:
+                return None
+            record["attempts"] += 1
+            return dict(record)
+
+    def delete(self, email):
+        with self._lock:
+            self._records.pop(email, None)
+
+    def size(self):
+        return len(self._records)
+
+    def sweep(self, now=None):
+        now = now or datetime.utcnow()
+        removed = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expiry, email = heapq.heappop(self._expiry_heap)
+                record = self._records.get(email)
+                # Heap entries of re-issued OTPs are stale; skip them
+                if record is not None and record["expiry"] == expiry:
+                    del self._records[email]
+                    removed += 1
+        return removed
+
+    def _sweep_loop(self):
+        while not self._stopped.wait(OTP_CONFIG["SWEEP_SECONDS"]):
+            self.sweep()
+
+
+# Shared store. Expired documents are removed by the TTL index on expiry
+# (see migrations); attempts are counted with an atomic $inc.
+class MongoOTPStore(OTPStore):
+    def __init__(self, db):
+        self.collection = db[OTP_CONFIG["COLLECTION"]]
+
+    def put(self, email, otp, expiry):
+        self.collection.replace_one(
+            {"_id": email},
+            {"otp": otp, "expiry": expiry, "attempts": 0},
+            upsert=True,
+        )
+
+    def get(self, email):
+        return self.collection.find_one({"_id": email})
+
+    def register_attempt(self, email, max_attempts):
+        return self.collection.find_one_and_update(
+            {"_id": email, "attempts": {"$lt": max_attempts}},
+            {"$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def delete(self, email):
+        self.collection.delete_one({"_id": email})
+
+    def size(self):
+        return self.collection.estimated_document_count()
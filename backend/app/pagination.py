@@ -0,0 +1,130 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+from .config import PAGINATION_CONFIG, SEARCH_CONFIG
+
+
+def _encode(payload):
+    raw = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(token, detail):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail,
+        )
+
+
+# Opaque keyset cursor: the sort key and id of the last item on the page
+def encode_cursor(doc, field):
+    return _encode({"t": doc[field].isoformat(), "id": doc["id"]})
+
+
+def decode_cursor(cursor):
+    payload = _decode(cursor, "Invalid cursor")
+    try:
+        return datetime.fromisoformat(payload["t"]), str(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+# Opaque delta-sync token: the (change time, id) position to resume from,
+# and the origin: when the client was last fully up to date, which paging
+# through a truncated batch does not move. Tokens from before ids were
+# included resume at the timestamp itself, so changes sharing it are sent
+# again rather than skipped; tokens without an origin use their position.
+def encode_sync_token(position, origin):
+    since, last_id = position
+    return _encode({"s": since.isoformat(), "id": last_id, "o": origin.isoformat()})
+
+
+def decode_sync_token(token):
+    payload = _decode(token, "Invalid sync token")
+    try:
+        since = datetime.fromisoformat(payload["s"])
+        origin = datetime.fromisoformat(payload["o"]) if "o" in payload else since
+        return (since, str(payload.get("id", ""))), origin
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token",
+        )
+
+
+def is_paginated(limit, cursor):
+    if limit is not None or cursor is not None:
+        return True
+    return not PAGINATION_CONFIG["LEGACY_UNPAGINATED"]
+
+
+def page_limit(limit):
+    if limit is None:
+        return PAGINATION_CONFIG["DEFAULT_LIMIT"]
+    return max(1, min(limit, PAGINATION_CONFIG["MAX_LIMIT"]))
+
+
+# Items strictly after the cursor in (field desc, id desc) order
+def keyset_filter(field, cursor):
+    value, last_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {field: {"$lt": value}},
+            {field: value, "id": {"$lt": last_id}},
+        ]
+    }
+
+
+def keyset_sort(field):
+    return [(field, -1), ("id", -1)]
+
+
+# Items strictly after `position` (a (value, id) pair) in (field asc, id asc)
+# order, the reverse walk used by delta sync
+def keyset_after(field, position):
+    value, last_id = position
+    return {
+        "$or": [
+            {field: {"$gt": value}},
+            {field: value, "id": {"$gt": last_id}},
+        ]
+    }
+
+
+# Callers fetch limit + 1 documents; the extra one only signals another page
+def split_page(docs, limit, field):
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1], field)
+    return docs, None
+
+
+# Ranked search results have no sort key to resume from, so their cursor is
+# the offset of the next page, capped at SEARCH_CONFIG["MAX_RESULTS"]
+def decode_offset_cursor(cursor):
+    payload = _decode(cursor, "Invalid cursor")
+    try:
+        offset = int(payload["o"])
+    except (ValueError, KeyError, TypeError):
+        offset = -1
+    if offset < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return offset
+
+
+def split_offset_page(docs, limit, offset):
+    end = offset + limit
+    if len(docs) > limit and end < SEARCH_CONFIG["MAX_RESULTS"]:
+        return docs[:limit], _encode({"o": end})
+    return docs[:limit], None
@@ -0,0 +1,69 @@
+import asyncio
+import hmac
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from passlib.context import CryptContext
+from .config import PASSWORD_CONFIG
+
+# One context per process and cost factor (process pool workers build their own)
+_contexts = {}
+
+
+def _context(rounds):
+    if rounds not in _contexts:
+        _contexts[rounds] = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+    return _contexts[rounds]
+
+
+def hash_password(password, rounds):
+    return _context(rounds).hash(password)
+
+
+# Returns (verified, replacement_hash). A replacement is produced for legacy
+# plaintext passwords and for hashes made with a different cost factor.
+def verify_password(password, stored, rounds):
+    if not stored:
+        return False, None
+
+    context = _context(rounds)
+    if context.identify(stored, required=False) is None:
+        if hmac.compare_digest(password.encode(), stored.encode()):
+            return True, context.hash(password)
+        return False, None
+
+    return context.verify_and_update(password, stored)
+
+
+# Runs bcrypt on a pool sized to the cores so logins never hold the event loop
+class PasswordHasher:
+    def __init__(self):
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            if PASSWORD_CONFIG["POOL"] == "process":
+                self.executor = ProcessPoolExecutor(max_workers=PASSWORD_CONFIG["WORKERS"])
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=PASSWORD_CONFIG["WORKERS"],
+                    thread_name_prefix="bcrypt",
+                )
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def _run(self, fn, *args):
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args))
+
+    async def hash(self, password):
+        return await self._run(hash_password, password, PASSWORD_CONFIG["BCRYPT_ROUNDS"])
+
+    async def verify(self, password, stored):
+        return await self._run(verify_password, password, stored, PASSWORD_CONFIG["BCRYPT_ROUNDS"])
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,131 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from .config import RATE_LIMIT_CONFIG
+from .database import database
+
+
+# Token buckets held in this worker. Least recently used keys are dropped once
+# MAX_KEYS is reached; an evicted bucket simply starts full again.
+class MemoryBuckets:
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period):
+        rate = capacity / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > RATE_LIMIT_CONFIG["MAX_KEYS"]:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def size(self):
+        return len(self._buckets)
+
+
+# Token buckets shared by every worker. Refill and take happen in a single
+# pipeline update using the server clock, so concurrent workers can't race.
+# Idle buckets are removed by the TTL index on expires_at (see migrations).
+class MongoBuckets:
+    def __init__(self, db):
+        self.collection = db[RATE_LIMIT_CONFIG["COLLECTION"]]
+
+    def take(self, key, capacity, period):
+        rate_per_ms = capacity / (period * 1000)
+        refilled = {
+            "$min": [
+                capacity,
+                {"$add": [
+                    {"$ifNull": ["$tokens", capacity]},
+                    {"$multiply": [
+                        {"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]},
+                        rate_per_ms,
+                    ]},
+                ]},
+            ]
+        }
+        bucket = self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": {"$add": ["$$NOW", int(period * 1000)]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket["allowed"]:
+            return True, 0
+        return False, (1 - bucket["tokens"]) / rate_per_ms / 1000
+
+    def size(self):
+        return self.collection.estimated_document_count()
+
+
+# Token-bucket admission control for the auth and OTP routes, keyed by client
+# IP and by email. Checked before any database or SMTP work is done.
+class RateLimiter:
+    def __init__(self):
+        self.buckets = MemoryBuckets()
+        self.rejected = 0
+
+    def configure(self, db):
+        if RATE_LIMIT_CONFIG["BACKEND"] == "mongo":
+            self.buckets = MongoBuckets(db)
+
+    def client_ip(self, request):
+        if RATE_LIMIT_CONFIG["TRUST_FORWARDED_FOR"]:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, scope, request, email=None):
+        if not RATE_LIMIT_CONFIG["ENABLED"]:
+            return
+
+        limits = RATE_LIMIT_CONFIG["SCOPES"][scope]
+        keys = [("ip", self.client_ip(request))]
+        if email:
+            keys.append(("email", email.strip().lower()))
+
+        for kind, value in keys:
+            limit = limits[kind]
+            allowed, retry_after = await self._take(
+                f"{scope}:{kind}:{value}", limit["CAPACITY"], limit["PERIOD_SECONDS"]
+            )
+            if not allowed:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests. Please try again later.",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+
+    async def _take(self, key, capacity, period):
+        if isinstance(self.buckets, MemoryBuckets):
+            return self.buckets.take(key, capacity, period)
+        return await database.run(self.buckets.take, key, capacity, period)
+
+    def stats(self):
+        return {
+            "backend": type(self.buckets).__name__,
+            "rejected": self.rejected,
+        }
+
+
+rate_limiter = RateLimiter()
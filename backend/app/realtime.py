@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from uuid import uuid4
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+from .config import REALTIME_CONFIG
+from .database import database
+
+logger = logging.getLogger(__name__)
+
+
+# Brokers carry events between workers. Every broker hands events for this
+# worker to deliver(spark_id, event); the hub does the per-connection fan-out.
+class Broker:
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def publish(self, spark_ids, event):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+# Single worker: publishing is just local delivery
+class LocalBroker(Broker):
+    async def publish(self, spark_ids, event):
+        for spark_id in spark_ids:
+            self.deliver(spark_id, event)
+
+
+# Multiple workers: events are appended to a capped collection that every
+# worker tails. Local recipients are served directly, without the round trip.
+class MongoBroker(Broker):
+    def __init__(self, db):
+        self.db = db
+        self.origin = uuid4().hex
+        self._stopped = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    async def start(self, deliver):
+        await super().start(deliver)
+        self._loop = asyncio.get_running_loop()
+        name = REALTIME_CONFIG["EVENTS_COLLECTION"]
+        try:
+            self.db.create_collection(name, capped=True, size=REALTIME_CONFIG["EVENTS_COLLECTION_BYTES"])
+        except CollectionInvalid:
+            pass
+        self.collection = self.db[name]
+        self._thread = threading.Thread(target=self._tail, name="realtime-tail", daemon=True)
+        self._thread.start()
+
+    async def publish(self, spark_ids, event):
+        for spark_id in spark_ids:
+            self.deliver(spark_id, event)
+        await database.run(self.collection.insert_one, {
+            "origin": self.origin,
+            "recipients": list(spark_ids),
+            "event": event,
+        })
+
+    def _tail(self):
+        last = self.collection.find_one(sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+
+        while not self._stopped.is_set():
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            try:
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive and not self._stopped.is_set():
+                    for doc in cursor:
+                        last_id = doc["_id"]
+                        if doc["origin"] == self.origin:
+                            continue
+                        for spark_id in doc["recipients"]:
+                            self._loop.call_soon_threadsafe(self.deliver, spark_id, doc["event"])
+            except PyMongoError as e:
+                logger.warning("Realtime tail error: %s", e)
+            # Cursor died (empty collection, failover); back off and re-open
+            self._stopped.wait(1)
+
+    async def stop(self):
+        self._stopped.set()
+
+
+# Per-worker registry of open push connections, keyed by spark_id
+class RealtimeHub:
+    def __init__(self):
+        self.broker = LocalBroker()
+        self._connections = defaultdict(set)
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self, db):
+        if REALTIME_CONFIG["BROKER"] == "mongo":
+            self.broker = MongoBroker(db)
+        else:
+            self.broker = LocalBroker()
+        await self.broker.start(self.deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    def subscribe(self, spark_id):
+        queue = asyncio.Queue(maxsize=REALTIME_CONFIG["QUEUE_SIZE"])
+        self._connections[spark_id].add(queue)
+        return queue
+
+    def unsubscribe(self, spark_id, queue):
+        queues = self._connections.get(spark_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._connections[spark_id]
+
+    def deliver(self, spark_id, event):
+        for queue in self._connections.get(spark_id, ()):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block the hub
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+            self.delivered += 1
+
+    async def publish(self, spark_ids, event):
+        event = {**event, "sent_at": time.time()}
+        await self.broker.publish(set(spark_ids), event)
+
+    def stats(self):
+        return {
+            "broker": type(self.broker).__name__,
+            "users": len(self._connections),
+            "connections": sum(len(queues) for queues in self._connections.values()),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+hub = RealtimeHub()
@@ -0,0 +1,69 @@
+from ..avatar_store import avatar_store
+from ..config import REPOSITORY_CONFIG
+from ..database import database
+from .friends import FriendRepository, MemoryFriendRepository, MongoFriendRepository
+from .messages import MemoryMessageRepository, MessageRepository, MongoMessageRepository
+from .saves import MemorySaveRepository, MongoSaveRepository, SaveRepository
+from .todos import MemoryTodoRepository, MongoTodoRepository, TodoRepository
+from .users import MemoryUserRepository, MongoUserRepository, UserRepository
+from .versions import MemoryVersionRepository, MongoVersionRepository, VersionRepository
+
+
+# All data access for the routes, one repository per aggregate. "mongo" is
+# the shared MongoDB; "memory" keeps everything in this process, for tests
+# and benchmarks that should not need a database.
+class Repositories:
+    def __init__(self):
+        self.backend = None
+        self._db = None
+        self.users = None
+        self.todos = None
+        self.saves = None
+        self.friends = None
+        self.messages = None
+        self.versions = None
+
+    def configure(self, backend=None):
+        backend = backend or REPOSITORY_CONFIG["BACKEND"]
+        if backend == "memory":
+            self.users = MemoryUserRepository()
+            self.todos = MemoryTodoRepository()
+            self.saves = MemorySaveRepository()
+            self.friends = MemoryFriendRepository()
+            self.messages = MemoryMessageRepository()
+            self.versions = MemoryVersionRepository()
+            avatar_store.use_memory()
+        elif backend == "mongo":
+            db = self._db = database.get_async_db()
+            self.users = MongoUserRepository(db)
+            self.todos = MongoTodoRepository(db)
+            self.saves = MongoSaveRepository(db)
+            self.friends = MongoFriendRepository(db)
+            self.messages = MongoMessageRepository(db)
+            self.versions = MongoVersionRepository(db)
+        else:
+            raise ValueError(f"Unknown repository backend: {backend}")
+        self.backend = backend
+        return self
+
+    # Mongo repositories are rebuilt if the client was closed and reopened
+    def ensure(self):
+        if self.backend is None:
+            self.configure()
+        elif self.backend == "mongo" and self._db is not database.get_async_db():
+            self.configure("mongo")
+        return self
+
+
+repositories = Repositories()
+
+__all__ = [
+    "FriendRepository",
+    "MessageRepository",
+    "Repositories",
+    "SaveRepository",
+    "TodoRepository",
+    "UserRepository",
+    "VersionRepository",
+    "repositories",
+]
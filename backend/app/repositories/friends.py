@@ -0,0 +1,65 @@
+from collections import defaultdict
+from ..pagination import decode_cursor, keyset_filter, keyset_sort
+from .indexes import SortedIndex, duplicate_key
+
+FRIENDSHIP_PROJECTION = {"_id": 0, "id": 1, "friend_spark_id": 1, "created_at": 1}
+
+
+def public_friendship(friendship):
+    return {field: friendship[field] for field in ("id", "friend_spark_id", "created_at")}
+
+
+# One-directional friend links keyed by (owner, friend_spark_id); the
+# friend's profile is resolved from the users repository on read
+class FriendRepository:
+    # Raises DuplicateKeyError if the owner already has this friend
+    async def add(self, friendship):
+        raise NotImplementedError
+
+    async def list(self, owner, limit=0, cursor=None):
+        raise NotImplementedError
+
+    # spark_ids of everyone who has this user as a friend
+    async def owners_of(self, friend_spark_id):
+        raise NotImplementedError
+
+
+class MongoFriendRepository(FriendRepository):
+    def __init__(self, db):
+        self.collection = db.friendships
+
+    async def add(self, friendship):
+        await self.collection.insert_one(friendship)
+
+    async def list(self, owner, limit=0, cursor=None):
+        query = {"owner": owner}
+        if cursor:
+            query.update(keyset_filter("created_at", cursor))
+        return await self.collection.find(query, FRIENDSHIP_PROJECTION, sort=keyset_sort("created_at"), limit=limit)
+
+    async def owners_of(self, friend_spark_id):
+        links = await self.collection.find({"friend_spark_id": friend_spark_id}, {"_id": 0, "owner": 1})
+        return [link["owner"] for link in links]
+
+
+class MemoryFriendRepository(FriendRepository):
+    def __init__(self):
+        self._friendships = {}
+        self._by_owner = SortedIndex()
+        self._owners = defaultdict(set)
+
+    async def add(self, friendship):
+        owner, friend = friendship["owner"], friendship["friend_spark_id"]
+        if friend in self._owners and owner in self._owners[friend]:
+            raise duplicate_key("owner", "friend_spark_id")
+        self._friendships[friendship["id"]] = dict(friendship)
+        self._by_owner.add(owner, friendship["created_at"], friendship["id"])
+        self._owners[friend].add(owner)
+
+    async def list(self, owner, limit=0, cursor=None):
+        before = decode_cursor(cursor) if cursor else None
+        ids = self._by_owner.descending(owner, before, limit)
+        return [public_friendship(self._friendships[link_id]) for link_id in ids]
+
+    async def owners_of(self, friend_spark_id):
+        return list(self._owners.get(friend_spark_id, ()))
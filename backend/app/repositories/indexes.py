@@ -0,0 +1,134 @@
+import bisect
+import math
+import re
+from collections import Counter, defaultdict
+from pymongo.errors import DuplicateKeyError
+
+# Building blocks for the in-memory repositories. They are only touched from
+# the event loop and never await mid-update, so no locking is needed.
+
+
+# Per-key lists of (sort value, id) kept in ascending order; lists read in
+# (value desc, id desc) order match the Mongo keyset indexes.
+class SortedIndex:
+    def __init__(self):
+        self._entries = defaultdict(list)
+
+    def add(self, key, value, item_id):
+        bisect.insort(self._entries[key], (value, item_id))
+
+    def remove(self, key, value, item_id):
+        entries = self._entries.get(key)
+        if not entries:
+            return
+        i = bisect.bisect_left(entries, (value, item_id))
+        if i < len(entries) and entries[i] == (value, item_id):
+            del entries[i]
+        if not entries:
+            del self._entries[key]
+
+    # Ids strictly before `before` (a (value, id) pair), newest first
+    def iter_descending(self, key, before=None):
+        entries = self._entries.get(key, [])
+        end = bisect.bisect_left(entries, before) if before is not None else len(entries)
+        for i in range(end - 1, -1, -1):
+            yield entries[i][1]
+
+    # Ids strictly after `after` (a (value, id) pair), oldest first
+    def iter_ascending(self, key, after=None):
+        entries = self._entries.get(key, [])
+        start = bisect.bisect_right(entries, after) if after is not None else 0
+        for i in range(start, len(entries)):
+            yield entries[i][1]
+
+    def descending(self, key, before=None, limit=0):
+        return take(self.iter_descending(key, before), limit)
+
+
+# Lowercased words; unlike Mongo text indexes there is no stemming or stop
+# word list
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+# Per-owner inverted index for text search: token -> {doc id: occurrences}.
+# Updated on every insert and delete, so queries never scan documents.
+class InvertedIndex:
+    def __init__(self):
+        self._postings = defaultdict(lambda: defaultdict(dict))
+        self._lengths = defaultdict(dict)
+
+    def add(self, owner, doc_id, text):
+        counts = Counter(tokenize(text))
+        if not counts:
+            return
+        self._lengths[owner][doc_id] = sum(counts.values())
+        for token, count in counts.items():
+            self._postings[owner][token][doc_id] = count
+
+    def remove(self, owner, doc_id, text):
+        if self._lengths.get(owner, {}).pop(doc_id, None) is None:
+            return
+        postings = self._postings[owner]
+        for token in set(tokenize(text)):
+            docs = postings.get(token)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del postings[token]
+        if not self._lengths[owner]:
+            del self._lengths[owner]
+            del self._postings[owner]
+
+    # {doc id: score} for documents matching any query term, tf-idf weighted
+    def search(self, owner, query):
+        lengths = self._lengths.get(owner)
+        if not lengths:
+            return {}
+        postings = self._postings[owner]
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            docs = postings.get(token)
+            if not docs:
+                continue
+            idf = math.log(1 + len(lengths) / len(docs))
+            for doc_id, count in docs.items():
+                scores[doc_id] += idf * count / lengths[doc_id]
+        return scores
+
+
+def take(ids, limit=0):
+    result = []
+    for item_id in ids:
+        result.append(item_id)
+        if limit and len(result) >= limit:
+            break
+    return result
+
+
+# Mongo-style projection of a stored document: {field: 1, ...} includes,
+# {field: 0, ...} excludes, _id is kept unless excluded
+def project(doc, projection=None):
+    if doc is None:
+        return None
+    if not projection:
+        return dict(doc)
+    include = [field for field, flag in projection.items() if flag and field != "_id"]
+    if include:
+        result = {field: doc[field] for field in include if field in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {field: value for field, value in doc.items() if projection.get(field, 1)}
+
+
+# Raised like the server would, so callers handle both backends the same way
+def duplicate_key(*fields):
+    return DuplicateKeyError(
+        f"E11000 duplicate key error dup key: {', '.join(fields)}",
+        11000,
+        {"keyPattern": {field: 1 for field in fields}},
+    )
@@ -0,0 +1,340 @@
+from pymongo import DeleteOne, ReplaceOne
+from ..conversations import (
+    conversation_id,
+    mark_read,
+    message_preview,
+    pair_key,
+    record_message,
+    refresh_view,
+    visible_to,
+)
+from ..pagination import decode_cursor, keyset_after, keyset_filter, keyset_sort
+from .indexes import InvertedIndex, SortedIndex, take
+
+MESSAGE_FIELDS = (
+    "id",
+    "sender_id",
+    "sender_name",
+    "receiver_id",
+    "receiver_name",
+    "content",
+    "bot_type",
+    "timestamp",
+)
+MESSAGE_PROJECTION = {"_id": 0, **{field: 1 for field in MESSAGE_FIELDS}}
+
+# Hidden from both participants: only kept as a delta sync tombstone
+FULLY_DELETED = {"sender_deleted": True, "receiver_deleted": True}
+
+
+def public_message(msg):
+    return {field: msg[field] for field in MESSAGE_FIELDS}
+
+
+# Search entries are per participant, like conversation views: the text index
+# is prefixed by owner, so a search only reads the searcher's own entries
+def search_entry(owner, msg):
+    return {"owner": owner, "id": msg["id"], "content": msg["content"], "timestamp": msg["timestamp"]}
+
+
+# Direct messages plus each participant's conversation summaries (see
+# app/conversations.py), kept in step on every send and delete. Lists are
+# newest first and only include messages the owner has not deleted.
+class MessageRepository:
+    async def insert(self, msg):
+        raise NotImplementedError
+
+    async def find(self, message_id):
+        raise NotImplementedError
+
+    # side is "sender" or "receiver": that participant's copy is hidden
+    async def mark_deleted(self, msg, side, deleted_at):
+        raise NotImplementedError
+
+    async def list_visible(self, owner, limit=0, cursor=None):
+        raise NotImplementedError
+
+    async def list_thread(self, owner, peer, limit=0, cursor=None):
+        raise NotImplementedError
+
+    # Full documents (deletion flags included) in (updated_at, id) order:
+    # everything after the `since` (updated_at, id) position, or everything
+    # visible if since is None
+    async def changes(self, owner, since, limit):
+        raise NotImplementedError
+
+    async def conversations(self, owner, limit=0, cursor=None):
+        raise NotImplementedError
+
+    async def mark_read(self, owner, peer):
+        raise NotImplementedError
+
+    # Messages visible to the owner, best match first (newest first among
+    # equals), `offset` results skipped
+    async def search(self, owner, query, limit, offset=0):
+        raise NotImplementedError
+
+    # Removes up to `limit` messages both sides deleted before `before`,
+    # oldest deletion first, copying them to the `archive` collection first
+    # if one is given. Returns how many were removed.
+    async def compact(self, before, limit, archive=None):
+        raise NotImplementedError
+
+
+class MongoMessageRepository(MessageRepository):
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.messages
+        self.search_entries = db.message_search
+
+    async def insert(self, msg):
+        await self.collection.insert_one(msg)
+        await record_message(self.db, msg)
+        await self.search_entries.bulk_write([
+            ReplaceOne({"owner": owner, "id": msg["id"]}, search_entry(owner, msg), upsert=True)
+            for owner in sorted({msg["sender_id"], msg["receiver_id"]})
+        ], ordered=False)
+
+    async def find(self, message_id):
+        return await self.collection.find_one({"id": message_id})
+
+    async def mark_deleted(self, msg, side, deleted_at):
+        field = f"{side}_deleted"
+        await self.collection.update_one(
+            {"id": msg["id"]},
+            {"$set": {field: True, f"{field}_at": deleted_at, "updated_at": deleted_at}},
+        )
+        owner = msg[f"{side}_id"]
+        peer = msg["receiver_id"] if side == "sender" else msg["sender_id"]
+        await self.search_entries.delete_one({"owner": owner, "id": msg["id"]})
+        await refresh_view(self.db, owner, peer)
+
+    async def _page(self, query, limit, cursor):
+        if cursor:
+            query = {"$and": [query, keyset_filter("timestamp", cursor)]}
+        return await self.collection.find(query, MESSAGE_PROJECTION, sort=keyset_sort("timestamp"), limit=limit)
+
+    async def list_visible(self, owner, limit=0, cursor=None):
+        return await self._page(visible_to(owner), limit, cursor)
+
+    # Read through the (pair, timestamp) index
+    async def list_thread(self, owner, peer, limit=0, cursor=None):
+        return await self._page({"pair": pair_key(owner, peer), **visible_to(owner)}, limit, cursor)
+
+    async def changes(self, owner, since, limit):
+        if since is None:
+            query = visible_to(owner)
+        else:
+            # One branch per (participant, keyset) pair, each an index range
+            # on (participant, updated_at, id)
+            query = {
+                "$or": [
+                    {field: owner, **branch}
+                    for field in ("sender_id", "receiver_id")
+                    for branch in keyset_after("updated_at", since)["$or"]
+                ]
+            }
+        return await self.collection.find(query, sort=[("updated_at", 1), ("id", 1)], limit=limit)
+
+    async def conversations(self, owner, limit=0, cursor=None):
+        query = {"owner": owner}
+        if cursor:
+            query.update(keyset_filter("last_timestamp", cursor))
+        return await self.db.conversations.find(query, sort=keyset_sort("last_timestamp"), limit=limit)
+
+    async def mark_read(self, owner, peer):
+        return await mark_read(self.db, owner, peer)
+
+    # Ranked on the owner's search entries, then the page of messages is read
+    # by id; visible_to is re-checked in case a delete lands in between
+    async def search(self, owner, query, limit, offset=0):
+        score = {"$meta": "textScore"}
+        entries = await self.search_entries.find(
+            {"owner": owner, "$text": {"$search": query}},
+            {"_id": 0, "id": 1, "score": score},
+            sort=[("score", score), ("timestamp", -1)],
+            limit=limit,
+            skip=offset,
+        )
+        if not entries:
+            return []
+        ids = [entry["id"] for entry in entries]
+        messages = await self.collection.find({"id": {"$in": ids}, **visible_to(owner)}, MESSAGE_PROJECTION)
+        by_id = {msg["id"]: msg for msg in messages}
+        return [by_id[message_id] for message_id in ids if message_id in by_id]
+
+    # Read through the partial fully_deleted_updated_at index. Archive writes
+    # are upserts and deletes re-check the flags, so a batch interrupted
+    # halfway, or swept by two workers at once, is simply redone.
+    async def compact(self, before, limit, archive=None):
+        docs = await self.collection.find(
+            {**FULLY_DELETED, "updated_at": {"$lt": before}},
+            None if archive else {"_id": 1},
+            sort=[("updated_at", 1)],
+            limit=limit,
+        )
+        if not docs:
+            return 0
+        if archive:
+            await self.db[archive].bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs],
+                ordered=False,
+            )
+        result = await self.collection.bulk_write(
+            [DeleteOne({"_id": doc["_id"], **FULLY_DELETED}) for doc in docs],
+            ordered=False,
+        )
+        return result.deleted_count
+
+
+class MemoryMessageRepository(MessageRepository):
+    def __init__(self):
+        self._messages = {}
+        self._by_participant = SortedIndex()  # spark_id -> (timestamp, id)
+        self._by_pair = SortedIndex()         # pair -> (timestamp, id)
+        self._by_change = SortedIndex()       # spark_id -> (updated_at, id)
+        self._views = {}
+        self._views_by_owner = SortedIndex()  # owner -> (last_timestamp, view id)
+        self._text = InvertedIndex()          # spark_id -> content tokens
+        self._fully_deleted = SortedIndex()   # None -> (updated_at, id)
+        self._archives = {}
+
+    @staticmethod
+    def _participants(msg):
+        return {msg["sender_id"], msg["receiver_id"]}
+
+    @staticmethod
+    def _visible(msg, owner):
+        return (
+            (msg["sender_id"] == owner and not msg.get("sender_deleted"))
+            or (msg["receiver_id"] == owner and not msg.get("receiver_deleted"))
+        )
+
+    def _set_view_last(self, view, msg):
+        if view.get("last_timestamp") is not None:
+            self._views_by_owner.remove(view["owner"], view["last_timestamp"], view["id"])
+        view["last_message"] = message_preview(msg)
+        view["last_timestamp"] = msg["timestamp"]
+        self._views_by_owner.add(view["owner"], view["last_timestamp"], view["id"])
+
+    def _record(self, owner, peer, peer_name, msg, unread_increment):
+        view_id = conversation_id(owner, peer)
+        view = self._views.get(view_id)
+        if view is None:
+            view = self._views[view_id] = {"id": view_id, "owner": owner, "peer": peer, "unread": 0}
+        view["peer_name"] = peer_name
+        if view.get("last_timestamp") is None or msg["timestamp"] > view["last_timestamp"]:
+            self._set_view_last(view, msg)
+        view["unread"] += unread_increment
+
+    async def insert(self, msg):
+        doc = dict(msg)
+        self._messages[doc["id"]] = doc
+        for participant in self._participants(doc):
+            self._by_participant.add(participant, doc["timestamp"], doc["id"])
+            self._by_change.add(participant, doc["updated_at"], doc["id"])
+            self._text.add(participant, doc["id"], doc["content"])
+        self._by_pair.add(doc["pair"], doc["timestamp"], doc["id"])
+
+        self._record(doc["sender_id"], doc["receiver_id"], doc["receiver_name"], doc, 0)
+        self._record(doc["receiver_id"], doc["sender_id"], doc["sender_name"], doc, 1)
+
+    async def find(self, message_id):
+        msg = self._messages.get(message_id)
+        return dict(msg) if msg else None
+
+    @staticmethod
+    def _hidden_from_both(msg):
+        return msg.get("sender_deleted") and msg.get("receiver_deleted")
+
+    async def mark_deleted(self, msg, side, deleted_at):
+        doc = self._messages.get(msg["id"])
+        if doc is None:
+            return
+        for participant in self._participants(doc):
+            self._by_change.remove(participant, doc["updated_at"], doc["id"])
+            self._by_change.add(participant, deleted_at, doc["id"])
+        if self._hidden_from_both(doc):
+            self._fully_deleted.remove(None, doc["updated_at"], doc["id"])
+        doc[f"{side}_deleted"] = True
+        doc[f"{side}_deleted_at"] = deleted_at
+        doc["updated_at"] = deleted_at
+        if self._hidden_from_both(doc):
+            self._fully_deleted.add(None, deleted_at, doc["id"])
+
+        owner = doc[f"{side}_id"]
+        peer = doc["receiver_id"] if side == "sender" else doc["sender_id"]
+        self._refresh_view(owner, peer)
+
+    def _refresh_view(self, owner, peer):
+        view = self._views.get(conversation_id(owner, peer))
+        if view is None:
+            return
+        latest = self._page(self._by_pair, pair_key(owner, peer), owner, 1, None)
+        if not latest:
+            self._views_by_owner.remove(owner, view["last_timestamp"], view["id"])
+            del self._views[view["id"]]
+            return
+        self._set_view_last(view, self._messages[latest[0]["id"]])
+
+    def _page(self, index, key, owner, limit, cursor):
+        before = decode_cursor(cursor) if cursor else None
+        visible = (
+            self._messages[msg_id]
+            for msg_id in index.iter_descending(key, before)
+            if self._visible(self._messages[msg_id], owner)
+        )
+        return [public_message(msg) for msg in take(visible, limit)]
+
+    async def list_visible(self, owner, limit=0, cursor=None):
+        return self._page(self._by_participant, owner, owner, limit, cursor)
+
+    async def list_thread(self, owner, peer, limit=0, cursor=None):
+        return self._page(self._by_pair, pair_key(owner, peer), owner, limit, cursor)
+
+    async def changes(self, owner, since, limit):
+        changed = (self._messages[msg_id] for msg_id in self._by_change.iter_ascending(owner, since))
+        if since is None:
+            changed = (msg for msg in changed if self._visible(msg, owner))
+        return [dict(msg) for msg in take(changed, limit)]
+
+    async def conversations(self, owner, limit=0, cursor=None):
+        before = decode_cursor(cursor) if cursor else None
+        views = []
+        for view_id in self._views_by_owner.descending(owner, before, limit):
+            view = dict(self._views[view_id])
+            view["last_message"] = dict(view["last_message"])
+            views.append(view)
+        return views
+
+    async def mark_read(self, owner, peer):
+        view = self._views.get(conversation_id(owner, peer))
+        if view is None:
+            return False
+        view["unread"] = 0
+        return True
+
+    async def search(self, owner, query, limit, offset=0):
+        scores = self._text.search(owner, query)
+        visible = [msg_id for msg_id in scores if self._visible(self._messages[msg_id], owner)]
+        visible.sort(key=lambda m: (scores[m], self._messages[m]["timestamp"]), reverse=True)
+        return [public_message(self._messages[msg_id]) for msg_id in visible[offset:offset + limit]]
+
+    async def compact(self, before, limit, archive=None):
+        expired = []
+        for msg_id in self._fully_deleted.iter_ascending(None):
+            if len(expired) >= limit or self._messages[msg_id]["updated_at"] >= before:
+                break
+            expired.append(msg_id)
+
+        for msg_id in expired:
+            doc = self._messages.pop(msg_id)
+            if archive:
+                self._archives.setdefault(archive, {})[msg_id] = doc
+            self._fully_deleted.remove(None, doc["updated_at"], msg_id)
+            for participant in self._participants(doc):
+                self._by_participant.remove(participant, doc["timestamp"], msg_id)
+                self._by_change.remove(participant, doc["updated_at"], msg_id)
+                self._text.remove(participant, msg_id, doc["content"])
+            self._by_pair.remove(doc["pair"], doc["timestamp"], msg_id)
+        return len(expired)
@@ -0,0 +1,102 @@
+from ..pagination import decode_cursor, keyset_filter, keyset_sort
+from .indexes import InvertedIndex, SortedIndex, duplicate_key
+
+# bot_type defaults to "chat" for saves created before it existed
+SAVE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "content": 1,
+    "bot_type": {"$ifNull": ["$bot_type", "chat"]},
+    "created_at": 1,
+}
+
+
+def public_save(save):
+    return {
+        "id": save["id"],
+        "content": save["content"],
+        "bot_type": save.get("bot_type") or "chat",
+        "created_at": save["created_at"],
+    }
+
+
+# A user's saved answers, newest first; same paging contract as todos
+class SaveRepository:
+    async def list(self, user_email, limit=0, cursor=None):
+        raise NotImplementedError
+
+    async def insert(self, save):
+        raise NotImplementedError
+
+    async def delete(self, user_email, save_id):
+        raise NotImplementedError
+
+    # Best match first (newest first among equals), `offset` results skipped
+    async def search(self, user_email, query, limit, offset=0):
+        raise NotImplementedError
+
+
+class MongoSaveRepository(SaveRepository):
+    def __init__(self, db):
+        self.collection = db.saves
+
+    async def list(self, user_email, limit=0, cursor=None):
+        query = {"user_email": user_email}
+        if cursor:
+            query.update(keyset_filter("created_at", cursor))
+        return await self.collection.find(query, SAVE_PROJECTION, sort=keyset_sort("created_at"), limit=limit)
+
+    async def insert(self, save):
+        await self.collection.insert_one(save)
+
+    async def delete(self, user_email, save_id):
+        result = await self.collection.delete_one({"id": save_id, "user_email": user_email})
+        return result.deleted_count > 0
+
+    # Served by the (user_email, content text) index; the equality on
+    # user_email keeps the search inside one user's saves
+    async def search(self, user_email, query, limit, offset=0):
+        score = {"$meta": "textScore"}
+        saves = await self.collection.find(
+            {"user_email": user_email, "$text": {"$search": query}},
+            {**SAVE_PROJECTION, "score": score},
+            sort=[("score", score), ("created_at", -1)],
+            limit=limit,
+            skip=offset,
+        )
+        for save in saves:
+            save.pop("score", None)
+        return saves
+
+
+class MemorySaveRepository(SaveRepository):
+    def __init__(self):
+        self._saves = {}
+        self._by_user = SortedIndex()
+        self._text = InvertedIndex()
+
+    async def list(self, user_email, limit=0, cursor=None):
+        before = decode_cursor(cursor) if cursor else None
+        ids = self._by_user.descending(user_email, before, limit)
+        return [public_save(self._saves[save_id]) for save_id in ids]
+
+    async def insert(self, save):
+        if save["id"] in self._saves:
+            raise duplicate_key("id")
+        self._saves[save["id"]] = dict(save)
+        self._by_user.add(save["user_email"], save["created_at"], save["id"])
+        self._text.add(save["user_email"], save["id"], save["content"])
+
+    async def delete(self, user_email, save_id):
+        save = self._saves.get(save_id)
+        if save is None or save["user_email"] != user_email:
+            return False
+        del self._saves[save_id]
+        self._by_user.remove(user_email, save["created_at"], save_id)
+        self._text.remove(user_email, save_id, save["content"])
+        return True
+
+    async def search(self, user_email, query, limit, offset=0):
+        scores = self._text.search(user_email, query)
+        ranked = sorted(scores, key=lambda s: (scores[s], self._saves[s]["created_at"]), reverse=True)
+        return [public_save(self._saves[save_id]) for save_id in ranked[offset:offset + limit]]
@@ -0,0 +1,91 @@
+from pymongo import ReturnDocument
+from ..pagination import decode_cursor, keyset_filter, keyset_sort
+from .indexes import SortedIndex, duplicate_key
+
+TODO_FIELDS = ("id", "text", "completed", "created_at")
+TODO_PROJECTION = {"_id": 0, **{field: 1 for field in TODO_FIELDS}}
+
+
+def public_todo(todo):
+    return {field: todo[field] for field in TODO_FIELDS}
+
+
+# A user's todos, newest first. `limit` 0 means all; `cursor` is a keyset
+# cursor from app/pagination.py. Documents carry only TODO_FIELDS.
+class TodoRepository:
+    async def list(self, user_email, limit=0, cursor=None):
+        raise NotImplementedError
+
+    async def insert(self, todo):
+        raise NotImplementedError
+
+    # Returns the updated todo, or None if the user has no such todo
+    async def set_completed(self, user_email, todo_id, completed):
+        raise NotImplementedError
+
+    async def delete(self, user_email, todo_id):
+        raise NotImplementedError
+
+
+class MongoTodoRepository(TodoRepository):
+    def __init__(self, db):
+        self.collection = db.todos
+
+    async def list(self, user_email, limit=0, cursor=None):
+        query = {"user_email": user_email}
+        if cursor:
+            query.update(keyset_filter("created_at", cursor))
+        return await self.collection.find(query, TODO_PROJECTION, sort=keyset_sort("created_at"), limit=limit)
+
+    async def insert(self, todo):
+        await self.collection.insert_one(todo)
+
+    async def set_completed(self, user_email, todo_id, completed):
+        return await self.collection.find_one_and_update(
+            {"id": todo_id, "user_email": user_email},
+            {"$set": {"completed": completed}},
+            projection=TODO_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def delete(self, user_email, todo_id):
+        result = await self.collection.delete_one({"id": todo_id, "user_email": user_email})
+        return result.deleted_count > 0
+
+
+class MemoryTodoRepository(TodoRepository):
+    def __init__(self):
+        self._todos = {}
+        self._by_user = SortedIndex()
+
+    def _owned(self, user_email, todo_id):
+        todo = self._todos.get(todo_id)
+        if todo is None or todo["user_email"] != user_email:
+            return None
+        return todo
+
+    async def list(self, user_email, limit=0, cursor=None):
+        before = decode_cursor(cursor) if cursor else None
+        ids = self._by_user.descending(user_email, before, limit)
+        return [public_todo(self._todos[todo_id]) for todo_id in ids]
+
+    async def insert(self, todo):
+        if todo["id"] in self._todos:
+            raise duplicate_key("id")
+        self._todos[todo["id"]] = dict(todo)
+        self._by_user.add(todo["user_email"], todo["created_at"], todo["id"])
+
+    async def set_completed(self, user_email, todo_id, completed):
+        todo = self._owned(user_email, todo_id)
+        if todo is None:
+            return None
+        todo["completed"] = completed
+        return public_todo(todo)
+
+    async def delete(self, user_email, todo_id):
+        todo = self._owned(user_email, todo_id)
+        if todo is None:
+            return False
+        del self._todos[todo_id]
+        self._by_user.remove(user_email, todo["created_at"], todo_id)
+        return True
@@ -0,0 +1,133 @@
+import itertools
+from bson import ObjectId
+from pymongo import ReturnDocument
+from ..database import database
+from ..spark_ids import format_spark_id, spark_id_allocator
+from .indexes import duplicate_key, project
+
+
+# Users are addressed by email (the token subject) and by spark_id.
+# Projections are Mongo-style dicts on both backends.
+class UserRepository:
+    async def find_by_email(self, email, projection=None):
+        raise NotImplementedError
+
+    async def find_by_spark_id(self, spark_id, projection=None):
+        raise NotImplementedError
+
+    async def find_by_spark_ids(self, spark_ids, projection=None):
+        raise NotImplementedError
+
+    # Raises DuplicateKeyError for a taken email or spark_id
+    async def insert(self, user):
+        raise NotImplementedError
+
+    # Returns whether the user exists; raises DuplicateKeyError for a taken spark_id
+    async def update(self, email, fields, unset=()):
+        raise NotImplementedError
+
+    # Returns the new value, or None if the user does not exist
+    async def increment(self, email, field, by, fields=None):
+        raise NotImplementedError
+
+    async def allocate_spark_id(self):
+        raise NotImplementedError
+
+
+class MongoUserRepository(UserRepository):
+    def __init__(self, db):
+        self.collection = db.users
+
+    async def find_by_email(self, email, projection=None):
+        return await self.collection.find_one({"email": email}, projection)
+
+    async def find_by_spark_id(self, spark_id, projection=None):
+        return await self.collection.find_one({"spark_id": spark_id}, projection)
+
+    async def find_by_spark_ids(self, spark_ids, projection=None):
+        return await self.collection.find({"spark_id": {"$in": list(spark_ids)}}, projection)
+
+    async def insert(self, user):
+        await self.collection.insert_one(user)
+
+    async def update(self, email, fields, unset=()):
+        update = {"$set": fields}
+        if unset:
+            update["$unset"] = {field: "" for field in unset}
+        result = await self.collection.update_one({"email": email}, update)
+        return result.matched_count > 0
+
+    async def increment(self, email, field, by, fields=None):
+        update = {"$inc": {field: by}}
+        if fields:
+            update["$set"] = fields
+        result = await self.collection.find_one_and_update(
+            {"email": email},
+            update,
+            projection={"_id": 0, field: 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return result[field] if result else None
+
+    async def allocate_spark_id(self):
+        return await database.run(spark_id_allocator.allocate, database.connect())
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self):
+        self._by_email = {}
+        self._by_spark_id = {}
+        self._sequence = itertools.count()
+
+    async def find_by_email(self, email, projection=None):
+        return project(self._by_email.get(email), projection)
+
+    async def find_by_spark_id(self, spark_id, projection=None):
+        return project(self._by_spark_id.get(spark_id), projection)
+
+    async def find_by_spark_ids(self, spark_ids, projection=None):
+        return [project(self._by_spark_id[s], projection) for s in set(spark_ids) if s in self._by_spark_id]
+
+    async def insert(self, user):
+        if user["email"] in self._by_email:
+            raise duplicate_key("email")
+        spark_id = user.get("spark_id")
+        if isinstance(spark_id, str) and spark_id in self._by_spark_id:
+            raise duplicate_key("spark_id")
+
+        user.setdefault("_id", ObjectId())
+        doc = dict(user)
+        self._by_email[doc["email"]] = doc
+        if isinstance(spark_id, str):
+            self._by_spark_id[spark_id] = doc
+
+    async def update(self, email, fields, unset=()):
+        user = self._by_email.get(email)
+        if user is None:
+            return False
+
+        spark_id = fields.get("spark_id", user.get("spark_id"))
+        if spark_id != user.get("spark_id"):
+            if spark_id in self._by_spark_id:
+                raise duplicate_key("spark_id")
+            self._by_spark_id.pop(user.get("spark_id"), None)
+            self._by_spark_id[spark_id] = user
+
+        user.update(fields)
+        for field in unset:
+            user.pop(field, None)
+        return True
+
+    async def increment(self, email, field, by, fields=None):
+        user = self._by_email.get(email)
+        if user is None:
+            return None
+        user[field] = user.get(field, 0) + by
+        user.update(fields or {})
+        return user[field]
+
+    async def allocate_spark_id(self):
+        while True:
+            spark_id = format_spark_id(next(self._sequence))
+            if spark_id not in self._by_spark_id:
+                return spark_id
@@ -0,0 +1,53 @@
+from collections import Counter, defaultdict
+from pymongo import UpdateOne
+from ..config import ETAG_CONFIG
+
+
+# Per-user resource version counters behind the ETags in app/versioning.py:
+# one document per spark_id with a field per resource
+class VersionRepository:
+    async def get(self, owner, resource):
+        raise NotImplementedError
+
+    async def bump(self, owner, resources):
+        raise NotImplementedError
+
+    async def bump_many(self, owners, resource):
+        raise NotImplementedError
+
+
+class MongoVersionRepository(VersionRepository):
+    def __init__(self, db):
+        self.collection = db[ETAG_CONFIG["COLLECTION"]]
+
+    async def get(self, owner, resource):
+        doc = await self.collection.find_one({"_id": owner}, {resource: 1})
+        return doc.get(resource, 0) if doc else 0
+
+    async def bump(self, owner, resources):
+        await self.collection.update_one(
+            {"_id": owner},
+            {"$inc": {resource: 1 for resource in resources}},
+            upsert=True,
+        )
+
+    async def bump_many(self, owners, resource):
+        await self.collection.bulk_write([
+            UpdateOne({"_id": owner}, {"$inc": {resource: 1}}, upsert=True)
+            for owner in owners
+        ], ordered=False)
+
+
+class MemoryVersionRepository(VersionRepository):
+    def __init__(self):
+        self._versions = defaultdict(Counter)
+
+    async def get(self, owner, resource):
+        return self._versions.get(owner, {}).get(resource, 0)
+
+    async def bump(self, owner, resources):
+        self._versions[owner].update(resources)
+
+    async def bump_many(self, owners, resource):
+        for owner in owners:
+            self._versions[owner][resource] += 1
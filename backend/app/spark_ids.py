@@ -0,0 +1,58 @@
+import threading
+from pymongo import ReturnDocument
+from .config import SPARK_ID_CONFIG
+
+# Spark IDs are "SPK" + 6 digits
+ID_SPACE = 1_000_000
+# (n * MULTIPLIER + OFFSET) mod ID_SPACE is a bijection because MULTIPLIER is
+# coprime with 10^6, so sequential numbers map to distinct, scattered IDs
+MULTIPLIER = 387_413
+OFFSET = 524_287
+COUNTER_ID = "spark_id"
+
+
+def permute(n):
+    return (n * MULTIPLIER + OFFSET) % ID_SPACE
+
+
+def format_spark_id(n):
+    return f"SPK{permute(n):06d}"
+
+
+# Hands out sequence numbers from blocks reserved with one $inc on a counter
+# document, so workers never probe the users collection or collide with
+# each other. Numbers left in a block when a worker exits are skipped.
+class SparkIdAllocator:
+    def __init__(self):
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, db):
+        block = SPARK_ID_CONFIG["BLOCK_SIZE"]
+        counter = db.counters.find_one_and_update(
+            {"_id": COUNTER_ID},
+            {"$inc": {"value": block}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._end = counter["value"]
+        self._next = self._end - block
+
+    def allocate(self, db):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve(db)
+            n = self._next
+            self._next += 1
+
+        if n >= ID_SPACE:
+            raise RuntimeError("Spark ID space exhausted")
+        return format_spark_id(n)
+
+
+def is_spark_id_conflict(error):
+    return "spark_id" in (error.details or {}).get("keyPattern", {})
+
+
+spark_id_allocator = SparkIdAllocator()
@@ -0,0 +1,60 @@
+import hashlib
+from .config import ETAG_CONFIG
+
+# Per-user version counters (see app/repositories/versions.py), one per
+# resource: "me", "todos", "saves", "friends". Every route that changes what
+# a GET would return bumps the counter after its write, so a conditional GET
+# only has to read this one small document to know whether anything changed.
+
+
+class NotModified(Exception):
+    def __init__(self, etag):
+        self.etag = etag
+
+
+def etag_headers(etag):
+    # private: bodies are per user; no-cache: always revalidate with the ETag
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ResourceVersions:
+    # The query string is part of the tag: each page of a list is its own
+    # representation. EPOCH lets a deploy invalidate every outstanding tag.
+    async def etag(self, repos, owner, resource, query=""):
+        version = await repos.versions.get(owner, resource)
+        key = f"{ETAG_CONFIG['EPOCH']}|{owner}|{resource}|{version}|{query}"
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return f'W/"{resource}-{version}-{digest}"'
+
+    async def bump(self, repos, owner, *resources):
+        if not owner or not resources:
+            return
+        await repos.versions.bump(owner, resources)
+
+    # Friend list entries embed the friend's avatar, so a profile image
+    # change invalidates the friend list of everyone who added this user
+    async def bump_followers(self, repos, spark_id):
+        if not spark_id:
+            return
+        owners = await repos.friends.owners_of(spark_id)
+        if owners:
+            await repos.versions.bump_many(owners, "friends")
+
+
+resource_versions = ResourceVersions()
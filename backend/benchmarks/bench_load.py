@@ -0,0 +1,345 @@
+"""Mixed-workload load test of the API, per-endpoint latency and throughput.
+
+Seeds a dedicated set of bench users (friends, messages, todos and saves),
+then runs many concurrent clients through the ASGI app, each picking
+operations from a weighted mix until the duration is up. The app runs with
+its real lifespan, so migrations, caches, the realtime hub and the password
+pool all behave as in production. Needs httpx, and a reachable MONGODB_URL
+unless --backend memory is used (no database; measures the app alone).
+
+Every run writes a JSON file (benchmarks/results/ by default) tagged with the
+current commit; compare two files with --compare to spot regressions.
+
+    cd backend
+    python -m benchmarks.bench_load --users 200 --clients 100 --duration 30 --mix mixed
+    python -m benchmarks.bench_load --backend memory --duration 10
+    python -m benchmarks.bench_load --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import httpx
+
+from app.config import PASSWORD_CONFIG, RATE_LIMIT_CONFIG, REPOSITORY_CONFIG
+from app.conversations import pair_key
+from app.database import database
+from app.main import app, create_access_token
+from app.passwords import hash_password
+from app.repositories import repositories
+from benchmarks.common import RESULTS_DIR, print_table, summarize, write_json
+
+EMAIL_PREFIX = "bench-load-"
+PASSWORD = "bench-load-password"
+
+# Relative weights of each operation per mix
+MIXES = {
+    "mixed": {
+        "login": 1,
+        "me": 3,
+        "inbox": 4,
+        "thread": 2,
+        "send_message": 2,
+        "todos": 3,
+        "todo_crud": 1,
+        "saves": 1,
+        "friends": 1,
+        "chat_count": 2,
+    },
+    "reads": {"me": 3, "inbox": 4, "thread": 3, "todos": 3, "saves": 2, "friends": 2},
+    "writes": {"send_message": 4, "todo_crud": 3, "chat_count": 3},
+    "login": {"login": 1},
+}
+
+
+def email_for(i):
+    return f"{EMAIL_PREFIX}{i}@example.com"
+
+
+def spark_id_for(i):
+    # Outside the SPK + 6 digits space the allocator hands out
+    return f"SPKB{i:05d}"
+
+
+def clear(db):
+    users = list(db.users.find({"email": {"$regex": f"^{EMAIL_PREFIX}"}}, {"spark_id": 1}))
+    spark_ids = [u["spark_id"] for u in users if u.get("spark_id")]
+    db.todos.delete_many({"user_email": {"$regex": f"^{EMAIL_PREFIX}"}})
+    db.saves.delete_many({"user_email": {"$regex": f"^{EMAIL_PREFIX}"}})
+    db.friendships.delete_many({"owner": {"$in": spark_ids}})
+    db.messages.delete_many({"sender_id": {"$in": spark_ids}})
+    db.conversations.delete_many({"owner": {"$in": spark_ids}})
+    db.message_search.delete_many({"owner": {"$in": spark_ids}})
+    db.resource_versions.delete_many({"_id": {"$in": spark_ids}})
+    db.users.delete_many({"email": {"$regex": f"^{EMAIL_PREFIX}"}})
+
+
+def build_documents(args, rng):
+    hashed = hash_password(PASSWORD, PASSWORD_CONFIG["BCRYPT_ROUNDS"])
+    now = datetime.utcnow()
+    docs = {"users": [], "friends": [], "todos": [], "saves": [], "messages": []}
+
+    for i in range(args.users):
+        docs["users"].append({
+            "username": f"bench{i}",
+            "email": email_for(i),
+            "password": hashed,
+            "spark_id": spark_id_for(i),
+            "is_verified": True,
+            "disabled": False,
+            "chat_count": 0,
+            "created_at": now,
+        })
+
+        peers = [(i + offset) % args.users for offset in range(1, min(args.friends, args.users - 1) + 1)]
+        for offset, peer in enumerate(peers, 1):
+            docs["friends"].append({
+                "id": f"{spark_id_for(i)}:{spark_id_for(peer)}",
+                "owner": spark_id_for(i),
+                "friend_spark_id": spark_id_for(peer),
+                "created_at": now - timedelta(seconds=offset),
+            })
+
+        for n in range(args.todos):
+            docs["todos"].append({
+                "id": str(uuid4()),
+                "user_email": email_for(i),
+                "text": f"todo {n}",
+                "completed": n % 2 == 0,
+                "created_at": now - timedelta(seconds=n),
+            })
+        for n in range(args.saves):
+            docs["saves"].append({
+                "id": str(uuid4()),
+                "user_email": email_for(i),
+                "content": f"saved answer {n} " * 8,
+                "bot_type": "chat",
+                "created_at": now - timedelta(seconds=n),
+            })
+
+        for n in range(args.messages if peers else 0):
+            peer = rng.choice(peers)
+            timestamp = now - timedelta(seconds=rng.randint(0, 7 * 24 * 3600))
+            docs["messages"].append({
+                "id": str(uuid4()),
+                "sender_id": spark_id_for(i),
+                "sender_name": f"bench{i}",
+                "receiver_id": spark_id_for(peer),
+                "receiver_name": f"bench{peer}",
+                "content": f"message {n} from bench{i}",
+                "bot_type": "chat",
+                "timestamp": timestamp,
+                "updated_at": timestamp,
+                "pair": pair_key(spark_id_for(i), spark_id_for(peer)),
+            })
+    return docs
+
+
+# Seeding goes through the repositories, so both backends get the same data
+# and messages get their conversation summaries the way the send route does
+async def seed(args, rng):
+    if repositories.backend == "mongo":
+        await database.run(clear, database.connect())
+    docs = build_documents(args, rng)
+    for name, insert in (
+        ("users", repositories.users.insert),
+        ("friends", repositories.friends.add),
+        ("todos", repositories.todos.insert),
+        ("saves", repositories.saves.insert),
+        ("messages", repositories.messages.insert),
+    ):
+        batch = docs[name]
+        for start in range(0, len(batch), 200):
+            await asyncio.gather(*(insert(doc) for doc in batch[start:start + 200]))
+
+
+class Client:
+    def __init__(self, http, index, args, rng, record):
+        self.http = http
+        self.index = index
+        self.args = args
+        self.rng = rng
+        self.record = record
+        self.token = create_access_token({"sub": email_for(index)}, timedelta(hours=1))
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def peer(self):
+        offset = self.rng.randint(1, max(1, min(self.args.friends, self.args.users - 1)))
+        return spark_id_for((self.index + offset) % self.args.users)
+
+    async def call(self, name, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=self.headers(), **kwargs)
+        except httpx.HTTPError:
+            self.record(name, time.perf_counter() - start, ok=False)
+            return None
+        self.record(name, time.perf_counter() - start, ok=response.status_code < 400)
+        return response
+
+    async def login(self):
+        start = time.perf_counter()
+        response = await self.http.post(
+            "/api/auth/login", json={"email": email_for(self.index), "password": PASSWORD}
+        )
+        ok = response.status_code == 200
+        self.record("POST /api/auth/login", time.perf_counter() - start, ok=ok)
+        if ok:
+            self.token = response.json()["access_token"]
+
+    async def me(self):
+        await self.call("GET /api/users/me", "GET", "/api/users/me")
+
+    async def inbox(self):
+        await self.call("GET /api/conversations", "GET", "/api/conversations", params={"limit": 20})
+
+    async def thread(self):
+        await self.call(
+            "GET /api/conversations/{spark_id}/messages", "GET",
+            f"/api/conversations/{self.peer()}/messages", params={"limit": 50},
+        )
+
+    async def send_message(self):
+        await self.call(
+            "POST /api/messages", "POST", "/api/messages",
+            json={"receiver_spark_id": self.peer(), "content": "load test message", "bot_type": "chat"},
+        )
+
+    async def todos(self):
+        await self.call("GET /api/todos", "GET", "/api/todos", params={"limit": 50})
+
+    async def todo_crud(self):
+        response = await self.call("POST /api/todos", "POST", "/api/todos", json={"text": "load test"})
+        if response is None or response.status_code >= 400:
+            return
+        todo_id = response.json()["id"]
+        await self.call("PUT /api/todos/{todo_id}", "PUT", f"/api/todos/{todo_id}", json={"completed": True})
+        await self.call("DELETE /api/todos/{todo_id}", "DELETE", f"/api/todos/{todo_id}")
+
+    async def saves(self):
+        await self.call("GET /api/saves", "GET", "/api/saves", params={"limit": 50})
+
+    async def friends(self):
+        await self.call("GET /api/friends", "GET", "/api/friends", params={"limit": 50})
+
+    async def chat_count(self):
+        await self.call(
+            "POST /api/users/me/chat-count/increment", "POST", "/api/users/me/chat-count/increment"
+        )
+
+
+async def drive(args, rng):
+    mix = MIXES[args.mix]
+    operations, weights = zip(*mix.items())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    def record(name, elapsed, ok):
+        latencies[name].append(elapsed)
+        if not ok:
+            errors[name] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        deadline = time.perf_counter() + args.duration
+
+        async def worker(n):
+            # Each worker has its own generator so runs with the same --seed
+            # issue the same operation sequence per client
+            client = Client(http, n % args.users, args, random.Random(rng.random()), record)
+            while time.perf_counter() < deadline:
+                operation = client.rng.choices(operations, weights)[0]
+                await getattr(client, operation)()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(args.clients)))
+        elapsed = time.perf_counter() - start
+
+    results = {name: {**summarize(samples, elapsed), "errors": errors[name]}
+               for name, samples in sorted(latencies.items())}
+    total = [s for samples in latencies.values() for s in samples]
+    return results, {**summarize(total, elapsed), "errors": sum(errors.values())}
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    # Every client hammers login from one address; the limiter would turn
+    # most of the mix into 429s
+    RATE_LIMIT_CONFIG["ENABLED"] = args.rate_limit
+    REPOSITORY_CONFIG["BACKEND"] = args.backend
+
+    async with app.router.lifespan_context(app):
+        if not args.no_seed or args.backend == "memory":
+            start = time.perf_counter()
+            await seed(args, rng)
+            print(f"Seeded {args.users} users in {time.perf_counter() - start:.1f}s")
+        return await drive(args, rng)
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"\n{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'name':<40}{'p95 ms':>18}{'p99 ms':>18}{'rps':>18}")
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if old is None:
+            continue
+        cells = [f"{old[key]} -> {new[key]}" for key in ("p95_ms", "p99_ms", "throughput_rps")]
+        print(f"{name:<40}" + "".join(f"{cell:>18}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--friends", type=int, default=10, help="friends per user")
+    parser.add_argument("--messages", type=int, default=50, help="messages sent per user")
+    parser.add_argument("--todos", type=int, default=20, help="todos per user")
+    parser.add_argument("--saves", type=int, default=20, help="saves per user")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backend", choices=("mongo", "memory"), default=REPOSITORY_CONFIG["BACKEND"],
+                        help="repository backend; memory needs no database")
+    parser.add_argument("--no-seed", action="store_true", help="reuse data from the previous run")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the auth rate limiter on")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "bench_load.json"))
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results, total = asyncio.run(run(args))
+    print_table(f"{args.mix} mix, {args.clients} clients, {args.duration:g}s", results.items())
+    print_table("all endpoints", [("total", total)])
+    write_json(args.output, {
+        "commit": current_commit(),
+        "params": {k: v for k, v in vars(args).items() if k != "compare"},
+        "results": results,
+        "total": total,
+    })
+
+
+if __name__ == "__main__":
+    main()
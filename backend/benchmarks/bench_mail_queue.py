@@ -0,0 +1,101 @@
+"""Throughput of OTP email delivery against a local stand-in SMTP server.
+
+Compares the old path (a fresh SMTP connection per message, sent inline)
+with the background mail queue reusing pooled connections. Needs aiosmtpd;
+no MongoDB is required because the default in-memory OTP store is used.
+
+    cd backend
+    python -m benchmarks.bench_mail_queue --emails 1000 --workers 4
+"""
+import argparse
+import os
+import smtplib
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.config import EMAIL_CONFIG, MAIL_QUEUE_CONFIG
+from app.mail_queue import mail_queue
+from app.otp_service import otp_service
+from benchmarks.common import RESULTS_DIR, print_table, summarize, write_json
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def run_direct(count):
+    # The pre-queue behaviour: connect, send one message, quit
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        sent_at = time.perf_counter()
+        server = smtplib.SMTP(EMAIL_CONFIG["SMTP_SERVER"], EMAIL_CONFIG["SMTP_PORT"])
+        server.sendmail(EMAIL_CONFIG["EMAIL_ADDRESS"], f"direct{i}@example.com", "Subject: OTP\r\n\r\n123456")
+        server.quit()
+        latencies.append(time.perf_counter() - sent_at)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_queued(count):
+    # Latency here is what a request handler waits for: store + enqueue
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        sent_at = time.perf_counter()
+        result = otp_service.create_otp(f"queued{i}@example.com")
+        latencies.append(time.perf_counter() - sent_at)
+        if not result["success"]:
+            raise RuntimeError(result["message"])
+    enqueued = time.perf_counter() - start
+    mail_queue.wait_idle()
+    delivered = time.perf_counter() - start
+
+    summary = summarize(latencies, delivered)
+    summary["enqueue_seconds"] = round(enqueued, 3)
+    summary["delivery_seconds"] = round(delivered, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=MAIL_QUEUE_CONFIG["WORKERS"])
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "bench_mail_queue.json"))
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+
+    EMAIL_CONFIG.update({
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": args.port,
+        "USE_TLS": False,
+        "EMAIL_PASSWORD": "",
+    })
+    MAIL_QUEUE_CONFIG["WORKERS"] = args.workers
+
+    try:
+        results = {"direct (connection per email)": run_direct(args.emails)}
+        mail_queue.start()
+        queued = run_queued(args.emails)
+        queued["connections_opened"] = mail_queue.stats()["connections_opened"]
+        results[f"queued ({args.workers} pooled workers)"] = queued
+    finally:
+        mail_queue.stop()
+        controller.stop()
+
+    print_table(f"{args.emails} OTP emails", results.items())
+    print(f"\nMessages received by stand-in server: {handler.received}")
+    write_json(args.output, {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Login throughput per core at different bcrypt cost factors.
+
+For each cost factor, measures verifications/second on a single core and
+through the password hasher pool with all workers busy, driven from an
+event loop the way the login route uses it. Needs passlib and bcrypt only.
+
+    cd backend
+    python -m benchmarks.bench_password_hashing --rounds 10 11 12 13 --logins 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.config import PASSWORD_CONFIG
+from app.passwords import PasswordHasher, hash_password, verify_password
+from benchmarks.common import RESULTS_DIR, write_json
+
+
+def single_core(rounds, logins):
+    stored = hash_password("correct horse", rounds)
+    start = time.perf_counter()
+    for _ in range(logins):
+        verify_password("correct horse", stored, rounds)
+    return logins / (time.perf_counter() - start)
+
+
+async def pooled(rounds, logins):
+    PASSWORD_CONFIG["BCRYPT_ROUNDS"] = rounds
+    hasher = PasswordHasher()
+    hasher.start()
+    try:
+        stored = await hasher.hash("correct horse")
+        start = time.perf_counter()
+        await asyncio.gather(*(hasher.verify("correct horse", stored) for _ in range(logins)))
+        return logins / (time.perf_counter() - start)
+    finally:
+        hasher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "bench_password_hashing.json"))
+    args = parser.parse_args()
+
+    workers = PASSWORD_CONFIG["WORKERS"]
+    print(f"pool: {PASSWORD_CONFIG['POOL']}, {workers} workers")
+    print(f"{'rounds':>8}{'ms/login':>12}{'1 core/s':>12}{'pool/s':>12}{'pool/core/s':>14}")
+
+    results = []
+    for rounds in args.rounds:
+        one = single_core(rounds, max(args.logins // workers, 10))
+        pool = asyncio.run(pooled(rounds, args.logins))
+        results.append({
+            "rounds": rounds,
+            "ms_per_login": round(1000 / one, 2),
+            "single_core_logins_per_s": round(one, 1),
+            "pool_logins_per_s": round(pool, 1),
+            "pool_logins_per_core_per_s": round(pool / workers, 1),
+        })
+        row = results[-1]
+        print(
+            f"{rounds:>8}{row['ms_per_login']:>12}{row['single_core_logins_per_s']:>12}"
+            f"{row['pool_logins_per_s']:>12}{row['pool_logins_per_core_per_s']:>14}"
+        )
+
+    write_json(args.output, {"params": vars(args), "workers": workers, "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Per-request CPU time of list responses: Pydantic models vs the fast path.
+
+Serves pre-generated todo and message documents (no MongoDB) from two
+routes on a scratch FastAPI app. One builds a model per item behind
+response_model, as the list endpoints do by default. The other returns the
+projected documents through FastJSONResponse (FAST_JSON=true). Needs httpx
+and orjson.
+
+    cd backend
+    python -m benchmarks.bench_serialization --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.fast_json import FastJSONResponse
+from app.main import MessageResponse, TodoResponse
+from benchmarks.common import RESULTS_DIR, write_json
+
+
+def make_todos(count):
+    now = datetime.utcnow()
+    return [
+        {"id": str(uuid4()), "text": f"todo {i}", "completed": i % 3 == 0, "created_at": now - timedelta(seconds=i)}
+        for i in range(count)
+    ]
+
+
+def make_messages(count):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid4()),
+            "sender_id": "SPK000001",
+            "sender_name": "Alice",
+            "sender_avatar": "http://localhost:8000/api/avatars/" + "a" * 64 + "?size=64",
+            "receiver_id": f"SPK{i % 500:06d}",
+            "receiver_name": "Bob",
+            "receiver_avatar": None,
+            "content": "A saved answer about control systems " * 4,
+            "bot_type": "chat",
+            "timestamp": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def build_app(todos, messages):
+    bench = FastAPI()
+
+    @bench.get("/models/todos", response_model=List[TodoResponse])
+    async def todo_models():
+        return [TodoResponse(**todo) for todo in todos]
+
+    @bench.get("/fast/todos")
+    async def todo_fast():
+        return FastJSONResponse(todos)
+
+    @bench.get("/models/messages", response_model=List[MessageResponse])
+    async def message_models():
+        return [MessageResponse(**msg) for msg in messages]
+
+    @bench.get("/fast/messages")
+    async def message_fast():
+        return FastJSONResponse(messages)
+
+    return bench
+
+
+def cpu_per_request(client, path, repeat):
+    client.get(path).raise_for_status()  # warm-up
+    start = time.process_time()
+    for _ in range(repeat):
+        client.get(path).raise_for_status()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "bench_serialization.json"))
+    args = parser.parse_args()
+
+    print(f"{'items':>8}  {'resource':<10}{'models ms':>12}{'fast ms':>12}{'speedup':>10}")
+    results = []
+    for size in args.sizes:
+        client = TestClient(build_app(make_todos(size), make_messages(size)))
+        for resource in ("todos", "messages"):
+            models = cpu_per_request(client, f"/models/{resource}", args.repeat)
+            fast = cpu_per_request(client, f"/fast/{resource}", args.repeat)
+            results.append({
+                "items": size,
+                "resource": resource,
+                "models_cpu_ms": round(models, 2),
+                "fast_cpu_ms": round(fast, 2),
+                "speedup": round(models / fast, 1) if fast else None,
+            })
+            print(f"{size:>8}  {resource:<10}{models:>12.2f}{fast:>12.2f}{models / fast:>9.1f}x")
+
+    write_json(args.output, {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
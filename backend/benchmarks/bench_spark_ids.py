@@ -0,0 +1,101 @@
+"""Signup Spark ID cost as the users collection fills up.
+
+For each fill level, pre-populates a scratch collection and then times
+allocate + insert for a batch of signups with the old random-probe helper
+and with the block allocator. Uses a separate database (default
+sparkai_bench) on MONGODB_URL, which is dropped first.
+
+    cd backend
+    python -m benchmarks.bench_spark_ids --fill 0 250000 500000 900000
+"""
+import argparse
+import os
+import random
+import time
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app.database import database
+from app.spark_ids import ID_SPACE, COUNTER_ID, SparkIdAllocator, format_spark_id, is_spark_id_conflict
+from benchmarks.common import RESULTS_DIR, print_table, summarize, write_json
+
+
+def reset(db, ids, counter_value=None):
+    db.users.drop()
+    db.counters.delete_many({})
+    db.users.create_index([("spark_id", ASCENDING)], unique=True)
+    for start in range(0, len(ids), 50_000):
+        db.users.insert_many([{"spark_id": spark_id} for spark_id in ids[start:start + 50_000]])
+    if counter_value is not None:
+        db.counters.insert_one({"_id": COUNTER_ID, "value": counter_value})
+
+
+# The pre-allocator helper: random candidates checked one find_one at a time
+def probe_signup(db):
+    probes = 0
+    while True:
+        probes += 1
+        spark_id = f"SPK{random.randint(0, ID_SPACE - 1):06d}"
+        if not db.users.find_one({"spark_id": spark_id}):
+            db.users.insert_one({"spark_id": spark_id})
+            return probes
+
+
+def allocator_signup(db, allocator):
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            db.users.insert_one({"spark_id": allocator.allocate(db)})
+            return attempts
+        except DuplicateKeyError as e:
+            if not is_spark_id_conflict(e):
+                raise
+
+
+def timed(signups, fn):
+    latencies = []
+    round_trips = 0
+    start = time.perf_counter()
+    for _ in range(signups):
+        began = time.perf_counter()
+        round_trips += fn()
+        latencies.append(time.perf_counter() - began)
+    summary = summarize(latencies, time.perf_counter() - start)
+    summary["avg_attempts"] = round(round_trips / signups, 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fill", type=int, nargs="+", default=[0, 250_000, 500_000, 900_000])
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--db", default="sparkai_bench")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "bench_spark_ids.json"))
+    args = parser.parse_args()
+
+    client = database.connect().client
+    client.drop_database(args.db)
+    db = client[args.db]
+
+    results = {}
+    try:
+        for fill in args.fill:
+            reset(db, [f"SPK{n:06d}" for n in random.sample(range(ID_SPACE), fill)])
+            results[f"probe @ {fill}"] = timed(args.signups, lambda: probe_signup(db))
+
+            # Steady state for the allocator: existing IDs came from it too
+            reset(db, [format_spark_id(n) for n in range(fill)], counter_value=fill)
+            allocator = SparkIdAllocator()
+            results[f"allocator @ {fill}"] = timed(args.signups, lambda: allocator_signup(db, allocator))
+    finally:
+        client.drop_database(args.db)
+        database.close()
+
+    print_table(f"{args.signups} signups per fill level", results.items())
+    write_json(args.output, {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
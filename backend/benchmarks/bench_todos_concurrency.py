@@ -0,0 +1,104 @@
+"""p99 latency of GET /api/todos under many concurrent clients.
+
+Runs the same workload twice against the ASGI app: once with pymongo called
+inline on the event loop (the old behaviour, MONGO_EXECUTOR_WORKERS=0) and
+once through the bounded executor. Needs a reachable MONGODB_URL and httpx.
+
+    cd backend
+    python -m benchmarks.bench_todos_concurrency --clients 200 --requests 10
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import httpx
+
+from app.config import MONGO_CONFIG
+from app.database import database
+from app.main import app, create_access_token
+from benchmarks.common import RESULTS_DIR, print_table, summarize, write_json
+
+BENCH_EMAIL = "bench-todos@example.com"
+
+
+def seed(db, todo_count):
+    db.users.update_one(
+        {"email": BENCH_EMAIL},
+        {"$set": {
+            "username": "bench",
+            "email": BENCH_EMAIL,
+            "spark_id": "SPKBENCH",
+            "is_verified": True,
+            "chat_count": 0,
+        }},
+        upsert=True,
+    )
+    db.todos.delete_many({"user_email": BENCH_EMAIL})
+    now = datetime.utcnow()
+    db.todos.insert_many([
+        {
+            "id": str(uuid4()),
+            "user_email": BENCH_EMAIL,
+            "text": f"todo {i}",
+            "completed": i % 2 == 0,
+            "created_at": now - timedelta(seconds=i),
+        }
+        for i in range(todo_count)
+    ])
+
+
+async def run_clients(clients, requests_per_client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                response = await client.get("/api/todos", headers=headers)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(latencies, elapsed)
+
+
+def run_mode(workers, args, token):
+    database.close()
+    MONGO_CONFIG["EXECUTOR_WORKERS"] = workers
+    db = database.connect()
+    seed(db, args.todos)
+    try:
+        return asyncio.run(run_clients(args.clients, args.requests, token))
+    finally:
+        database.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--todos", type=int, default=50, help="todos seeded for the bench user")
+    parser.add_argument("--workers", type=int, default=MONGO_CONFIG["EXECUTOR_WORKERS"] or 32)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "bench_todos_concurrency.json"))
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": BENCH_EMAIL}, timedelta(minutes=30))
+    results = {
+        "blocking (inline pymongo)": run_mode(0, args, token),
+        f"executor ({args.workers} workers)": run_mode(args.workers, args, token),
+    }
+
+    print_table(f"GET /api/todos, {args.clients} concurrent clients", results.items())
+    write_json(args.output, {"params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import json
+import math
+import os
+import time
+
+# Default home for result files; gitignored so runs never dirty the tree
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(samples, elapsed=None):
+    summary = {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(len(samples) / elapsed, 1)
+    return summary
+
+
+def print_table(title, rows):
+    rows = list(rows)
+    width = max([28] + [len(name) + 2 for name, _ in rows])
+    print(f"\n{title}")
+    print(f"{'name':<{width}}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}")
+    for name, summary in rows:
+        print(
+            f"{name:<{width}}{summary['count']:>8}{summary['p50_ms']:>10}"
+            f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary.get('throughput_rps', ''):>10}"
+        )
+
+
+def write_json(path, payload):
+    payload = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **payload}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\nResults written to {path}")
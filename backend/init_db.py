@@ -1,26 +1,25 @@
-from pymongo import MongoClient
+import argparse
 from dotenv import load_dotenv
-import os
 
 # Load environment variables
 load_dotenv()
 
-def create_test_user():
-    # Connect to MongoDB
-    client = MongoClient(os.getenv("MONGODB_URL"))
-    db = client[os.getenv("DB_NAME", "sparkai")]
-    
+from app.database import database
+from app.migrations import explain_checks, migration_status, run_migrations
+
+
+def create_test_user(db):
     # Test user data
     test_user = {
         "username": "testuser",
         "email": "test@example.com",
-        "password": "test123",  # In production, this should be hashed
+        "password": "test123",  # Upgraded to a bcrypt hash on first login
         "full_name": "Test User",
         "disabled": False
     }
     
     # Insert test user
-    result = db.users.update_one(
+    db.users.update_one(
         {"email": "test@example.com"},
         {"$set": test_user},
         upsert=True
@@ -29,5 +28,57 @@ def create_test_user():
     print(f"Test user created/updated with email: test@example.com")
     print(f"Password: test123")
 
+
+def migrate(db):
+    ran = run_migrations(db)
+    if ran:
+        print(f"Applied migrations: {', '.join(str(v) for v in ran)}")
+    else:
+        print("Schema is up to date")
+
+
+def status(db):
+    for migration in migration_status(db):
+        state = migration["applied_at"] or "pending"
+        print(f"{migration['version']:>4}  {migration['description']:<40} {state}")
+
+
+def explain(db):
+    failed = False
+    for check in explain_checks(db):
+        verdict = "COLLSCAN" if check["collection_scan"] else "ok"
+        if check["collection_scan"]:
+            failed = True
+        sort_note = " (in-memory sort)" if check["in_memory_sort"] else ""
+        print(f"{check['query']:<20} {verdict:<9} {' > '.join(check['stages'])}{sort_note}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SparkAI database schema tool")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="migrate",
+        choices=["migrate", "status", "explain", "seed-test-user"],
+    )
+    args = parser.parse_args()
+
+    db = database.connect()
+    try:
+        if args.command == "migrate":
+            migrate(db)
+        elif args.command == "status":
+            status(db)
+        elif args.command == "explain":
+            if explain(db):
+                raise SystemExit(1)
+        else:
+            migrate(db)
+            create_test_user(db)
+    finally:
+        database.close()
+
+
 if __name__ == "__main__":
-    create_test_user()
+    main()
@@ -0,0 +1,69 @@
+import itertools
+import os
+from datetime import datetime, timedelta
+
+# Configuration is read when the app is imported: run everything in process,
+# with no MongoDB, SMTP server or rate limits, and cheap password hashes
+os.environ["REPOSITORY_BACKEND"] = "memory"
+os.environ["OTP_STORE"] = "memory"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ["REALTIME_BROKER"] = "local"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["MAIL_WORKERS"] = "1"
+os.environ["SECRET_KEY"] = "test-secret-key-that-is-at-least-32-bytes"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.repositories import repositories
+from tests.helpers import message_doc, run, utc_ms
+
+
+@pytest.fixture
+def client():
+    # No SMTP: OTPs are logged instead of queued
+    main.otp_service.test_mode = True
+    # The lifespan builds fresh in-memory repositories for every client
+    with TestClient(main.app) as client:
+        yield client
+    for cache in (main.user_cache, main.token_cache, main.avatar_cache):
+        cache.clear()
+
+
+# Verified users inserted straight into the repositories, each with a bearer
+# token for the API
+@pytest.fixture
+def make_user(client):
+    numbers = itertools.count(1)
+
+    def make(**fields):
+        n = next(numbers)
+        user = {
+            "email": f"user{n}@example.com",
+            "username": f"user{n}",
+            "spark_id": f"SPK{n:06d}",
+            "password": "not-used",
+            "is_verified": True,
+            "disabled": False,
+            "chat_count": 0,
+            "created_at": datetime.utcnow(),
+            **fields,
+        }
+        run(repositories.users.insert(dict(user)))
+        token = main.create_access_token({"sub": user["email"]}, timedelta(minutes=10))
+        user["headers"] = {"Authorization": f"Bearer {token}"}
+        return user
+
+    return make
+
+
+@pytest.fixture
+def send(client):
+    def send(sender, receiver, at=None, content="hello", msg_id=None):
+        doc = message_doc(sender, receiver, at or utc_ms(), content, msg_id)
+        run(repositories.messages.insert(doc))
+        return doc
+
+    return send
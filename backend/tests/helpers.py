@@ -0,0 +1,31 @@
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+from app.conversations import pair_key
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# Timestamps as MongoDB stores them (millisecond precision), so the same
+# documents compare equal on both repository backends
+def utc_ms(value=None):
+    value = value or datetime.utcnow()
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def message_doc(sender, receiver, at, content="hello", msg_id=None):
+    return {
+        "id": msg_id or str(uuid4()),
+        "sender_id": sender["spark_id"],
+        "sender_name": sender["username"],
+        "receiver_id": receiver["spark_id"],
+        "receiver_name": receiver["username"],
+        "content": content,
+        "bot_type": "chat",
+        "timestamp": at,
+        "updated_at": at,
+        "pair": pair_key(sender["spark_id"], receiver["spark_id"]),
+    }
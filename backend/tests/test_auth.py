@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from app.main import otp_service
+
+
+def test_register_rejects_undeliverable_addresses(client):
+    response = client.post(
+        "/api/auth/register",
+        json={"username": "u", "email": "usér@example.com", "password": "secret123"},
+    )
+    assert response.status_code == 400
+    assert otp_service.store.get("usér@example.com") is None
+
+
+def test_register_then_verify_otp_then_login(client):
+    email = "new@example.com"
+    response = client.post("/api/auth/register", json={"username": "new", "email": email, "password": "secret123"})
+    assert response.status_code == 200
+
+    login = {"email": email, "password": "secret123"}
+    assert client.post("/api/auth/login", json=login).status_code == 403
+
+    otp = otp_service.store.get(email)["otp"]
+    assert client.post("/api/auth/verify-otp", json={"email": email, "otp": otp}).status_code == 200
+    assert client.post("/api/auth/login", json=login).status_code == 200
+
+
+def test_non_ascii_otp_is_invalid_not_an_error(client, make_user):
+    user = make_user(is_verified=False)
+    otp_service.store.put(user["email"], "123456", datetime.utcnow() + timedelta(minutes=5))
+
+    response = client.post("/api/auth/verify-otp", json={"email": user["email"], "otp": "12345é"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid OTP"
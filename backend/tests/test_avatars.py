@@ -0,0 +1,104 @@
+import base64
+import io
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from app.avatar_store import avatar_store
+from app.config import AVATAR_CONFIG
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" onload="alert(1)"/>'
+
+
+def image_bytes(image_format, size=(2, 2)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+PNG = image_bytes("PNG")
+
+
+def profile_image(client, user, value):
+    return client.put("/api/users/me", json={"profile_image": value}, headers=user["headers"])
+
+
+def png_url(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, format="PNG")
+    data = bytearray(buffer.getvalue())
+    # Rewrite the IHDR size so the header claims far more pixels than are stored
+    ihdr = b"IHDR" + struct.pack(">II", width, height) + bytes(data[24:29])
+    data[12:33] = ihdr + struct.pack(">I", zlib.crc32(ihdr))
+    return "data:image/png;base64," + base64.b64encode(bytes(data)).decode()
+
+
+def stored_avatar(client, user):
+    return client.get("/api/users/me", headers=user["headers"]).json()["profile_image"]
+
+
+@pytest.mark.parametrize("value", [
+    "data:image/png;base64," + base64.b64encode(PNG).decode(),
+    "data:IMAGE/PNG;charset=binary;base64," + base64.b64encode(PNG).decode(),
+    "data:image/png;base64," + "\n".join(base64.encodebytes(image_bytes("PNG", (64, 64))).decode().split()),
+    "data:image/jpeg;base64," + base64.b64encode(image_bytes("JPEG")).decode(),
+    "data:image/gif;base64," + base64.b64encode(image_bytes("GIF")).decode(),
+    "data:image/webp;base64," + base64.b64encode(image_bytes("WEBP")).decode(),
+])
+def test_data_urls_go_to_the_avatar_store(client, make_user, value):
+    user = make_user()
+    assert profile_image(client, user, value).status_code == 200
+
+    url = stored_avatar(client, user)
+    assert "/api/avatars/" in url
+    response = client.get(url.split(AVATAR_CONFIG["PUBLIC_URL"], 1)[1])
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].split("/")[0] == "image"
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+    assert response.headers["Content-Security-Policy"] == "default-src 'none'; sandbox"
+
+
+@pytest.mark.parametrize("value", [
+    "data:image/png;base64,@@not-base64@@",
+    "data:text/html,<script>alert(1)</script>",
+    "data:image/svg+xml;base64," + base64.b64encode(SVG).decode(),
+    "data:image/svg+xml,%3Csvg%20xmlns%3D%22http%3A%2F%2Fwww.w3.org%2F2000%2Fsvg%22%2F%3E",
+    # Allowed type, but the bytes are something else
+    "data:image/png;base64," + base64.b64encode(SVG).decode(),
+    "data:image/png;base64," + base64.b64encode(image_bytes("GIF")).decode(),
+])
+def test_unparseable_data_urls_are_rejected(client, make_user, value):
+    user = make_user()
+    assert profile_image(client, user, value).status_code == 400
+    assert stored_avatar(client, user) is None
+
+
+def test_legacy_stored_types_are_not_served_as_images(client):
+    avatar_hash = avatar_store.save("image/svg+xml", SVG)
+
+    response = client.get(f"/api/avatars/{avatar_hash}")
+    assert response.headers["Content-Type"] == "application/octet-stream"
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+
+
+def test_preset_urls_are_kept_but_capped(client, make_user):
+    user = make_user()
+    assert profile_image(client, user, "/avatars/preset-1.png").status_code == 200
+    assert stored_avatar(client, user) == "/avatars/preset-1.png"
+
+    too_long = "https://example.com/" + "a" * AVATAR_CONFIG["MAX_URL_LENGTH"]
+    assert profile_image(client, user, too_long).status_code == 400
+    assert stored_avatar(client, user) == "/avatars/preset-1.png"
+
+
+@pytest.mark.parametrize("width, height", [
+    (AVATAR_CONFIG["MAX_DIMENSION"] + 1, 1),
+    (5000, 5000),
+    (100000, 100000),
+])
+def test_oversized_images_are_rejected_before_decoding(client, make_user, width, height):
+    user = make_user()
+    assert profile_image(client, user, png_url(width, height)).status_code == 400
+    assert stored_avatar(client, user) is None
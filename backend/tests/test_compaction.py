@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import pytest
+
+from app.compaction import message_compactor
+from app.config import COMPACTION_CONFIG
+from app.repositories import repositories
+from tests.helpers import run, utc_ms
+
+
+@pytest.fixture(autouse=True)
+def fast_sweeps(monkeypatch):
+    monkeypatch.setitem(COMPACTION_CONFIG, "BATCH_SIZE", 2)
+    monkeypatch.setitem(COMPACTION_CONFIG, "MAX_PER_SECOND", 10000)
+
+
+def delete_for_both(client, msg, *users):
+    for user in users:
+        assert client.delete(f"/api/messages/{msg['id']}", headers=user["headers"]).status_code == 200
+
+
+# Deleted by both sides long enough ago to be past the retention window
+def delete_for_both_long_ago(msg, days=30):
+    deleted_at = utc_ms() - timedelta(days=days)
+    for side in ("sender", "receiver"):
+        run(repositories.messages.mark_deleted(msg, side, deleted_at))
+
+
+def test_sweep_removes_expired_messages_deleted_by_both(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    old = utc_ms() - timedelta(days=30)
+    expired = [send(alice, bob, old, content=f"expired {n}") for n in range(5)]
+    recent = send(alice, bob, old, content="recent")
+    one_side = send(alice, bob, old, content="one side")
+    for msg in expired:
+        delete_for_both_long_ago(msg)
+    delete_for_both(client, recent, alice, bob)
+    client.delete(f"/api/messages/{one_side['id']}", headers=alice["headers"])
+
+    batches = message_compactor.batches
+    assert run(message_compactor.run_once()) == 5
+    # Batches of two: 2 + 2 + 1
+    assert message_compactor.batches - batches == 3
+
+    assert all(run(repositories.messages.find(msg["id"])) is None for msg in expired)
+    assert run(repositories.messages.find(recent["id"])) is not None
+    inbox = client.get("/api/messages", headers=bob["headers"]).json()
+    assert [m["id"] for m in inbox] == [one_side["id"]]
+    found = client.get("/api/messages/search", params={"q": "expired"}, headers=bob["headers"]).json()
+    assert found["items"] == []
+
+
+def test_sweep_progress_is_reported(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    delete_for_both_long_ago(send(alice, bob, utc_ms() - timedelta(days=30)))
+
+    run(message_compactor.run_once())
+
+    assert client.get("/api/stats").status_code == 404
+    metrics = client.get("/metrics").text
+    assert 'messages_compacted_total{mode="archive"}' in metrics
+    assert "message_compaction_running 0" in metrics
+    assert "message_compaction_last_run_messages 1" in metrics
+
+
+def test_synced_deletions_survive_until_the_retention_window(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    msg = send(alice, bob)
+    token = client.get("/api/messages/sync", headers=bob["headers"]).json()["sync_token"]
+    delete_for_both(client, msg, alice, bob)
+
+    assert run(message_compactor.run_once()) == 0
+    body = client.get("/api/messages/sync", params={"since": token}, headers=bob["headers"]).json()
+    assert body["deleted"] == [msg["id"]]
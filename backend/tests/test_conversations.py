@@ -0,0 +1,57 @@
+def send(client, sender, receiver, content="hello"):
+    response = client.post(
+        "/api/messages",
+        json={"receiver_spark_id": receiver["spark_id"], "content": content, "bot_type": "chat"},
+        headers=sender["headers"],
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def conversations(client, user):
+    return {c["peer_id"]: c for c in client.get("/api/conversations", headers=user["headers"]).json()["items"]}
+
+
+def test_unread_counts_only_the_receivers_side(client, make_user):
+    alice, bob = make_user(), make_user()
+    for n in range(3):
+        last = send(client, alice, bob, f"message {n}")
+
+    bobs = conversations(client, bob)[alice["spark_id"]]
+    assert bobs["unread"] == 3
+    assert bobs["last_message"]["id"] == last["id"]
+    assert bobs["peer_name"] == alice["username"]
+    assert conversations(client, alice)[bob["spark_id"]]["unread"] == 0
+
+
+def test_marking_read_clears_unread_until_the_next_message(client, make_user):
+    alice, bob = make_user(), make_user()
+    send(client, alice, bob)
+    send(client, alice, bob)
+
+    response = client.post(f"/api/conversations/{alice['spark_id']}/read", headers=bob["headers"])
+    assert response.status_code == 200
+    assert conversations(client, bob)[alice["spark_id"]]["unread"] == 0
+
+    send(client, alice, bob)
+    assert conversations(client, bob)[alice["spark_id"]]["unread"] == 1
+
+
+def test_marking_an_unknown_conversation_read_is_404(client, make_user):
+    alice, bob = make_user(), make_user()
+    response = client.post(f"/api/conversations/{alice['spark_id']}/read", headers=bob["headers"])
+    assert response.status_code == 404
+
+
+def test_deleting_the_last_message_moves_the_preview_back(client, make_user):
+    alice, bob = make_user(), make_user()
+    first = send(client, alice, bob, "first")
+    second = send(client, bob, alice, "second")
+
+    client.delete(f"/api/messages/{second['id']}", headers=alice["headers"])
+    assert conversations(client, alice)[bob["spark_id"]]["last_message"]["id"] == first["id"]
+    # Bob has not deleted anything
+    assert conversations(client, bob)[alice["spark_id"]]["last_message"]["id"] == second["id"]
+
+    client.delete(f"/api/messages/{first['id']}", headers=alice["headers"])
+    assert bob["spark_id"] not in conversations(client, alice)
@@ -0,0 +1,51 @@
+def test_unchanged_list_answers_304(client, make_user):
+    alice = make_user()
+    client.post("/api/todos", json={"text": "write tests"}, headers=alice["headers"])
+
+    first = client.get("/api/todos", headers=alice["headers"])
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = client.get("/api/todos", headers={**alice["headers"], "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+
+def test_writes_change_the_etag(client, make_user):
+    alice = make_user()
+    etag = client.get("/api/saves", headers=alice["headers"]).headers["ETag"]
+
+    client.post("/api/saves", json={"content": "an answer"}, headers=alice["headers"])
+
+    response = client.get("/api/saves", headers={**alice["headers"], "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [s["content"] for s in response.json()] == ["an answer"]
+
+
+def test_each_page_has_its_own_etag(client, make_user):
+    alice = make_user()
+    first = client.get("/api/todos", params={"limit": 1}, headers=alice["headers"]).headers["ETag"]
+    second = client.get("/api/todos", params={"limit": 2}, headers=alice["headers"]).headers["ETag"]
+    assert first != second
+
+
+def test_etags_are_per_user(client, make_user):
+    alice, bob = make_user(), make_user()
+    etag = client.get("/api/todos", headers=alice["headers"]).headers["ETag"]
+
+    response = client.get("/api/todos", headers={**bob["headers"], "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_avatar_change_invalidates_followers_friend_lists(client, make_user):
+    alice, bob = make_user(), make_user()
+    client.post("/api/friends", json={"spark_id": alice["spark_id"]}, headers=bob["headers"])
+    etag = client.get("/api/friends", headers=bob["headers"]).headers["ETag"]
+
+    client.put("/api/users/me", json={"profile_image": "/avatars/preset-3.png"}, headers=alice["headers"])
+
+    response = client.get("/api/friends", headers={**bob["headers"], "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["avatar"] == "/avatars/preset-3.png"
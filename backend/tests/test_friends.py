@@ -0,0 +1,47 @@
+def add_friend(client, user, friend):
+    return client.post("/api/friends", json={"spark_id": friend["spark_id"]}, headers=user["headers"])
+
+
+def test_friends_are_added_once(client, make_user):
+    alice, bob = make_user(), make_user()
+    assert add_friend(client, alice, bob).status_code == 200
+
+    response = add_friend(client, alice, bob)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "User is already in your friends list"
+    assert [f["spark_id"] for f in client.get("/api/friends", headers=alice["headers"]).json()] == [bob["spark_id"]]
+
+
+def test_unknown_users_and_yourself_cannot_be_added(client, make_user):
+    alice = make_user()
+    assert add_friend(client, alice, {"spark_id": "SPK999999"}).status_code == 404
+    assert add_friend(client, alice, alice).status_code == 400
+
+
+def test_friend_pages_cover_every_friend_once(client, make_user):
+    alice = make_user()
+    friends = [make_user() for _ in range(7)]
+    for friend in friends:
+        add_friend(client, alice, friend)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/friends", params=params, headers=alice["headers"]).json()
+        assert len(body["items"]) <= 3
+        seen += [f["spark_id"] for f in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(seen) == sorted(f["spark_id"] for f in friends)
+    assert len(seen) == len(set(seen))
+
+
+def test_friend_entries_show_current_profiles(client, make_user):
+    alice, bob = make_user(), make_user()
+    add_friend(client, alice, bob)
+    client.put("/api/users/me", json={"profile_image": "/avatars/preset-2.png"}, headers=bob["headers"])
+
+    [friend] = client.get("/api/friends", headers=alice["headers"]).json()
+    assert (friend["name"], friend["avatar"]) == (bob["username"], "/avatars/preset-2.png")
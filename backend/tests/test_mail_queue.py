@@ -0,0 +1,96 @@
+import smtplib
+
+import pytest
+
+from app.config import MAIL_QUEUE_CONFIG
+from app.mail_queue import MailQueue, envelope_address
+
+
+# Stands in for an SMTP connection: raises the queued errors in order, then
+# accepts everything
+class FakeSMTP:
+    def __init__(self):
+        self.errors = []
+        self.sent = []
+
+    def sendmail(self, from_address, to_address, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(to_address)
+
+    def quit(self):
+        pass
+
+
+class DeadLetters:
+    def __init__(self):
+        self.docs = []
+
+    def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+@pytest.fixture
+def smtp():
+    return FakeSMTP()
+
+
+@pytest.fixture
+def mail(monkeypatch, smtp):
+    monkeypatch.setitem(MAIL_QUEUE_CONFIG, "BACKOFF_SECONDS", 0.01)
+    monkeypatch.setitem(MAIL_QUEUE_CONFIG, "MAX_ATTEMPTS", 3)
+    queue = MailQueue()
+    queue.dead_letters = DeadLetters()
+    monkeypatch.setattr(queue, "_connect", lambda: smtp)
+    yield queue
+    queue.stop()
+
+
+def test_transient_failures_are_retried(mail, smtp):
+    smtp.errors += [smtplib.SMTPDataError(451, b"try later"), OSError("reset")]
+    assert mail.enqueue("a@example.com", "hello")
+    assert mail.wait_idle(5)
+
+    assert smtp.sent == ["a@example.com"]
+    stats = mail.stats()
+    assert (stats["sent"], stats["retried"], stats["dead"]) == (1, 2, 0)
+
+
+def test_exhausted_retries_become_dead_letters(mail, smtp):
+    smtp.errors += [smtplib.SMTPDataError(451, b"try later")] * 3
+    mail.enqueue("a@example.com", "hello")
+    assert mail.wait_idle(5)
+
+    assert smtp.sent == []
+    assert mail.stats()["dead"] == 1
+    [dead] = mail.dead_letters.docs
+    assert (dead["to"], dead["attempts"], dead["message"]) == ("a@example.com", 3, "hello")
+    assert list(mail.recent_dead_letters)[0]["attempts"] == 3
+
+
+def test_unexpected_errors_are_not_retried(mail, smtp):
+    smtp.errors.append(UnicodeEncodeError("ascii", "é", 0, 1, "not ascii"))
+    mail.enqueue("a@example.com", "hello")
+    assert mail.wait_idle(5)
+
+    assert mail.stats()["retried"] == 0
+    assert mail.dead_letters.docs[0]["attempts"] == 1
+    # The worker survived and keeps sending
+    mail.enqueue("b@example.com", "hello")
+    assert mail.wait_idle(5)
+    assert smtp.sent == ["b@example.com"]
+
+
+def test_dropped_connection_is_reopened_without_a_retry(mail, smtp):
+    smtp.errors.append(smtplib.SMTPServerDisconnected("idle timeout"))
+    mail.enqueue("a@example.com", "hello")
+    assert mail.wait_idle(5)
+
+    assert smtp.sent == ["a@example.com"]
+    assert mail.stats()["retried"] == 0
+
+
+def test_undeliverable_addresses_are_refused_up_front(mail):
+    assert not mail.enqueue("usér@example.com", "hello")
+    assert mail.stats()["rejected"] == 1
+    assert envelope_address("user@bücher.example") == "user@xn--bcher-kva.example"
@@ -0,0 +1,60 @@
+import re
+
+from app.config import METRICS_CONFIG
+from app.metrics import Registry
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    return response.text
+
+
+def sample(text, name, **labels):
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}{{{re.escape(wanted)}}} (\S+)$", text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_requests_are_timed_by_route_template(client, make_user):
+    alice = make_user()
+    todo = client.post("/api/todos", json={"text": "a"}, headers=alice["headers"]).json()
+    client.delete(f"/api/todos/{todo['id']}", headers=alice["headers"])
+    client.delete("/api/todos/missing", headers=alice["headers"])
+
+    text = scrape(client)
+    route = {"method": "DELETE", "route": "/api/todos/{todo_id}"}
+    assert sample(text, "http_request_duration_seconds_count", **route, status="200") >= 1
+    assert sample(text, "http_request_duration_seconds_count", **route, status="404") >= 1
+    # Raw paths never become label values
+    assert todo["id"] not in text
+
+
+def test_histogram_buckets_are_cumulative(client, make_user):
+    client.get("/api/todos", headers=make_user()["headers"])
+    text = scrape(client)
+
+    labels = {"method": "GET", "route": "/api/todos", "status": "200"}
+    counts = [sample(text, "http_request_duration_seconds_bucket", **labels, le=bound)
+              for bound in [repr(float(b)) for b in METRICS_CONFIG["BUCKETS"]] + ["+Inf"]]
+    assert counts == sorted(counts)
+    assert counts[-1] == sample(text, "http_request_duration_seconds_count", **labels)
+
+
+def test_point_in_time_gauges_are_exposed(client):
+    text = scrape(client)
+    for name in ("mail_queue_pending", "realtime_connections", "message_compaction_running"):
+        assert f"# TYPE {name} gauge" in text
+    assert re.search(r'^otp_store_size\{backend="MemoryOTPStore"\} \d+$', text, re.M)
+
+
+def test_metrics_can_be_disabled(client, monkeypatch):
+    monkeypatch.setitem(METRICS_CONFIG, "ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("events_total", "Events", ("source",)).inc('say "hi"\n')
+    assert 'events_total{source="say \\"hi\\"\\n"} 1' in registry.render()
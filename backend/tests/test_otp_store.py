@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import OTP_CONFIG
+from app.otp_service import OTPService
+from app.otp_store import MemoryOTPStore
+
+
+@pytest.fixture
+def service():
+    service = OTPService()
+    service.test_mode = True
+    return service
+
+
+def issue(service, email="a@example.com", otp="123456", expires_in=timedelta(minutes=5)):
+    service.store.put(email, otp, datetime.utcnow() + expires_in)
+    return email
+
+
+def test_correct_otp_verifies_once(service):
+    email = issue(service)
+    assert service.verify_otp(email, "123456")["success"]
+    assert service.store.get(email) is None
+    assert service.verify_otp(email, "123456")["message"] == "No OTP found for this email"
+
+
+def test_expired_otp_is_rejected_and_removed(service):
+    email = issue(service, expires_in=timedelta(seconds=-1))
+    assert service.verify_otp(email, "123456")["message"] == "OTP has expired"
+    assert service.store.get(email) is None
+
+
+def test_wrong_guesses_are_counted_until_the_otp_is_burned(service):
+    email = issue(service)
+    for attempt in range(1, OTP_CONFIG["MAX_ATTEMPTS"] + 1):
+        assert service.verify_otp(email, "000000")["message"] == "Invalid OTP"
+        assert service.store.get(email)["attempts"] == attempt
+
+    # Even the right code is refused once the attempts are used up
+    result = service.verify_otp(email, "123456")
+    assert result["message"] == "Too many attempts. Please request a new OTP"
+    assert service.store.get(email) is None
+
+
+def test_reissuing_resets_attempts(service):
+    email = issue(service)
+    service.verify_otp(email, "000000")
+    issue(service, email, otp="654321")
+    assert service.store.get(email)["attempts"] == 0
+    assert service.verify_otp(email, "654321")["success"]
+
+
+def test_register_attempt_stops_at_the_limit():
+    store = MemoryOTPStore()
+    store.put("a@example.com", "123456", datetime.utcnow() + timedelta(minutes=5))
+    assert store.register_attempt("a@example.com", 2)["attempts"] == 1
+    assert store.register_attempt("a@example.com", 2)["attempts"] == 2
+    assert store.register_attempt("a@example.com", 2) is None
+    assert store.register_attempt("missing@example.com", 2) is None
+
+
+def test_sweep_drops_only_expired_records():
+    store = MemoryOTPStore()
+    now = datetime.utcnow()
+    store.put("old@example.com", "111111", now - timedelta(seconds=1))
+    store.put("live@example.com", "222222", now + timedelta(minutes=5))
+    # Re-issued before expiring: the stale heap entry must not remove it
+    store.put("again@example.com", "333333", now - timedelta(seconds=1))
+    store.put("again@example.com", "444444", now + timedelta(minutes=5))
+
+    assert store.sweep(now) == 1
+    assert store.get("old@example.com") is None
+    assert store.get("live@example.com")["otp"] == "222222"
+    assert store.get("again@example.com")["otp"] == "444444"
+    assert store.size() == 2
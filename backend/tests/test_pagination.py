@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from app.config import SEARCH_CONFIG
+from tests.helpers import utc_ms
+
+
+def walk(client, url, user, limit, **params):
+    items, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=query, headers=user["headers"])
+        assert response.status_code == 200, response.json()
+        body = response.json()
+        assert len(body["items"]) <= limit
+        items += body["items"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_todo_pages_cover_every_item_newest_first(client, make_user):
+    alice = make_user()
+    created = [client.post("/api/todos", json={"text": f"todo {n}"}, headers=alice["headers"]).json()
+               for n in range(7)]
+
+    items = walk(client, "/api/todos", alice, 3)
+    assert [t["id"] for t in items] == [t["id"] for t in reversed(created)]
+
+
+def test_message_pages_and_threads(client, make_user, send):
+    alice, bob, carol = make_user(), make_user(), make_user()
+    start = utc_ms() - timedelta(minutes=10)
+    with_bob = [send(alice, bob, start + timedelta(seconds=n))["id"] for n in range(5)]
+    with_carol = [send(carol, alice, start + timedelta(seconds=10 + n))["id"] for n in range(3)]
+
+    inbox = walk(client, "/api/messages", alice, 2)
+    assert [m["id"] for m in inbox] == list(reversed(with_bob + with_carol))
+
+    thread = walk(client, f"/api/conversations/{bob['spark_id']}/messages", alice, 2)
+    assert [m["id"] for m in thread] == list(reversed(with_bob))
+
+    conversations = walk(client, "/api/conversations", alice, 1)
+    assert [c["peer_id"] for c in conversations] == [carol["spark_id"], bob["spark_id"]]
+
+
+def test_invalid_cursor_is_rejected(client, make_user):
+    response = client.get("/api/todos", params={"cursor": "garbage"}, headers=make_user()["headers"])
+    assert response.status_code == 400
+
+
+def test_search_pages_by_offset_and_stays_with_the_user(client, make_user):
+    alice, bob = make_user(), make_user()
+    for n in range(5):
+        client.post("/api/saves", json={"content": f"python note {n}"}, headers=alice["headers"])
+    client.post("/api/saves", json={"content": "unrelated"}, headers=alice["headers"])
+    client.post("/api/saves", json={"content": "python from bob"}, headers=bob["headers"])
+
+    items = walk(client, "/api/saves/search", alice, 2, q="python")
+    assert sorted(s["content"] for s in items) == [f"python note {n}" for n in range(5)]
+
+
+def test_search_stops_at_max_results(client, make_user, monkeypatch):
+    monkeypatch.setitem(SEARCH_CONFIG, "MAX_RESULTS", 4)
+    alice = make_user()
+    for n in range(10):
+        client.post("/api/saves", json={"content": f"python note {n}"}, headers=alice["headers"])
+
+    assert len(walk(client, "/api/saves/search", alice, 2, q="python")) == 4
+
+
+def test_message_search_skips_deleted_messages(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    kept = send(alice, bob, content="meeting at noon")
+    gone = send(alice, bob, content="meeting moved")
+    client.delete(f"/api/messages/{gone['id']}", headers=bob["headers"])
+
+    found = client.get("/api/messages/search", params={"q": "meeting"}, headers=bob["headers"]).json()
+    assert [m["id"] for m in found["items"]] == [kept["id"]]
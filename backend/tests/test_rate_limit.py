@@ -0,0 +1,69 @@
+import pytest
+
+from app import rate_limit
+from app.config import RATE_LIMIT_CONFIG
+from app.rate_limit import MemoryBuckets, rate_limiter
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "ENABLED", True)
+    monkeypatch.setattr(rate_limiter, "buckets", MemoryBuckets())
+
+
+def login(client, email):
+    return client.post("/api/auth/login", json={"email": email, "password": "wrong-password"})
+
+
+def test_login_is_limited_per_email_with_retry_after(client, limited):
+    limit = RATE_LIMIT_CONFIG["SCOPES"]["login"]["email"]
+    for _ in range(limit["CAPACITY"]):
+        assert login(client, "target@example.com").status_code == 401
+
+    response = login(client, "target@example.com")
+    assert response.status_code == 429
+    # One token refills every PERIOD / CAPACITY seconds
+    assert int(response.headers["Retry-After"]) == -(-limit["PERIOD_SECONDS"] // limit["CAPACITY"])
+
+    # Addresses are normalised, and other addresses keep their own bucket
+    assert login(client, " Target@Example.com ").status_code == 429
+    assert login(client, "other@example.com").status_code == 401
+
+
+def test_login_is_limited_per_ip(client, limited, monkeypatch):
+    monkeypatch.setitem(RATE_LIMIT_CONFIG["SCOPES"]["login"], "ip", {"CAPACITY": 3, "PERIOD_SECONDS": 60})
+    for n in range(3):
+        assert login(client, f"user{n}@example.com").status_code == 401
+    assert login(client, "fresh@example.com").status_code == 429
+
+
+def test_disabled_limiter_never_rejects(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "buckets", MemoryBuckets())
+    for _ in range(RATE_LIMIT_CONFIG["SCOPES"]["login"]["email"]["CAPACITY"] + 2):
+        assert login(client, "target@example.com").status_code == 401
+
+
+def test_buckets_refill_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    buckets = MemoryBuckets()
+
+    assert buckets.take("k", 2, 10) == (True, 0)
+    assert buckets.take("k", 2, 10) == (True, 0)
+    allowed, retry_after = buckets.take("k", 2, 10)
+    assert not allowed and retry_after == pytest.approx(5)
+
+    now[0] += 5
+    assert buckets.take("k", 2, 10) == (True, 0)
+
+
+def test_least_recently_used_buckets_are_evicted(monkeypatch):
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, "MAX_KEYS", 2)
+    buckets = MemoryBuckets()
+    for key in ("a", "b", "a", "c"):
+        buckets.take(key, 1, 60)
+
+    assert buckets.size() == 2
+    # "b" was the least recently used, so it starts full again
+    assert buckets.take("b", 1, 60)[0]
+    assert not buckets.take("c", 1, 60)[0]
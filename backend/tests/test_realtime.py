@@ -0,0 +1,40 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+def connect(client, user):
+    token = user["headers"]["Authorization"].split(" ", 1)[1]
+    return client.websocket_connect(f"/api/ws?token={token}")
+
+
+def test_new_messages_are_pushed_to_both_participants(client, make_user):
+    alice, bob, carol = make_user(), make_user(), make_user()
+    with connect(client, alice) as alice_ws, connect(client, bob) as bob_ws, connect(client, carol) as carol_ws:
+        response = client.post(
+            "/api/messages",
+            json={"receiver_spark_id": bob["spark_id"], "content": "hi bob", "bot_type": "chat"},
+            headers=alice["headers"],
+        )
+        assert response.status_code == 200
+
+        for ws in (alice_ws, bob_ws):
+            event = ws.receive_json()
+            assert event["type"] == "message.created"
+            assert event["message"]["id"] == response.json()["id"]
+            assert event["message"]["content"] == "hi bob"
+
+        # Nothing for a user outside the conversation: the next event carol
+        # sees is her own message
+        client.post(
+            "/api/messages",
+            json={"receiver_spark_id": alice["spark_id"], "content": "hi alice", "bot_type": "chat"},
+            headers=carol["headers"],
+        )
+        assert carol_ws.receive_json()["message"]["content"] == "hi alice"
+
+
+def test_invalid_token_is_refused(client):
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect("/api/ws?token=garbage"):
+            pass
+    assert refused.value.code == 1008
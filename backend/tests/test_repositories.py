@@ -0,0 +1,170 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.config import MONGO_CONFIG
+from app.database import database
+from app.migrations import run_migrations
+from app.pagination import split_page
+from app.repositories import Repositories
+from tests.helpers import message_doc, run, utc_ms
+
+# The same contract checks run against every backend. The Mongo ones need a
+# disposable server: MONGODB_TEST_URL=mongodb://localhost:27017 pytest
+TEST_DB = "sparkai_test"
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def repos(request):
+    if request.param == "memory":
+        yield Repositories().configure("memory")
+        return
+
+    url = os.getenv("MONGODB_TEST_URL")
+    if not url:
+        pytest.skip("MONGODB_TEST_URL is not set")
+    MONGO_CONFIG.update(URL=url, DB_NAME=TEST_DB)
+    database.close()
+    db = database.connect()
+    database.client.drop_database(TEST_DB)
+    run_migrations(db)
+    try:
+        yield Repositories().configure("mongo")
+    finally:
+        database.client.drop_database(TEST_DB)
+        database.close()
+
+
+ALICE = {"spark_id": "SPK000001", "username": "alice"}
+BOB = {"spark_id": "SPK000002", "username": "bob"}
+CAROL = {"spark_id": "SPK000003", "username": "carol"}
+
+
+def user_doc(n):
+    return {
+        "email": f"user{n}@example.com",
+        "username": f"user{n}",
+        "spark_id": f"SPK{n:06d}",
+        "password": "secret",
+        "is_verified": True,
+    }
+
+
+def walk(repos, email, limit):
+    items, cursor = [], None
+    while True:
+        page = run(repos.todos.list(email, limit=limit + 1, cursor=cursor))
+        page, cursor = split_page(page, limit, "created_at")
+        items.extend(page)
+        if cursor is None:
+            return items
+
+
+def test_keyset_pages_follow_created_at_then_id(repos):
+    base = utc_ms(datetime(2024, 1, 1))
+    # Three todos share a timestamp, so page boundaries fall inside the tie
+    times = [base, base, base, base + timedelta(seconds=1), base - timedelta(seconds=1)]
+    for n, created_at in enumerate(times):
+        run(repos.todos.insert({
+            "id": f"todo-{n}",
+            "user_email": "a@example.com",
+            "text": f"todo {n}",
+            "completed": False,
+            "created_at": created_at,
+        }))
+    run(repos.todos.insert({
+        "id": "other", "user_email": "b@example.com", "text": "x", "completed": False, "created_at": base,
+    }))
+
+    items = walk(repos, "a@example.com", 2)
+    assert [t["id"] for t in items] == ["todo-3", "todo-2", "todo-1", "todo-0", "todo-4"]
+    assert set(items[0]) == {"id", "text", "completed", "created_at"}
+
+
+def test_projection_includes_or_excludes_fields(repos):
+    run(repos.users.insert(user_doc(1)))
+
+    included = run(repos.users.find_by_email("user1@example.com", {"spark_id": 1, "username": 1}))
+    assert set(included) == {"_id", "spark_id", "username"}
+
+    without_id = run(repos.users.find_by_email("user1@example.com", {"_id": 0, "spark_id": 1}))
+    assert without_id == {"spark_id": "SPK000001"}
+
+    excluded = run(repos.users.find_by_email("user1@example.com", {"password": 0}))
+    assert "password" not in excluded
+    assert excluded["email"] == "user1@example.com"
+
+
+@pytest.mark.parametrize("field", ["email", "spark_id"])
+def test_duplicate_keys_raise_like_the_server(repos, field):
+    run(repos.users.insert(user_doc(1)))
+    duplicate = user_doc(2)
+    duplicate[field] = user_doc(1)[field]
+
+    with pytest.raises(DuplicateKeyError) as error:
+        run(repos.users.insert(duplicate))
+    assert field in error.value.details["keyPattern"]
+
+
+def test_changes_resume_from_updated_at_and_id(repos):
+    at = utc_ms(datetime(2024, 1, 1))
+    for n in range(6):
+        run(repos.messages.insert(message_doc(ALICE, BOB, at, msg_id=f"m{n}")))
+    run(repos.messages.insert(message_doc(BOB, CAROL, at, msg_id="unrelated")))
+
+    first = run(repos.messages.changes("SPK000001", None, 4))
+    assert [m["id"] for m in first] == ["m0", "m1", "m2", "m3"]
+
+    rest = run(repos.messages.changes("SPK000001", (at, "m3"), 10))
+    assert [m["id"] for m in rest] == ["m4", "m5"]
+
+
+def test_changes_include_deletions_after_the_position(repos):
+    at = utc_ms(datetime(2024, 1, 1))
+    msg = message_doc(ALICE, BOB, at, msg_id="m0")
+    run(repos.messages.insert(msg))
+    run(repos.messages.mark_deleted(msg, "sender", at + timedelta(seconds=5)))
+
+    assert run(repos.messages.changes("SPK000001", None, 10)) == []
+    changed = run(repos.messages.changes("SPK000001", (at, "m0"), 10))
+    assert [(m["id"], m["sender_deleted"]) for m in changed] == [("m0", True)]
+    assert [m["id"] for m in run(repos.messages.list_visible("SPK000002"))] == ["m0"]
+
+
+def test_compact_removes_only_expired_messages_deleted_by_both(repos):
+    old = utc_ms(datetime(2024, 1, 1))
+    cutoff = old + timedelta(days=1)
+    docs = {name: message_doc(ALICE, BOB, old, content=name, msg_id=name)
+            for name in ("both_old", "both_recent", "sender_only")}
+    for doc in docs.values():
+        run(repos.messages.insert(doc))
+    for side in ("sender", "receiver"):
+        run(repos.messages.mark_deleted(docs["both_old"], side, old + timedelta(hours=1)))
+        run(repos.messages.mark_deleted(docs["both_recent"], side, cutoff + timedelta(hours=1)))
+    run(repos.messages.mark_deleted(docs["sender_only"], "sender", old + timedelta(hours=1)))
+
+    assert run(repos.messages.compact(cutoff, 10, "messages_archive")) == 1
+    assert run(repos.messages.compact(cutoff, 10, "messages_archive")) == 0
+
+    assert run(repos.messages.find("both_old")) is None
+    assert run(repos.messages.find("both_recent")) is not None
+    assert [m["id"] for m in run(repos.messages.list_visible("SPK000002"))] == ["sender_only"]
+    assert run(repos.messages.search("SPK000002", "both_old", 10)) == []
+
+
+def test_search_is_scoped_to_the_owner(repos):
+    at = utc_ms(datetime(2024, 1, 1))
+    for n, (email, content) in enumerate([
+        ("a@example.com", "python asyncio notes"),
+        ("a@example.com", "cooking pasta"),
+        ("b@example.com", "python for b"),
+    ]):
+        run(repos.saves.insert({
+            "id": f"s{n}", "user_email": email, "content": content, "bot_type": "chat", "created_at": at,
+        }))
+
+    assert [s["id"] for s in run(repos.saves.search("a@example.com", "python", 10))] == ["s0"]
+    run(repos.saves.delete("a@example.com", "s0"))
+    assert run(repos.saves.search("a@example.com", "python", 10)) == []
@@ -0,0 +1,87 @@
+import pytest
+
+from app import spark_ids
+from app.config import SPARK_ID_CONFIG
+from app.repositories import repositories
+from app.spark_ids import ID_SPACE, SparkIdAllocator, format_spark_id, permute
+from tests.helpers import run
+
+
+# The counters collection as the allocator uses it: one atomic $inc per block
+class Counters:
+    def __init__(self):
+        self.value = 0
+        self.calls = 0
+
+    def find_one_and_update(self, filter, update, upsert, return_document):
+        self.calls += 1
+        self.value += update["$inc"]["value"]
+        return {"_id": filter["_id"], "value": self.value}
+
+
+class FakeDB:
+    def __init__(self):
+        self.counters = Counters()
+
+
+def register(client, email, username="new"):
+    return client.post("/api/auth/register", json={"username": username, "email": email, "password": "secret123"})
+
+
+def test_permutation_is_a_bijection():
+    assert len({permute(n) for n in range(ID_SPACE)}) == ID_SPACE
+    assert format_spark_id(0) != format_spark_id(1)
+
+
+def test_workers_share_the_counter_in_blocks(monkeypatch):
+    monkeypatch.setitem(SPARK_ID_CONFIG, "BLOCK_SIZE", 10)
+    db = FakeDB()
+    first, second = SparkIdAllocator(), SparkIdAllocator()
+
+    ids = [allocator.allocate(db) for _ in range(15) for allocator in (first, second)]
+
+    assert len(set(ids)) == 30
+    assert all(spark_id.startswith("SPK") and len(spark_id) == 9 for spark_id in ids)
+    # Two blocks each, not one round trip per ID
+    assert db.counters.calls == 4
+
+
+def test_exhausted_id_space_is_an_error(monkeypatch):
+    monkeypatch.setattr(spark_ids, "ID_SPACE", 5)
+    db, allocator = FakeDB(), SparkIdAllocator()
+    for _ in range(5):
+        allocator.allocate(db)
+    with pytest.raises(RuntimeError):
+        allocator.allocate(db)
+
+
+def test_register_retries_ids_taken_by_legacy_users(client, make_user, monkeypatch):
+    legacy = make_user()
+    fresh = format_spark_id(123)
+    issued = iter([legacy["spark_id"], legacy["spark_id"], fresh])
+
+    async def allocate():
+        return next(issued)
+
+    monkeypatch.setattr(repositories.users, "allocate_spark_id", allocate)
+    assert register(client, "new@example.com").status_code == 200
+
+    user = run(repositories.users.find_by_email("new@example.com"))
+    assert user["spark_id"] == fresh
+    assert next(issued, None) is None
+
+
+def test_register_gives_up_after_max_attempts(client, make_user, monkeypatch):
+    monkeypatch.setitem(SPARK_ID_CONFIG, "MAX_ATTEMPTS", 3)
+    legacy = make_user()
+    calls = []
+
+    async def allocate():
+        calls.append(1)
+        return legacy["spark_id"]
+
+    monkeypatch.setattr(repositories.users, "allocate_spark_id", allocate)
+    response = register(client, "new@example.com")
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Could not allocate a Spark ID"
+    assert len(calls) == 3
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import SYNC_CONFIG
+from app.pagination import encode_sync_token
+from tests.helpers import utc_ms
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setitem(SYNC_CONFIG, "MAX_CHANGES", 5)
+
+
+def sync_all(client, user, token=None, max_calls=20):
+    received, deleted = [], []
+    for _ in range(max_calls):
+        response = client.get("/api/messages/sync", params={"since": token} if token else {}, headers=user["headers"])
+        assert response.status_code == 200, response.json()
+        body = response.json()
+        received += [m["id"] for m in body["messages"]]
+        deleted += body["deleted"]
+        token = body["sync_token"]
+        if not body["has_more"]:
+            return received, deleted, token
+    pytest.fail("sync never finished")
+
+
+def test_batches_ending_inside_a_timestamp_tie_lose_nothing(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    at = utc_ms()
+    ids = [send(alice, bob, at, msg_id=f"m{n:02d}")["id"] for n in range(12)]
+
+    received, _, _ = sync_all(client, alice)
+    assert sorted(received) == ids
+
+
+def test_paging_through_history_older_than_retention(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    old = utc_ms() - timedelta(days=30)
+    ids = {send(alice, bob, old + timedelta(seconds=n))["id"] for n in range(12)}
+
+    received, _, _ = sync_all(client, alice)
+    assert set(received) == ids
+
+
+def test_incremental_sync_reports_new_and_deleted_messages(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    first = send(alice, bob, utc_ms() - timedelta(minutes=5))
+    _, _, token = sync_all(client, bob)
+
+    second = send(alice, bob, utc_ms())
+    assert client.delete(f"/api/messages/{first['id']}", headers=bob["headers"]).status_code == 200
+
+    received, deleted, _ = sync_all(client, bob, token)
+    assert received == [second["id"]]
+    assert deleted == [first["id"]]
+
+
+def test_first_sync_skips_messages_the_user_deleted(client, make_user, send):
+    alice, bob = make_user(), make_user()
+    kept = send(alice, bob)
+    gone = send(alice, bob)
+    client.delete(f"/api/messages/{gone['id']}", headers=alice["headers"])
+
+    received, deleted, _ = sync_all(client, alice)
+    assert received == [kept["id"]]
+    assert deleted == []
+
+
+def test_token_older_than_retention_must_resync(client, make_user):
+    alice = make_user()
+    stale = datetime.utcnow() - timedelta(days=30)
+
+    response = client.get(
+        "/api/messages/sync",
+        params={"since": encode_sync_token((stale, ""), stale)},
+        headers=alice["headers"],
+    )
+    assert response.status_code == 410
+
+
+def test_invalid_token_is_rejected(client, make_user):
+    response = client.get("/api/messages/sync", params={"since": "not-a-token"}, headers=make_user()["headers"])
+    assert response.status_code == 400
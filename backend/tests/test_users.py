@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def increment(client, user, **params):
+    return client.post("/api/users/me/chat-count/increment", params=params, headers=user["headers"])
+
+
+def test_chat_count_increments_on_the_server(client, make_user):
+    alice = make_user(chat_count=5)
+    assert increment(client, alice).json() == {"chat_count": 6}
+    assert increment(client, alice, by=4).json() == {"chat_count": 10}
+    assert client.get("/api/users/me", headers=alice["headers"]).json()["chat_count"] == 10
+
+
+def test_concurrent_increments_are_not_lost(client, make_user):
+    alice = make_user()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: increment(client, alice), range(40)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert sorted(response.json()["chat_count"] for response in responses) == list(range(1, 41))
+
+
+def test_increment_bounds_are_validated(client, make_user):
+    alice = make_user()
+    assert increment(client, alice, by=0).status_code == 422
+    assert increment(client, alice, by=1001).status_code == 422
+
+
+def test_increment_changes_the_profile_etag(client, make_user):
+    alice = make_user()
+    etag = client.get("/api/users/me", headers=alice["headers"]).headers["ETag"]
+    increment(client, alice)
+    response = client.get("/api/users/me", headers={**alice["headers"], "If-None-Match": etag})
+    assert response.status_code == 200
@@ -171,25 +171,11 @@ export function ChatBotPage({ botType, title, placeholder, welcomeMessage, frien
       try {
         const token = localStorage.getItem("token");
         if (token) {
-          // First fetch current count
-          const userRes = await fetch("http://localhost:8000/api/users/me", {
-            headers: { Authorization: `Bearer ${token}` }
+          // Atomic server-side increment
+          await fetch("http://localhost:8000/api/users/me/chat-count/increment", {
+            method: "POST",
+            headers: { Authorization: `Bearer ${token}` },
           });
-
-          if (userRes.ok) {
-            const userData = await userRes.json();
-            const currentCount = userData.chat_count || 0;
-
-            // Then update
-            await fetch("http://localhost:8000/api/users/me", {
-              method: "PUT",
-              headers: {
-                "Content-Type": "application/json",
-                Authorization: `Bearer ${token}`,
-              },
-              body: JSON.stringify({ chat_count: currentCount + 1 }),
-            });
-          }
         }
       } catch (err) {
         console.error("Failed to update chat count", err);